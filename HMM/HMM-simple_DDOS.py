@@ -5,49 +5,15 @@
 #
 # The program requires the installation of anaconda, sci-kit learn and hmmlearn.
 # I would recommend installing in that order.
+# Batches of sequences (e.g. one per host) are decoded by hmm_batch.py, which only requires NumPy.
+# Observations are derived from captured traffic (pcap_to_csv.py records) by hmm_observations.py, which requires python 3.
+# The probabilities can be fitted to captured traffic (many sequences, on many cores) by hmm_fit.py.
 
 from __future__ import division
 import numpy as np
 from hmmlearn import hmm
 
-#Know states that the model could be in,
-#The algorithm will predict which state it is in given a chaning set of observations
-states = ['ALL_IS_WELL', 'PRECURSOR_1', 'UNDER_ATTACK']
-n_states = len(states)
-
-#NORM = normality
-#URL = increased traffic to single url
-#HEADER =  increase in trafffic with header anomalies
-#RESOURCE = increase resource usage
-observations = ['NORM', 'URL', 'HEADER', 'RESOURCE']
-n_observations = len(observations)
-
-start_probability = np.array([0.8, 0.15, 0.05])
-
-# The probability of transitioning from one state to another,
-# ie ALL_IS_WELL to PRECURSOR_1
-#
-# 'ALL_IS_WELL'	: {'ALL_IS_WELL': p, 'PRECURSOR_1':p, 'UNDER_ATTACK':p },
-# 'PRECURSOR_1'	: {'ALL_IS_WELL': p, 'PRECURSOR_1':p, 'UNDER_ATTACK':p },
-# 'UNDER_ATTACK': {'ALL_IS_WELL': p, 'PRECURSOR_1':p, 'UNDER_ATTACK':p }
-transition_probability = np.array([
-	[0.7, 0.25, 0.05],
-	[0.7, 0.2, 0.1],
-	[0.1, 0.2, 0.7]
-])
-
-# The probability that given a certain emission event, we are in a given state.
-# ie probability p that given a RESOURCE event (increase in resource usage) is the state
-# ALL_IS_WELL, PRECURSOR_1 or UNDER_ATTACK
-#
-# 'ALL_IS_WELL'		: {'NORM': p, 'URL':p, 'HEADER':p, 'RESOURCE':p },
-# 'PRECURSOR_1'		: {'NORM': p, 'URL':p, 'HEADER':p, 'RESOURCE':p },
-# 'UNDER_ATTACK'	: {'NORM': p, 'URL':p, 'HEADER':p, 'RESOURCE':p },
-emission_probability = np.array([
-	[0.6, 0.2, 0.1, 0.1],
-	[0.2, 0.3, 0.3, 0.2],
-	[0.05,0.2, 0.15,0.6],
-])
+from ddos_model import states, n_states, observations, n_observations, start_probability, transition_probability, emission_probability
 
 model = hmm.MultinomialHMM(n_components=n_states)
 model.startprob_ = start_probability
@@ -61,4 +27,26 @@ observed_state_over_times = [0, 1, 2, 0, 2, 3, 3, 1]
 #predict the state after each observation.
 logprob, situation = model.decode(np.array(observed_state_over_times).reshape(-1,1), algorithm="viterbi")
 print "Observations of state over time: ", ", ".join(map(lambda x: observations[x], observed_state_over_times))
-print "Most like situation:", ", ".join(map(lambda x: states[x], situation))
\ No newline at end of file
+print "Most like situation:", ", ".join(map(lambda x: states[x], situation))
+
+# Decode the observations of many hosts at once with the batch (vectorised, log space) engine,
+# one row of observations per host (padded to the longest, with the length of each given separately).
+from hmm_batch import batch_viterbi, batch_forward_backward
+observed_hosts = np.array([observed_state_over_times, [0, 0, 1, 0, 0, 0, 0, 0], [3, 3, 3, 3, 0, 0, 0, 0]])
+host_lengths = np.array([8, 8, 4])
+host_logprob, host_situations = batch_viterbi(observed_hosts, start_probability, transition_probability, emission_probability, host_lengths)
+host_loglikelihood, host_posteriors = batch_forward_backward(observed_hosts, start_probability, transition_probability, emission_probability, host_lengths)
+for host in range(len(observed_hosts)):
+	print "Host", host, "most like situation:", ", ".join(map(lambda x: states[x], host_situations[host, :host_lengths[host]])),
+	print "(P(UNDER_ATTACK) at last observation: %.3f)" % host_posteriors[host, host_lengths[host] - 1, states.index('UNDER_ATTACK')]
+
+# Filter the observations as they are streamed in (one update per observation, however long the stream),
+# alerting as soon as UNDER_ATTACK becomes the most probable state.
+from hmm_online import OnlineFilter
+stream = OnlineFilter(start_probability, transition_probability, emission_probability, lag=2)
+for observation in observed_state_over_times:
+	posterior = stream.update(observation)
+	decision = stream.fixed_lag_state()
+	print "Observed", observations[observation], "- P(UNDER_ATTACK): %.3f" % posterior[states.index('UNDER_ATTACK')],
+	print "- state at observation %d: %s" % (decision[0], states[decision[1]]) if decision is not None else "",
+	print "- ALERT" if np.argmax(posterior) == states.index('UNDER_ATTACK') else ""
@@ -0,0 +1,43 @@
+# The DDoS model shared by HMM-simple_DDOS.py and the scripts decoding (or fitting) it against captured traffic:
+# the hidden states, the observation symbols and the start, transition and emission probabilities.
+
+import numpy as np
+
+#Know states that the model could be in,
+#The algorithm will predict which state it is in given a chaning set of observations
+states = ['ALL_IS_WELL', 'PRECURSOR_1', 'UNDER_ATTACK']
+n_states = len(states)
+
+#NORM = normality
+#URL = increased traffic to single url
+#HEADER =  increase in trafffic with header anomalies
+#RESOURCE = increase resource usage
+observations = ['NORM', 'URL', 'HEADER', 'RESOURCE']
+n_observations = len(observations)
+
+start_probability = np.array([0.8, 0.15, 0.05])
+
+# The probability of transitioning from one state to another,
+# ie ALL_IS_WELL to PRECURSOR_1
+#
+# 'ALL_IS_WELL'	: {'ALL_IS_WELL': p, 'PRECURSOR_1':p, 'UNDER_ATTACK':p },
+# 'PRECURSOR_1'	: {'ALL_IS_WELL': p, 'PRECURSOR_1':p, 'UNDER_ATTACK':p },
+# 'UNDER_ATTACK': {'ALL_IS_WELL': p, 'PRECURSOR_1':p, 'UNDER_ATTACK':p }
+transition_probability = np.array([
+	[0.7, 0.25, 0.05],
+	[0.7, 0.2, 0.1],
+	[0.1, 0.2, 0.7]
+])
+
+# The probability that given a certain emission event, we are in a given state.
+# ie probability p that given a RESOURCE event (increase in resource usage) is the state
+# ALL_IS_WELL, PRECURSOR_1 or UNDER_ATTACK
+#
+# 'ALL_IS_WELL'		: {'NORM': p, 'URL':p, 'HEADER':p, 'RESOURCE':p },
+# 'PRECURSOR_1'		: {'NORM': p, 'URL':p, 'HEADER':p, 'RESOURCE':p },
+# 'UNDER_ATTACK'	: {'NORM': p, 'URL':p, 'HEADER':p, 'RESOURCE':p },
+emission_probability = np.array([
+	[0.6, 0.2, 0.1, 0.1],
+	[0.2, 0.3, 0.3, 0.2],
+	[0.05,0.2, 0.15,0.6],
+])
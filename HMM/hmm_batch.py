@@ -0,0 +1,126 @@
+# Vectorised, log-space Viterbi and forward-backward for a discrete (multinomial emission) HMM,
+# decoding a whole batch of observation sequences at once rather than one sequence per call.
+#
+# Sequences are given as a 2-D array (sequences x time steps) of observation indices; sequences of
+# different lengths are padded to the longest and their lengths passed separately. Each time step
+# is a single NumPy operation over every sequence (and every pair of states), so the Python overhead
+# is per time step, not per sequence, and throughput scales with the size of the batch.
+#
+# Works in log space throughout, so long sequences don't underflow; zero probabilities are -inf.
+#
+# Usage:
+#	logprob, situations = batch_viterbi(observed, start_probability, transition_probability, emission_probability)
+#	loglikelihood, posteriors = batch_forward_backward(observed, start_probability, transition_probability, emission_probability, lengths)
+
+from __future__ import division
+import numpy as np
+
+def log_probabilities(start_probability, transition_probability, emission_probability):
+	"""Logs of the model's probabilities (-inf where 0)"""
+	with np.errstate(divide='ignore'):
+		return (np.log(np.asarray(start_probability, dtype=float)),
+			np.log(np.asarray(transition_probability, dtype=float)),
+			np.log(np.asarray(emission_probability, dtype=float)))
+
+def logsumexp(a, axis):
+	"""log(sum(exp(a))) along an axis, without overflow/underflow (and -inf where all of a is -inf)"""
+	a_max = np.max(a, axis=axis, keepdims=True)
+	a_max = np.where(np.isfinite(a_max), a_max, 0)
+	with np.errstate(divide='ignore'):
+		return np.log(np.sum(np.exp(a - a_max), axis=axis)) + np.squeeze(a_max, axis=axis)
+
+def _batch(observed, lengths):
+	"""Observations (sequences x time steps) and lengths of a batch, with padding replaced by observation 0"""
+	observed = np.atleast_2d(np.asarray(observed, dtype=np.int64))
+	n_sequences, n_steps = observed.shape
+	if lengths is None:
+		lengths = np.full(n_sequences, n_steps, dtype=np.int64)
+	lengths = np.asarray(lengths, dtype=np.int64)
+	if np.any(lengths < 1) or np.any(lengths > n_steps):
+		raise ValueError("Sequence lengths must be between 1 and %d" % n_steps)
+	active = np.arange(n_steps)[np.newaxis, :] < lengths[:, np.newaxis]
+	return np.where(active, observed, 0), lengths, active
+
+def batch_viterbi(observed, start_probability, transition_probability, emission_probability, lengths=None):
+	"""Most likely sequence of states of each observation sequence in a batch
+
+	observed:	observation indices, one sequence per row (padded to the longest sequence)
+	lengths:	length of each sequence (default: all of each row)
+
+	Returns (log probability of each sequence's most likely states (sequences),
+		most likely states (sequences x time steps, -1 beyond each sequence's length))
+	"""
+	observed, lengths, active = _batch(observed, lengths)
+	log_start, log_trans, log_emit = log_probabilities(start_probability, transition_probability, emission_probability)
+	n_sequences, n_steps = observed.shape
+	n_states = len(log_start)
+	sequences = np.arange(n_sequences)
+
+	# log probability of each observation being emitted by each state (sequences x time steps x states)
+	log_b = log_emit.T[observed]
+
+	# best path score ending in each state, and the previous state on that path (padding stays in the same state)
+	delta = log_start + log_b[:, 0]
+	back = np.empty((n_sequences, n_steps, n_states), dtype=np.int64)
+	back[:, 0] = np.arange(n_states)
+	for t in range(1, n_steps):
+		scores = delta[:, :, np.newaxis] + log_trans
+		best = np.argmax(scores, axis=1)
+		step = active[:, t, np.newaxis]
+		delta = np.where(step, scores[sequences[:, np.newaxis], best, np.arange(n_states)] + log_b[:, t], delta)
+		back[:, t] = np.where(step, best, np.arange(n_states))
+
+	# trace the best paths back from the best final states
+	situations = np.empty((n_sequences, n_steps), dtype=np.int64)
+	situations[:, -1] = np.argmax(delta, axis=1)
+	for t in range(n_steps - 1, 0, -1):
+		situations[:, t - 1] = back[sequences, t, situations[:, t]]
+	situations[~active] = -1
+	return np.max(delta, axis=1), situations
+
+def batch_forward(observed, start_probability, transition_probability, emission_probability, lengths=None):
+	"""Forward (log alpha) probabilities of each observation sequence in a batch
+
+	Returns (log likelihood of each sequence (sequences),
+		log alpha (sequences x time steps x states, repeating each sequence's last step beyond its length))
+	"""
+	observed, lengths, active = _batch(observed, lengths)
+	log_start, log_trans, log_emit = log_probabilities(start_probability, transition_probability, emission_probability)
+	log_b = log_emit.T[observed]
+
+	log_alpha = np.empty(log_b.shape)
+	log_alpha[:, 0] = log_start + log_b[:, 0]
+	for t in range(1, observed.shape[1]):
+		step = logsumexp(log_alpha[:, t - 1, :, np.newaxis] + log_trans, axis=1) + log_b[:, t]
+		log_alpha[:, t] = np.where(active[:, t, np.newaxis], step, log_alpha[:, t - 1])
+	return logsumexp(log_alpha[:, -1], axis=1), log_alpha
+
+def batch_backward(observed, start_probability, transition_probability, emission_probability, lengths=None):
+	"""Backward (log beta) probabilities of each observation sequence in a batch
+
+	Returns log beta (sequences x time steps x states, 0 (log 1) at and beyond each sequence's last step)
+	"""
+	observed, lengths, active = _batch(observed, lengths)
+	log_start, log_trans, log_emit = log_probabilities(start_probability, transition_probability, emission_probability)
+	log_b = log_emit.T[observed]
+
+	log_beta = np.zeros(log_b.shape)
+	for t in range(observed.shape[1] - 2, -1, -1):
+		step = logsumexp(log_trans + (log_b[:, t + 1] + log_beta[:, t + 1])[:, np.newaxis, :], axis=2)
+		log_beta[:, t] = np.where(active[:, t + 1, np.newaxis], step, 0)
+	return log_beta
+
+def batch_forward_backward(observed, start_probability, transition_probability, emission_probability, lengths=None):
+	"""Posterior probability of each state at each time step of each observation sequence in a batch
+
+	Returns (log likelihood of each sequence (sequences),
+		posteriors (sequences x time steps x states, 0 beyond each sequence's length))
+	"""
+	loglikelihood, log_alpha = batch_forward(observed, start_probability, transition_probability, emission_probability, lengths)
+	log_beta = batch_backward(observed, start_probability, transition_probability, emission_probability, lengths)
+	_, _, active = _batch(observed, lengths)
+
+	with np.errstate(invalid='ignore'):
+		posteriors = np.exp(log_alpha + log_beta - loglikelihood[:, np.newaxis, np.newaxis])
+	posteriors[~active] = 0
+	return loglikelihood, posteriors
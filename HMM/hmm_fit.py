@@ -0,0 +1,267 @@
+# Fit the DDoS model's probabilities (ddos_model.py) to many observation sequences with Baum-Welch (EM),
+# e.g. the windows of each Destination IP of captures from the test network (ubuntu-ddos attacking
+# ubuntu-target, see docker-images/test-network), as derived from the packet records by hmm_observations.py.
+#
+# The E-step of each iteration (forward-backward over every sequence, accumulating the expected start,
+# transition and emission counts) is sharded across a pool of processes. Sequences are sorted by length
+# and padded into shards of similar length sequences once, and the shards sent to each worker process once
+# (when the pool starts); each iteration only the current probabilities are sent to the workers, and the
+# counts of each shard (a few states x states/observations arrays) returned, summed by the parent for the M-step.
+#
+# Fitting starts from the current (ddos_model.py) probabilities, or warm starts from a previously fitted
+# model, and the fitted model is saved as a NumPy archive (.npz), loaded with load_model (e.g. by
+# hmm_observations.py -m) to decode new captures.
+#
+# Usage:
+#	python hmm_fit.py -o ddos.npz [-m <warm start model>] [-j <jobs>] capture1.npy capture2.csv ...
+#
+#	model, loglikelihoods = fit(sequences, Model(start_probability, transition_probability, emission_probability), jobs=8)
+#	save_model('ddos.npz', model, loglikelihoods)
+
+from __future__ import division, print_function
+import sys, getopt, os.path
+from collections import namedtuple
+from multiprocessing import Pool, cpu_count
+from timeit import default_timer as timer
+
+import numpy as np
+
+from ddos_model import states, observations, start_probability, transition_probability, emission_probability
+from hmm_batch import _batch, log_probabilities, batch_forward, batch_backward
+
+# Default maximum number of Baum-Welch iterations
+N_ITERATIONS = 100
+
+# Default minimum improvement in (total) log likelihood for another iteration
+TOLERANCE = 1e-2
+
+# Default number of sequences per shard (each shard is padded to its longest sequence)
+SHARD_SEQUENCES = 256
+
+# Minimum of each fitted probability, so that observations (and transitions) absent from the training sequences remain possible
+MIN_PROBABILITY = 1e-6
+
+# Version of the fitted model artifact, loaded only if it matches
+MODEL_VERSION = 1
+
+# Probabilities of a model (as given to hmm_batch.py and hmm_online.py)
+Model = namedtuple('Model', ['start_probability', 'transition_probability', 'emission_probability'])
+
+def shard_sequences(sequences, shard_sequences=SHARD_SEQUENCES):
+	"""Sequences (of observation indices), sorted by length and padded into shards of (observed (sequences x time steps), lengths)"""
+	lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+	if np.any(lengths < 1):
+		raise ValueError("Sequences must have at least one observation")
+	order = np.argsort(lengths, kind='stable')
+	shards = []
+	for offset in range(0, len(order), shard_sequences):
+		rows = order[offset:offset + shard_sequences]
+		observed = np.zeros((len(rows), lengths[rows].max()), dtype=np.int64)
+		for i, row in enumerate(rows):
+			observed[i, :lengths[row]] = sequences[row]
+		shards.append((observed, lengths[rows]))
+	return shards
+
+def expected_counts(observed, lengths, model):
+	"""E-step of a batch of sequences: (total log likelihood, expected start (states), transition (states x states) and emission (states x observations) counts)"""
+	loglikelihood, log_alpha = batch_forward(observed, *model, lengths=lengths)
+	log_beta = batch_backward(observed, *model, lengths=lengths)
+	observed, lengths, active = _batch(observed, lengths)
+	_, log_trans, log_emit = log_probabilities(*model)
+	if not np.all(np.isfinite(loglikelihood)):
+		raise ValueError("%d sequences have zero probability given the model" % np.count_nonzero(~np.isfinite(loglikelihood)))
+	log_b = log_emit.T[observed]
+	loglikelihood_3d = loglikelihood[:, np.newaxis, np.newaxis]
+
+	posteriors = np.exp(log_alpha + log_beta - loglikelihood_3d)
+	posteriors[~active] = 0
+
+	# expected transitions between each pair of states at each step (that is within a sequence)
+	transition_counts = np.zeros(log_trans.shape)
+	for t in range(observed.shape[1] - 1):
+		step = active[:, t + 1]
+		xi = log_alpha[step, t, :, np.newaxis] + log_trans + (log_b[step, t + 1] + log_beta[step, t + 1])[:, np.newaxis, :] - loglikelihood_3d[step]
+		transition_counts += np.exp(xi).sum(axis=0)
+
+	emission_counts = np.empty(log_emit.shape)
+	for observation in range(log_emit.shape[1]):
+		emission_counts[:, observation] = posteriors[observed == observation].sum(axis=0)
+	return loglikelihood.sum(), posteriors[:, 0].sum(axis=0), transition_counts, emission_counts
+
+def _normalise(counts, previous, min_probability):
+	"""Probabilities (normalised along the last axis) from expected counts, keeping the previous probabilities where nothing was counted"""
+	totals = counts.sum(axis=-1, keepdims=True)
+	with np.errstate(invalid='ignore'):
+		probabilities = np.where(totals > 0, counts / totals, previous)
+	probabilities = np.maximum(probabilities, min_probability)
+	return probabilities / probabilities.sum(axis=-1, keepdims=True)
+
+def maximise(counts, model, min_probability=MIN_PROBABILITY):
+	"""M-step: Model from the (summed) expected counts of the E-step"""
+	_, start_counts, transition_counts, emission_counts = counts
+	return Model(*[_normalise(c, p, min_probability) for c, p in zip((start_counts, transition_counts, emission_counts), model)])
+
+# Shards of the worker processes, sent once (by the pool initialiser) rather than every iteration
+_worker_shards = None
+
+def _init_worker(shards):
+	global _worker_shards
+	_worker_shards = shards
+
+def _shard_counts(args):
+	shard, model = args
+	observed, lengths = _worker_shards[shard]
+	return expected_counts(observed, lengths, model)
+
+def fit(sequences, model, iterations=N_ITERATIONS, tolerance=TOLERANCE, jobs=1, shard_size=SHARD_SEQUENCES, min_probability=MIN_PROBABILITY, verbose=False):
+	"""Fit a model to sequences of observation indices with Baum-Welch, starting from model (i.e. warm start)
+
+	jobs:	number of worker processes of the E-step (1 = in this process)
+
+	Returns (fitted Model, log likelihood of the sequences given the model at each iteration)
+	"""
+	model = Model(*[np.asarray(probabilities, dtype=float) for probabilities in model])
+	shards = shard_sequences(sequences, shard_size)
+	pool = Pool(jobs, _init_worker, (shards,)) if jobs > 1 else None
+	loglikelihoods = []
+	try:
+		for iteration in range(iterations):
+			start = timer()
+			if pool is None:
+				shard_counts = [expected_counts(observed, lengths, model) for observed, lengths in shards]
+			else:
+				shard_counts = pool.map(_shard_counts, [(shard, model) for shard in range(len(shards))])
+			counts = [sum(shard[i] for shard in shard_counts) for i in range(4)]
+			loglikelihoods.append(counts[0])
+			if verbose:
+				print("Iteration %d: log likelihood %.4f (%.2fs)" % (iteration + 1, counts[0], timer() - start))
+			if iteration > 0 and loglikelihoods[-1] - loglikelihoods[-2] < tolerance:
+				break
+			model = maximise(counts, model, min_probability)
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+	return model, loglikelihoods
+
+def save_model(model_file, model, loglikelihoods=()):
+	"""Save a fitted model as a NumPy archive (.npz), writing to a temporary file then renaming, so a partly written model is never loaded"""
+	temp_file = model_file + '.' + str(os.getpid())
+	with open(temp_file, 'wb') as f:
+		np.savez(f, version=MODEL_VERSION, states=np.array(states), observations=np.array(observations),
+			loglikelihoods=np.asarray(loglikelihoods, dtype=float), **model._asdict())
+	os.rename(temp_file, model_file)
+
+def load_model(model_file):
+	"""Load a fitted model saved by save_model
+
+	Raises ValueError if the model is of another version, or of other states or observations than ddos_model.py's
+	"""
+	with np.load(model_file) as archive:
+		if int(archive['version']) != MODEL_VERSION:
+			raise ValueError("Model %s is version %d (expected %d)" % (model_file, int(archive['version']), MODEL_VERSION))
+		if archive['states'].tolist() != states or archive['observations'].tolist() != observations:
+			raise ValueError("Model %s has states %s and observations %s (expected %s and %s)" % (model_file, archive['states'].tolist(), archive['observations'].tolist(), states, observations))
+		return Model(*[archive[field] for field in Model._fields])
+
+def capture_sequences(input_files, window_seconds, lower_bound, num_records=None):
+	"""Observation sequences of packet record files (CSV or NumPy binary format): one per Destination IP of each file, from its first to its last window with packets"""
+	from hmm_observations import file_window_statistics, window_arrays, observation_symbols
+	sequences = []
+	for input_file in input_files:
+		stats, _, _ = file_window_statistics(input_file, window_seconds, num_records)
+		_, _, windows = window_arrays(stats, lower_bound)
+		observed = observation_symbols(windows)
+		for row, packets in zip(observed, windows.packets):
+			active = np.flatnonzero(packets)
+			sequences.append(row[active[0]:active[-1] + 1])
+	return sequences
+
+def print_usage(exit_code=0):
+	"""Print usage and exit (0 = to stdout, otherwise to stderr)"""
+	f = sys.stderr if exit_code > 0 else sys.stdout
+	print(os.path.basename(__file__) + " -o <model file> [-m <model file>] [-j <jobs>] [-n <iterations>] [-t <tolerance>] [-w <window seconds>] [-l <lower bound>] <input file> ...", file=f)
+	print("<input file>: CSV format packet records (output by pcap_to_csv.py), or NumPy binary format with .npy extension", file=f)
+	print("-o <model file>: Fitted model (NumPy archive, .npz) to be written", file=f)
+	print("-m <model file>: Previously fitted model to warm start from (default: the probabilities of ddos_model.py)", file=f)
+	print("-j <jobs>: Number of worker processes of the E-step (default: number of CPUs)", file=f)
+	print("-n <iterations>: Maximum number of iterations (default: %d)" % N_ITERATIONS, file=f)
+	print("-t <tolerance>: Minimum improvement in log likelihood for another iteration (default: %g)" % TOLERANCE, file=f)
+	print("-w <window seconds>: Width of each time window (default: hmm_observations.py's)", file=f)
+	print("-l <lower bound>: Minimum number of packets received by a Destination IP for its windows to be a sequence (default: hmm_observations.py's)", file=f)
+	sys.exit(exit_code)
+
+def main(argv):
+	from hmm_observations import WINDOW_SECONDS, LOWER_BOUND
+	model_file = None
+	warm_start_file = None
+	jobs = cpu_count()
+	iterations = N_ITERATIONS
+	tolerance = TOLERANCE
+	window_seconds = WINDOW_SECONDS
+	lower_bound = LOWER_BOUND
+
+	try:
+		opts, args = getopt.getopt(argv, "ho:m:j:n:t:w:l:")
+	except getopt.GetoptError:
+		print_usage(1)
+
+	try:
+		for opt, arg in opts:
+			if opt == '-h':
+				print_usage(0)
+			elif opt == '-o':
+				model_file = arg
+			elif opt == '-m':
+				warm_start_file = arg
+			elif opt == '-j':
+				jobs = int(arg)
+			elif opt == '-n':
+				iterations = int(arg)
+			elif opt == '-t':
+				tolerance = float(arg)
+			elif opt == '-w':
+				window_seconds = float(arg)
+			elif opt == '-l':
+				lower_bound = int(arg)
+	except ValueError:
+		print_usage(2)
+
+	if model_file is None or len(args) == 0 or jobs < 1 or iterations < 1 or window_seconds <= 0:
+		print_usage(1)
+	for input_file in args:
+		if not os.path.isfile(input_file):
+			print("Input file not found: " + input_file, file=sys.stderr)
+			sys.exit(3)
+
+	if warm_start_file is not None:
+		try:
+			model = load_model(warm_start_file)
+		except (IOError, KeyError, ValueError) as e:
+			print("Unable to load model %s: %s" % (warm_start_file, e), file=sys.stderr)
+			sys.exit(4)
+	else:
+		model = Model(start_probability, transition_probability, emission_probability)
+
+	start = timer()
+	try:
+		sequences = capture_sequences(args, window_seconds, lower_bound)
+	except ValueError as e:
+		print("Unable to window records with -w %g: %s" % (window_seconds, e), file=sys.stderr)
+		sys.exit(6)
+	if len(sequences) == 0:
+		print("No Destination IPs received at least %d packets" % lower_bound, file=sys.stderr)
+		sys.exit(5)
+	print("Extracted %d sequences (%d windows) from %d files in %.2fs" % (len(sequences), sum(len(sequence) for sequence in sequences), len(args), timer() - start))
+
+	start = timer()
+	model, loglikelihoods = fit(sequences, model, iterations, tolerance, jobs, verbose=True)
+	print("Fitted in %d iterations (%d jobs) in %.2fs" % (len(loglikelihoods), jobs, timer() - start))
+	for name, probabilities in model._asdict().items():
+		print(name + ":\n" + np.array2string(probabilities, precision=4))
+
+	save_model(model_file, model, loglikelihoods)
+	print("Saved model to " + model_file)
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
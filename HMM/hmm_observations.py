@@ -0,0 +1,352 @@
+# Derive the DDoS model's observation symbols (NORM, URL, HEADER, RESOURCE) from captured traffic,
+# i.e. packet records output by NCCDC/pcap_to_csv.py (CSV, or NumPy binary format), and decode them.
+#
+# Packets are binned per Destination IP into fixed time windows, counting the packets, bytes and
+# anomalous packets (TCP flag combinations that don't occur in normal connections, and IP fragments)
+# of each window, along with the number of its packets to its busiest Destination Port. Records are
+# read a block at a time, each block reduced to totals per (Destination IP, window) with one sort, so
+# memory is bounded by the number of windows rather than the number of packets. Each window is then
+# compared with its Destination IP's baseline (median over the windows in which it received packets):
+#
+#	NORM		packets and bytes within RATE_FACTOR times the baseline (or no packets at all)
+#	HEADER		elevated, with at least ANOMALOUS_SHARE of the packets anomalous
+#	URL			elevated packets, with at least PORT_SHARE of them to a single Destination Port
+#	RESOURCE	otherwise elevated (i.e. bytes, or packets spread over many Destination Ports)
+#
+# The baseline assumes each Destination IP is not under attack for most of the windows in which it
+# receives packets. The windows of the Destination IPs are then decoded a batch of Destination IPs at a
+# time by hmm_batch.py, those only ever observed as NORM sharing a single decoding, with the probabilities
+# of ddos_model.py or of a model fitted (to captures of the test network) by hmm_fit.py.
+#
+# Usage:
+#	python hmm_observations.py -i dayone.csv -w 60 -l 1000 [-m ddos.npz]
+#
+#	stats, num_records, num_rejected = file_window_statistics('dayone.npy', WINDOW_SECONDS)
+#	dsts, first_window, windows = window_arrays(stats, LOWER_BOUND)
+#	observed = observation_symbols(windows)
+#	situations, under_attack_posteriors = decode_windows(observed, load_model('ddos.npz'))
+
+from __future__ import division, print_function
+import sys, getopt, os.path
+from collections import namedtuple
+from timeit import default_timer as timer
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'NCCDC'))
+from ipv4 import ipv4_ints_to_dotted
+from packet_records import COL_PROTOCOL, COL_TIME, COL_DEST_IP, COL_DEST_PORT, COL_LENGTH, COL_FRAGMENT, COL_FLAGS, RECORD_DTYPE, NPY_EXTENSION, iter_csv_records, load_npy_records
+
+from ddos_model import states, observations, start_probability, transition_probability, emission_probability
+from hmm_batch import batch_viterbi, batch_forward_backward
+from hmm_fit import Model, load_model
+
+# Default width (seconds) of each window
+WINDOW_SECONDS = 60
+
+# Default minimum number of packets received by a Destination IP for its windows to be decoded
+LOWER_BOUND = 1000
+
+# Number of records (NumPy binary format input) reduced at a time
+RECORD_BLOCK = 1000000
+
+# Maximum number of (Destination IP, window) totals in each Destination IPs x windows array (bounding the memory of window_arrays)
+MAX_WINDOW_CELLS = 1 << 26
+
+# Number of Destination IPs decoded at a time (bounding the memory of the decoder's states x windows arrays)
+DECODE_BATCH = 256
+
+# Multiple of a Destination IP's baseline packets (or bytes) per window above which a window is elevated
+RATE_FACTOR = 3.0
+
+# Minimum share of anomalous packets in an elevated window for HEADER
+ANOMALOUS_SHARE = 0.5
+
+# Minimum share of packets to the busiest Destination Port in an elevated window for URL
+PORT_SHARE = 0.9
+
+PROTO_TCP = 6
+FLAG_FIN, FLAG_SYN, FLAG_RST, FLAG_PSH, FLAG_ACK, FLAG_URG = 1, 2, 4, 8, 16, 32
+
+def _anomalous_flags(flags):
+	# NULL, SYN without ACK (i.e. half open), SYN-FIN, SYN-RST and FIN-PSH-URG ("Xmas") packets
+	syn, ack = flags & FLAG_SYN, flags & FLAG_ACK
+	xmas = FLAG_FIN | FLAG_PSH | FLAG_URG
+	return flags == 0 or (syn and not ack) or (syn and flags & (FLAG_FIN | FLAG_RST)) or flags & xmas == xmas
+
+# Whether each combination of TCP flags is anomalous
+_ANOMALOUS_FLAGS = np.array([bool(_anomalous_flags(flags)) for flags in range(64)])
+
+# Offset of window numbers (relative to the first window) in keys, so windows before the first window (e.g. of out of order records) can be keyed
+WINDOW_OFFSET = 1 << 31
+
+# Totals per (Destination IP, window), keyed (in sorted order) by Destination IP << 32 | (window number (time / window_seconds)
+# - first_window + WINDOW_OFFSET), with the packets to each Destination Port of each (Destination IP, window), keyed (and sorted
+# by key then port) the same way
+WindowStatistics = namedtuple('WindowStatistics', ['window_seconds', 'first_window', 'keys', 'packets', 'bytes', 'anomalous', 'port_keys', 'ports', 'port_packets'])
+
+# Totals per window of each Destination IP (Destination IPs x windows)
+Windows = namedtuple('Windows', ['packets', 'bytes', 'anomalous', 'top_port'])
+
+def anomalous_packets(records):
+	"""Whether each packet record has an anomalous combination of TCP flags, or is a (non-first) IP fragment"""
+	tcp = records[COL_PROTOCOL] == PROTO_TCP
+	return (tcp & _ANOMALOUS_FLAGS[records[COL_FLAGS] & 63]) | (records[COL_FRAGMENT] != 0)
+
+def _run_starts(different):
+	"""Offsets of the start of each run of rows, given whether each row (after the first) differs from the previous one"""
+	return np.flatnonzero(np.concatenate(([True], different)))
+
+def _reduce_ports(port_keys, ports, port_packets):
+	"""Total packets per (key, port), sorted by key then port"""
+	order = np.lexsort((ports, port_keys))
+	port_keys, ports, port_packets = port_keys[order], ports[order], port_packets[order]
+	if len(order) == 0:
+		return port_keys, ports, port_packets
+	starts = _run_starts((port_keys[1:] != port_keys[:-1]) | (ports[1:] != ports[:-1]))
+	return port_keys[starts], ports[starts], np.add.reduceat(port_packets, starts)
+
+def window_statistics(records, window_seconds=WINDOW_SECONDS, first_window=None):
+	"""Totals per (Destination IP, window) of an array of packet records (see WindowStatistics)
+
+	first_window:	window number from which windows are keyed (default: the window of the first record)
+
+	Raises ValueError if the windows (relative to first_window) can't be keyed, i.e. span 2^32 or more windows
+	"""
+	windows = np.floor(records[COL_TIME] / window_seconds)
+	if np.any(~(np.abs(windows) < 2.0 ** 62)):
+		raise ValueError("Window numbers of %g second windows are out of range" % window_seconds)
+	windows = windows.astype(np.int64)
+	if first_window is None:
+		first_window = int(windows[0]) if len(windows) > 0 else 0
+	windows = windows - first_window + WINDOW_OFFSET
+	if np.any((windows < 0) | (windows >= 1 << 32)):
+		raise ValueError("Records span 2^31 or more %g second windows before or after window %d" % (window_seconds, first_window))
+
+	keys = (records[COL_DEST_IP].astype(np.uint64) << np.uint64(32)) | windows.astype(np.uint64)
+	ports = records[COL_DEST_PORT].astype(np.int64)
+	if len(keys) == 0:
+		empty = np.zeros(0, dtype=np.int64)
+		return WindowStatistics(window_seconds, first_window, keys, empty, empty, empty, keys, empty, empty)
+
+	# one sort, by key then port, gives the runs of both
+	order = np.lexsort((ports, keys))
+	keys, ports = keys[order], ports[order]
+	new_key = keys[1:] != keys[:-1]
+	starts = _run_starts(new_key)
+	port_starts = _run_starts(new_key | (ports[1:] != ports[:-1]))
+	return WindowStatistics(window_seconds, first_window, keys[starts],
+		np.diff(np.append(starts, len(keys))),
+		np.add.reduceat(records[COL_LENGTH][order].astype(np.int64), starts),
+		np.add.reduceat(anomalous_packets(records)[order].astype(np.int64), starts),
+		keys[port_starts], ports[port_starts], np.diff(np.append(port_starts, len(keys))))
+
+def merge_window_statistics(parts):
+	"""Merge the window statistics of several blocks of packet records (with the same window_seconds and first_window)"""
+	if len(parts) == 1:
+		return parts[0]
+	keys = np.concatenate([part.keys for part in parts])
+	order = np.argsort(keys, kind='stable')
+	keys = keys[order]
+	if len(keys) == 0:
+		return parts[0]
+	starts = _run_starts(keys[1:] != keys[:-1])
+	totals = [np.add.reduceat(np.concatenate([getattr(part, field) for part in parts])[order], starts) for field in ('packets', 'bytes', 'anomalous')]
+	port_totals = _reduce_ports(*[np.concatenate([getattr(part, field) for part in parts]) for field in ('port_keys', 'ports', 'port_packets')])
+	return WindowStatistics(parts[0].window_seconds, parts[0].first_window, keys[starts], *(totals + list(port_totals)))
+
+def file_window_statistics(input_file, window_seconds=WINDOW_SECONDS, num_records=None):
+	"""Window statistics of a CSV (or NumPy binary format, memory mapped) file of packet records, a block at a time
+
+	Returns (window statistics, number of records, number of (malformed) CSV rows rejected)
+
+	Raises ValueError if the records span too many windows (see window_statistics)
+	"""
+	if input_file.endswith(NPY_EXTENSION):
+		all_records = load_npy_records(input_file, num_records)
+		blocks = ((all_records[offset:offset + RECORD_BLOCK], 0) for offset in range(0, len(all_records), RECORD_BLOCK))
+	else:
+		blocks = iter_csv_records(input_file, num_records)
+
+	parts = []
+	total_records = total_rejected = 0
+	first_window = None
+	for records, rejected in blocks:
+		# every block is keyed from the window of the first record
+		parts.append(window_statistics(records, window_seconds, first_window))
+		if len(records) > 0:
+			first_window = parts[-1].first_window
+		total_records += len(records)
+		total_rejected += rejected
+	if len(parts) == 0:
+		parts.append(window_statistics(np.zeros(0, dtype=RECORD_DTYPE), window_seconds))
+	return merge_window_statistics([part for part in parts if len(part.keys) > 0] or parts[:1]), total_records, total_rejected
+
+def window_arrays(stats, lower_bound=LOWER_BOUND):
+	"""Totals of every window (from the first to the last window of any packet) of each Destination IP receiving at least lower_bound packets
+
+	Returns (Destination IPs, number of the first window, Windows (Destination IPs x windows))
+	Raises ValueError if the arrays would have more than MAX_WINDOW_CELLS totals each (e.g. too narrow windows for the span of the records)
+	"""
+	all_dsts = (stats.keys >> np.uint64(32)).astype(np.int64)
+	all_windows = (stats.keys & np.uint64(0xffffffff)).astype(np.int64) - WINDOW_OFFSET + stats.first_window
+	if len(all_dsts) == 0:
+		empty = np.zeros((0, 0), dtype=np.int64)
+		return all_dsts, 0, Windows(empty, empty, empty, empty)
+
+	# the busiest Destination Port's packets of each (Destination IP, window), in the same (key) order as the other totals
+	top_port = np.maximum.reduceat(stats.port_packets, _run_starts(stats.port_keys[1:] != stats.port_keys[:-1]))
+
+	dst_starts = _run_starts(all_dsts[1:] != all_dsts[:-1])
+	dsts = all_dsts[dst_starts][np.add.reduceat(stats.packets, dst_starts) >= lower_bound]
+	keep = np.isin(all_dsts, dsts)
+	first_window = all_windows.min()
+	rows = np.searchsorted(dsts, all_dsts[keep])
+	columns = all_windows[keep] - first_window
+
+	shape = (len(dsts), all_windows.max() - first_window + 1)
+	if shape[0] * shape[1] > MAX_WINDOW_CELLS:
+		raise ValueError("%d Destination IPs over %d windows is more than %d totals per window array (try wider windows or a higher lower bound)" % (shape + (MAX_WINDOW_CELLS,)))
+	arrays = []
+	for totals in (stats.packets, stats.bytes, stats.anomalous, top_port):
+		array = np.zeros(shape, dtype=np.int64)
+		array[rows, columns] = totals[keep]
+		arrays.append(array)
+	return dsts, first_window, Windows(*arrays)
+
+def observation_symbols(windows, rate_factor=RATE_FACTOR, anomalous_share=ANOMALOUS_SHARE, port_share=PORT_SHARE):
+	"""Observation symbol (index of observations) of each window of each Destination IP (Destination IPs x windows)"""
+	active = windows.packets > 0
+	with np.errstate(invalid='ignore', divide='ignore'):
+		baseline_packets = np.nanmedian(np.where(active, windows.packets, np.nan), axis=1)[:, np.newaxis]
+		baseline_bytes = np.nanmedian(np.where(active, windows.bytes, np.nan), axis=1)[:, np.newaxis]
+		anomalous = windows.anomalous / windows.packets
+		top_port = windows.top_port / windows.packets
+
+	elevated_packets = windows.packets > rate_factor * baseline_packets
+	elevated = elevated_packets | (windows.bytes > rate_factor * baseline_bytes)
+
+	observed = np.full(windows.packets.shape, observations.index('NORM'), dtype=np.int64)
+	observed[elevated] = observations.index('RESOURCE')
+	observed[elevated_packets & (top_port >= port_share)] = observations.index('URL')
+	observed[elevated & (anomalous >= anomalous_share)] = observations.index('HEADER')
+	return observed
+
+def decode_windows(observed, model=Model(start_probability, transition_probability, emission_probability), batch=DECODE_BATCH):
+	"""Most likely state, and posterior probability of UNDER_ATTACK, of each window of each Destination IP (Destination IPs x windows)
+
+	Destination IPs only observed as NORM share a single decoding, so only those with elevated windows are decoded, batch at a time.
+	"""
+	quiet = ~np.any(observed != observations.index('NORM'), axis=1)
+	rows = np.append(np.flatnonzero(~quiet), -1)
+	situations = np.empty(observed.shape, dtype=np.int64)
+	under_attack = np.empty(observed.shape)
+	for offset in range(0, len(rows), batch):
+		batch_rows = rows[offset:offset + batch]
+		batch_observed = observed[batch_rows]
+		batch_observed[batch_rows < 0] = observations.index('NORM')
+		_, batch_situations = batch_viterbi(batch_observed, *model)
+		_, batch_posteriors = batch_forward_backward(batch_observed, *model)
+		# the last row decoded is the (all NORM) quiet row
+		if batch_rows[-1] < 0:
+			situations[quiet] = batch_situations[-1]
+			under_attack[quiet] = batch_posteriors[-1, :, states.index('UNDER_ATTACK')]
+			batch_rows, batch_situations, batch_posteriors = batch_rows[:-1], batch_situations[:-1], batch_posteriors[:-1]
+		situations[batch_rows] = batch_situations
+		under_attack[batch_rows] = batch_posteriors[:, :, states.index('UNDER_ATTACK')]
+	return situations, under_attack
+
+def print_usage(exit_code=0):
+	"""Print usage and exit (0 = to stdout, otherwise to stderr)"""
+	f = sys.stderr if exit_code > 0 else sys.stdout
+	print(os.path.basename(__file__) + " -i <input file> [-w <window seconds>] [-l <lower bound>] [-n <num records>] [-m <model file>] [-v]", file=f)
+	print("-i <input file>: CSV format packet records (output by pcap_to_csv.py), or NumPy binary format with " + NPY_EXTENSION + " extension", file=f)
+	print("-w <window seconds>: Width of each time window (default: %d)" % WINDOW_SECONDS, file=f)
+	print("-l <lower bound>: Minimum number of packets received by a Destination IP for it to be decoded (default: %d)" % LOWER_BOUND, file=f)
+	print("-n <num records>: Maximum number of records to read (default: all)", file=f)
+	print("-m <model file>: Model fitted by hmm_fit.py (default: the probabilities of ddos_model.py)", file=f)
+	print("-v: Print the observation symbol of every window of each Destination IP under attack", file=f)
+	sys.exit(exit_code)
+
+def main(argv):
+	input_file = None
+	window_seconds = WINDOW_SECONDS
+	lower_bound = LOWER_BOUND
+	num_records = None
+	model_file = None
+	verbose = False
+
+	try:
+		opts, _ = getopt.getopt(argv, "hi:w:l:n:m:v")
+	except getopt.GetoptError:
+		print_usage(1)
+
+	try:
+		for opt, arg in opts:
+			if opt == '-h':
+				print_usage(0)
+			elif opt == '-i':
+				input_file = arg
+			elif opt == '-w':
+				window_seconds = float(arg)
+			elif opt == '-l':
+				lower_bound = int(arg)
+			elif opt == '-n':
+				num_records = int(arg)
+			elif opt == '-m':
+				model_file = arg
+			elif opt == '-v':
+				verbose = True
+	except ValueError:
+		print_usage(2)
+
+	if input_file is None or window_seconds <= 0:
+		print_usage(1)
+	if not os.path.isfile(input_file):
+		print("Input file not found: " + input_file, file=sys.stderr)
+		sys.exit(3)
+
+	model = Model(start_probability, transition_probability, emission_probability)
+	if model_file is not None:
+		try:
+			model = load_model(model_file)
+		except (IOError, KeyError, ValueError) as e:
+			print("Unable to load model %s: %s" % (model_file, e), file=sys.stderr)
+			sys.exit(4)
+
+	start = timer()
+	try:
+		stats, total_records, total_rejected = file_window_statistics(input_file, window_seconds, num_records)
+		dsts, first_window, windows = window_arrays(stats, lower_bound)
+	except ValueError as e:
+		print("Unable to window records with -w %g: %s" % (window_seconds, e), file=sys.stderr)
+		sys.exit(5)
+	read_time = timer() - start
+	if len(dsts) == 0:
+		print("No Destination IPs received at least %d packets (of %d records)" % (lower_bound, total_records))
+		return
+
+	start = timer()
+	observed = observation_symbols(windows)
+	situations, under_attack_posteriors = decode_windows(observed, model)
+	decode_time = timer() - start
+
+	print("Read %d records (%d rejected) in %.2fs, decoded %d windows of %d Destination IPs in %.2fs"
+		% (total_records, total_rejected, read_time, observed.shape[1], len(dsts), decode_time))
+
+	# Destination IPs with any window under attack, most windows under attack first
+	under_attack = situations == states.index('UNDER_ATTACK')
+	attack_windows = np.count_nonzero(under_attack, axis=1)
+	ranked = np.argsort(-attack_windows, kind='stable')
+	ranked = ranked[attack_windows[ranked] > 0]
+	dotted = ipv4_ints_to_dotted(dsts).astype(str)
+	for dst in ranked:
+		first_attack = np.argmax(under_attack[dst])
+		print("%s\t%d windows under attack, from %.0f, max P(UNDER_ATTACK): %.3f, observed: %s" % (dotted[dst], attack_windows[dst],
+			(first_window + first_attack) * window_seconds, under_attack_posteriors[dst].max(),
+			", ".join("%s %d" % (observations[symbol], count) for symbol, count in enumerate(np.bincount(observed[dst], minlength=len(observations))) if count > 0)))
+		if verbose:
+			print("\t" + " ".join(observations[symbol] for symbol in observed[dst]))
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
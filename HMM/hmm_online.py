@@ -0,0 +1,88 @@
+# Online (incremental) filtering of a stream of observations with a discrete (multinomial emission) HMM.
+#
+# Rather than decoding the whole history again for every new observation, each stream keeps its
+# (normalised) forward vector, so the posterior probability of each state given the observations
+# so far is updated in O(states^2) per observation, with constant memory however long the stream.
+#
+# A fixed-lag Viterbi decision is also kept: the most likely state lag observations ago, traced
+# back through a window of the last lag back-pointers (older back-pointers are discarded, so the
+# decision is the one the full Viterbi path would make unless a later observation overturns it).
+#
+# Usage:
+#	stream = OnlineFilter(start_probability, transition_probability, emission_probability, lag=3)
+#	for observation in observations:
+#		posterior = stream.update(observation)
+#		if posterior[states.index('UNDER_ATTACK')] > 0.5: ...
+
+from __future__ import division
+from collections import deque
+import numpy as np
+
+from hmm_batch import log_probabilities
+
+# Default number of observations by which the fixed-lag Viterbi decision lags the stream
+DEFAULT_LAG = 4
+
+class OnlineFilter(object):
+	"""Forward filter and fixed-lag Viterbi decoder of one stream of observations"""
+
+	def __init__(self, start_probability, transition_probability, emission_probability, lag=DEFAULT_LAG):
+		self.start_probability = np.asarray(start_probability, dtype=float)
+		self.transition_probability = np.asarray(transition_probability, dtype=float)
+		self.emission_probability = np.asarray(emission_probability, dtype=float)
+		self.log_start, self.log_transition, self.log_emission = log_probabilities(start_probability, transition_probability, emission_probability)
+		self.lag = lag
+		self.reset()
+
+	def reset(self):
+		"""Start a new stream"""
+		# number of observations, forward vector (normalised) and log likelihood of the observations
+		self.observations = 0
+		self.alpha = None
+		self.loglikelihood = 0.0
+		# Viterbi path scores (log, relative to the best) and the last lag back-pointers
+		self.delta = None
+		self.back = deque(maxlen=self.lag)
+
+	def update(self, observation):
+		"""Add an observation to the stream, returning the posterior probability of each state now"""
+		emission = self.emission_probability[:, observation]
+		if self.alpha is None:
+			alpha = self.start_probability * emission
+			delta = self.log_start + self.log_emission[:, observation]
+		else:
+			alpha = self.alpha.dot(self.transition_probability) * emission
+			scores = self.delta[:, np.newaxis] + self.log_transition
+			best = np.argmax(scores, axis=0)
+			delta = scores[best, np.arange(len(best))] + self.log_emission[:, observation]
+			if self.lag > 0:
+				self.back.append(best)
+
+		norm = alpha.sum()
+		if norm <= 0:
+			raise ValueError("Observation %d has zero probability given the stream so far" % observation)
+		self.alpha = alpha / norm
+		self.loglikelihood += np.log(norm)
+		self.delta = delta - np.max(delta)
+		self.observations += 1
+		return self.posterior
+
+	@property
+	def posterior(self):
+		"""Posterior probability of each state, given the observations so far"""
+		return None if self.alpha is None else self.alpha.copy()
+
+	def window_states(self):
+		"""Most likely states of the last (up to lag + 1) observations, oldest first"""
+		if self.delta is None:
+			return np.zeros(0, dtype=np.int64)
+		states = [int(np.argmax(self.delta))]
+		for best in reversed(self.back):
+			states.append(int(best[states[-1]]))
+		return np.array(states[::-1], dtype=np.int64)
+
+	def fixed_lag_state(self):
+		"""(index of the observation, most likely state) lag observations ago, or None if the stream isn't that long yet"""
+		if self.observations <= self.lag:
+			return None
+		return self.observations - 1 - self.lag, int(self.window_states()[0])
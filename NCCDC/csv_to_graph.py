@@ -3,7 +3,8 @@
 '''Parse CSV data from a file and plot features in a graph
 
 This script parses PCAP data from a specified CSV file (pre-processed using pcap_to_csv.py),
-plotting features against known packet type.
+plotting features against known packet type. NumPy binary (.npy) files output by pcap_to_csv.py
+are memory mapped rather than parsed.
 
 Example:
     $ python __file__ -i csv_file_data -o /tmp -n 1000000 -l 200 -f -d 12345678
@@ -11,13 +12,18 @@ Example:
 Author: chris.sampson@naimuri.com
 '''
 import logging.config, yaml
-import sys, getopt, os.path, struct, socket
-from tempfile import gettempdir
+import sys, getopt, os.path
+from multiprocessing import Pool
+from tempfile import gettempdir, TemporaryDirectory
 from timeit import default_timer as timer
 
 import matplotlib.pyplot as plt
 import numpy as np
 
+from group_by import group_by, group_rows, group_sum, group_min, group_max
+from ipv4 import ipv4_int_to_dotted, ipv4_ints_to_dotted
+from packet_records import COL_ROWNUM, COL_PROTOCOL, COL_TIME, COL_SOURCE_IP, COL_DEST_IP, COL_SOURCE_PORT, COL_DEST_PORT, COL_TTL, COL_LENGTH, COL_FRAGMENT, COL_FLAGS, RECORD_DTYPE, NPY_EXTENSION, CACHE_DIR_NAME, DEFAULT_CACHE_SIZE, iter_csv_records, load_cached_csv_records, load_csv_records, load_npy_records
+
 '''int:    Bits representing TCP Flags'''
 # FLAG_FIN = 1
 FLAG_SYN = 2
@@ -34,18 +40,86 @@ TYPE_ICMP = 1
 TYPE_TCP = 6
 TYPE_UDP = 17
 
-'''string:    Column names used to access array data from ingested CSV'''
-COL_ROWNUM = 'rownum'
-COL_PROTOCOL = 'protocol'
-COL_TIME = 'time'
-COL_SOURCE_IP = 'src'
-COL_DEST_IP = 'dst'
-COL_SOURCE_PORT = 'src_port'
-COL_DEST_PORT = 'dst_port'
-COL_TTL = 'ttl'
-COL_LENGTH = 'length'
-COL_FRAGMENT = 'fragment'
-COL_FLAGS = 'flags'
+'''list:    Classes of connection by TCP flags then type (label, per-IP statistics field), see classify_connections'''
+CONNECTION_CLASSES = [('SYN', 'received_syn'),              # SYN not ACK
+                      ('ACK', 'received_ack'),              # ACK not SYN or RST
+                      ('SYN-ACK', 'received_synack'),
+                      ('RST', 'received_rst'),              # RST not ACK
+                      ('RST-ACK', 'received_rstack'),
+                      ('TCP', 'received_tcp'),
+                      ('ICMP', 'received_icmp'),
+                      ('UDP', 'received_udp')]
+
+'''int:    TCP Flags determining the class of a connection'''
+FLAG_CLASS_MASK = FLAG_SYN | FLAG_RST | FLAG_ACK
+
+def _class_bit(label):
+    '''Get the bit representing a class of connection (by its label in CONNECTION_CLASSES)'''
+    return 1 << [class_label for class_label, _ in CONNECTION_CLASSES].index(label)
+
+def _flag_class_bits(flags):
+    '''Get the class bits of the connection classes by TCP flags (SYN, ACK, SYN-ACK, RST, RST-ACK) to which a combination of TCP Flags belongs'''
+    syn, rst, ack = (flags & flag == flag for flag in (FLAG_SYN, FLAG_RST, FLAG_ACK))
+    flag_classes = dict(SYN=syn and not ack, ACK=ack and not (syn or rst), RST=rst and not ack)
+    flag_classes['SYN-ACK'] = syn and ack
+    flag_classes['RST-ACK'] = rst and ack
+    return sum(_class_bit(label) for label, is_member in flag_classes.items() if is_member)
+
+'''numpy.ndarray:    Class bits of each combination of TCP Flags (masked by FLAG_CLASS_MASK)'''
+_FLAG_CLASS_BITS = np.array([_flag_class_bits(flags) for flags in range(FLAG_CLASS_MASK + 1)], dtype=np.uint8)
+
+'''numpy.ndarray:    Class bits of each (IP) protocol number'''
+_PROTOCOL_CLASS_BITS = np.zeros(256, dtype=np.uint8)
+_PROTOCOL_CLASS_BITS[TYPE_TCP] = _class_bit('TCP')
+_PROTOCOL_CLASS_BITS[TYPE_ICMP] = _class_bit('ICMP')
+_PROTOCOL_CLASS_BITS[TYPE_UDP] = _class_bit('UDP')
+
+'''str:    Time series of all connections (see connection_time_series)'''
+SERIES_ALL = 'All'
+
+'''list:    Time series plotted by connection type (the others being plotted by flag)'''
+TYPE_SERIES = ['TCP', 'ICMP', 'UDP']
+
+'''dict:    Colour of each plotted time series'''
+SERIES_COLOURS = {SERIES_ALL: 'black', 'SYN': 'red', 'ACK': 'yellow', 'SYN-ACK': 'orange', 'RST': 'blue', 'RST-ACK': 'green', 'TCP': 'r', 'ICMP': 'g', 'UDP': 'b'}
+
+'''str:    Per-IP statistics fields (see _aggregate_ip_stats)'''
+IP_STATS_IP = 'ip'
+IP_STATS_FIELDS = ['received_bytes', 'received_connections', 'received_earliest', 'received_latest', 'sent_bytes', 'sent_connections', 'sent_earliest', 'sent_latest']
+
+'''str:    Per-IP counts of received connections by flag and type (only logged where non-zero)'''
+IP_STATS_COUNT_FIELDS = [field for _, field in CONNECTION_CLASSES]
+
+'''str:    Per-IP number of distinct Source IPs from which connections were received (see _count_received_sources)'''
+IP_STATS_SOURCES = 'received_sources'
+
+'''numpy.dtype:    Per-IP statistics, one element per (Source or Destination) IP'''
+IP_STATS_DTYPE = np.dtype([(IP_STATS_IP, '<i8'),
+                           ('received_bytes', '<i8'), ('received_connections', '<i8'), ('received_earliest', '<f8'), ('received_latest', '<f8'),
+                           ('sent_bytes', '<i8'), ('sent_connections', '<i8'), ('sent_earliest', '<f8'), ('sent_latest', '<f8')] +
+                          [(field, '<i8') for field in IP_STATS_COUNT_FIELDS] + [(IP_STATS_SOURCES, '<i8')])
+
+'''str:    Extension of per-IP statistics files written in NumPy (compressed) archive format, rather than CSV'''
+NPZ_EXTENSION = '.npz'
+
+'''int:    Default number of records aggregated at a time in chunked mode'''
+DEFAULT_CHUNK_SIZE = 1000000
+
+'''list:    Feature graphs of all data (x field, y field, x title, y title, title, output file), points coloured by protocol'''
+FEATURE_GRAPHS = [(COL_SOURCE_IP, COL_DEST_IP, 'Source IP', 'Destination IP', 'Source vs. Destination IP', 'dest_source_ip_analysis.png'),
+                  (COL_SOURCE_PORT, COL_DEST_PORT, 'Source Port', 'Destination Port', 'Source vs. Destination Port', 'dest_source_port_analysis.png'),
+                  (COL_TTL, COL_LENGTH, 'Time to Live', 'Packet Length', 'TTL vs. Packet Length', 'length_ttl_analysis.png'),
+                  (COL_LENGTH, COL_FRAGMENT, 'Packet Length', 'Fragment', 'Packet Length vs. Fragment', 'fragment_length_analysis.png'),
+                  (COL_SOURCE_PORT, COL_FLAGS, 'Source Port', 'Flags', 'Source Port vs. TCP Flags', 'tcpflags_source_port_analysis.png')]
+
+'''int:    Number of files (by Destination IP) to which distinct (Destination IP, Source IP) pairs are spilled in chunked mode'''
+PAIR_SPILL_BUCKETS = 256
+
+'''int:    Number of records copied at a time into the file shared with plotting worker processes'''
+PLOT_BLOCK_RECORDS = 65536
+
+'''int:    Default number of time buckets (i.e. horizontal resolution) to which plotted time series are downsampled'''
+DEFAULT_PLOT_BUCKETS = 2000
 
 '''int:    Default lower bounds limit'''
 DEFAULT_LOWER_BOUNDS = 200
@@ -63,28 +137,22 @@ def _print_usage(exit_code=0):
     '''
     f = sys.stderr if exit_code > 0 else sys.stdout
 
-    print(__file__ + " -i <input file> [-o <output dir>] [-n <num records>] [-l <lower bounds> [-f] [-d <destination ip>]", file=f)
-    print("-i <input file>: CSV format data file to be parsed")
+    print(__file__ + " -i <input file> [-o <output dir>] [-n <num records>] [-l <lower bounds> [-f] [-d <destination ip>] [--no-cache] [--cache-size=<cache size>] [--jobs=<num jobs>] [-c <chunk size>] [--plot-buckets=<num buckets>] [--stats-out=<stats file>]", file=f)
+    print("-i <input file>: CSV format data file to be parsed (or NumPy binary format file, with " + NPY_EXTENSION + " extension, to be memory mapped)")
     print("-n <num records>: Number of CSV rows to read as records for input")
     print("-o <output dir>: Directory for output of graph images (if unspecified, images will saved to the system temp directory)")
     print("-l <lower bounds>: Lower bounds for number of points before plotting a destination IP's incoming sources (default = 200)")
     print("-f: output feature graphs (otherwise omitted)")
     print("-d <destination ip>: Destination IP address (decimal format) to process (otherwise all destinations in file will be processed)")
+    print("--no-cache: parse the CSV input file, rather than using/updating the cache of parsed records (in <output dir>/" + CACHE_DIR_NAME + ")")
+    print("--cache-size <cache size>: Maximum size (MB) of the cache of parsed records, least recently used records are removed beyond this (default = " + str(DEFAULT_CACHE_SIZE // (1024 * 1024)) + ")")
+    print("--jobs <num jobs>: Number of processes used to plot Destination IP graphs in parallel (default = 1)")
+    print("-c <chunk size>: Aggregate the input in chunks of this many records (e.g. " + str(DEFAULT_CHUNK_SIZE) + "), spilling distinct (Destination IP, Source IP) pairs and the records of Destination IPs to be plotted to temporary files in <output dir>, for input larger than memory (the cache is not used)")
+    print("--plot-buckets <num buckets>: Number of time buckets to which Destination IP time series are downsampled before plotting, 0 to plot every packet (default = " + str(DEFAULT_PLOT_BUCKETS) + ")")
+    print("--stats-out <stats file>: Write per-IP statistics to a CSV file (or NumPy archive, with " + NPZ_EXTENSION + " extension) rather than logging them")
 
     sys.exit(exit_code)
 
-def _ipv4_int_to_dotted(ip_address):
-    '''Convert a decimalised Ipv4 Address to its dotted representation
-
-    Args:
-        ip_address (int):       IP (v4) Address in decimalised format
-
-    Returns:
-        str:    Decimal-dot representation of all IP (v4) Address bytes
-
-    '''
-    return socket.inet_ntoa(struct.pack("!L", int(ip_address)))
-
 def _start_plot():
     # create a new figure
     fig = plt.figure(figsize=(8, 6))
@@ -131,41 +199,630 @@ def _get_unique_rows(data_arr, fields_arr):
     '''
     return np.unique(data_arr[fields_arr])
 
-def _plot_feature_graphs(csv_data, output_dir=None):
+def _get_feature_rows(csv_data, feature_rows=None):
+    '''
+    Extract unique rows of data for each feature graph, merged with the unique rows (if any) extracted from other data
+    '''
+    unique_rows = []
+    for i, (x_field, y_field, _, _, _, _) in enumerate(FEATURE_GRAPHS):
+        unique_data = _get_unique_rows(csv_data, [x_field, y_field, COL_PROTOCOL])
+        if feature_rows is not None:
+            unique_data = np.unique(np.concatenate((feature_rows[i], unique_data)))
+        unique_rows.append(unique_data)
+
+    return unique_rows
+
+def _plot_feature_graphs(feature_rows, output_dir=None):
+    '''
+    Plot several 2D graphs comparing standard features of the data (from unique rows of each graph's features)
+    '''
+
+    num_graphs = 0
+
+    for unique_data, (x_field, y_field, x_title, y_title, title, output_file) in zip(feature_rows, FEATURE_GRAPHS):
+        _draw_scatter_graph(unique_data[x_field], unique_data[y_field], unique_data[COL_PROTOCOL], x_title, y_title, title, output_dir, output_file)
+        num_graphs += 1
+
+    return num_graphs
+
+def classify_connections(csv_data):
+    '''Label each connection with the bits of the classes (CONNECTION_CLASSES) it belongs to, in a single pass
+
+    Args:
+        csv_data (numpy.ndarray):   Packet records
+
+    Returns:
+        numpy.ndarray:  Class bits (uint8) of each connection, bit i set for membership of CONNECTION_CLASSES[i]
+
+    '''
+    return _FLAG_CLASS_BITS[csv_data[COL_FLAGS] & FLAG_CLASS_MASK] | _PROTOCOL_CLASS_BITS[np.clip(csv_data[COL_PROTOCOL], 0, len(_PROTOCOL_CLASS_BITS) - 1)]
+
+def connection_time_series(dst_data):
+    '''Cumulative counts over time of a Destination IP's connections, in total and for each connection class
+
+    Connections are classified in a single pass, and the cumulative counts of every class calculated
+    with a single cumulative sum of the class bits.
+
+    Args:
+        dst_data (numpy.ndarray):   Destination IP's packet records, sorted by time
+
+    Returns:
+        list:   (label, times, cumulative counts) series for all connections (SERIES_ALL), then for each class in CONNECTION_CLASSES (where it has any connections)
+
+    '''
+    times = dst_data[COL_TIME]
+    class_bits = np.unpackbits(classify_connections(dst_data)[:, np.newaxis], axis=1, bitorder='little')[:, :len(CONNECTION_CLASSES)]
+    cumulative_counts = np.cumsum(class_bits, axis=0, dtype=np.int64)
+
+    series = [(SERIES_ALL, times, np.arange(1, len(times) + 1))]
+    for i, (label, _) in enumerate(CONNECTION_CLASSES):
+        in_class = class_bits[:, i].astype(bool)
+        if np.any(in_class):
+            series.append((label, times[in_class], cumulative_counts[in_class, i]))
+
+    return series
+
+def _aggregate_ip_stats(csv_data, src_groups=None, dst_groups=None):
+    '''Aggregate bytes, connections, earliest/latest times and received connection classes sent and received by each IP
+
+    Args:
+        csv_data (numpy.ndarray):   Packet records
+        src_groups (Groups):        Records grouped by Source IP (default: None - grouped here)
+        dst_groups (Groups):        Records grouped by Destination IP (default: None - grouped here)
+
+    Returns:
+        numpy.ndarray:  Per-IP statistics (IP_STATS_DTYPE), sorted by IP (0 for IPs that never sent/received)
+
+    '''
+    if src_groups is None:
+        src_groups = group_by(csv_data[COL_SOURCE_IP])
+    if dst_groups is None:
+        dst_groups = group_by(csv_data[COL_DEST_IP])
+
+    ip_keys = np.union1d(src_groups.keys, dst_groups.keys)
+    ips = np.zeros(len(ip_keys), dtype=IP_STATS_DTYPE)
+    ips[IP_STATS_IP] = ip_keys
+
+    # IPs as senders
+    src = np.searchsorted(ips[IP_STATS_IP], src_groups.keys)
+    ips['sent_bytes'][src] = group_sum(src_groups, csv_data[COL_LENGTH])
+    ips['sent_connections'][src] = src_groups.counts
+    ips['sent_earliest'][src] = group_min(src_groups, csv_data[COL_TIME])
+    ips['sent_latest'][src] = group_max(src_groups, csv_data[COL_TIME])
+
+    # IPs as receivers
+    dst = np.searchsorted(ips[IP_STATS_IP], dst_groups.keys)
+    ips['received_bytes'][dst] = group_sum(dst_groups, csv_data[COL_LENGTH])
+    ips['received_connections'][dst] = dst_groups.counts
+    ips['received_earliest'][dst] = group_min(dst_groups, csv_data[COL_TIME])
+    ips['received_latest'][dst] = group_max(dst_groups, csv_data[COL_TIME])
+    class_bits = classify_connections(csv_data)
+    for i, (_, field) in enumerate(CONNECTION_CLASSES):
+        ips[field][dst] = group_sum(dst_groups, (class_bits >> i) & 1)
+
+    return ips
+
+def _merge_ip_stats(ips, other_ips):
+    '''Merge per-IP statistics aggregated from separate sets of records (e.g. chunks of a file)
+
+    Args:
+        ips (numpy.ndarray):        Per-IP statistics (IP_STATS_DTYPE), sorted by IP
+        other_ips (numpy.ndarray):  Per-IP statistics (IP_STATS_DTYPE) to be merged, sorted by IP
+
+    Returns:
+        numpy.ndarray:  Merged per-IP statistics (IP_STATS_DTYPE), sorted by IP
+
+    '''
+    ip_keys = np.union1d(ips[IP_STATS_IP], other_ips[IP_STATS_IP])
+    merged = np.zeros(len(ip_keys), dtype=IP_STATS_DTYPE)
+    merged[IP_STATS_IP] = ip_keys
+    merged[np.searchsorted(ip_keys, ips[IP_STATS_IP])] = ips
+
+    other = np.searchsorted(ip_keys, other_ips[IP_STATS_IP])
+    current = merged[other]
+    for direction in ('sent', 'received'):
+        # earliest/latest times only count where there were connections (otherwise they're 0)
+        has_current = current[direction + '_connections'] > 0
+        has_other = other_ips[direction + '_connections'] > 0
+        for field, combine in ((direction + '_earliest', np.minimum), (direction + '_latest', np.maximum)):
+            merged[field][other] = np.where(has_current & has_other, combine(current[field], other_ips[field]), np.where(has_other, other_ips[field], current[field]))
+
+    # distinct sources can't be summed across sets of records (see _count_received_sources)
+    for field, _ in IP_STATS_DTYPE.descr:
+        if field not in (IP_STATS_IP, IP_STATS_SOURCES) and not field.endswith('_earliest') and not field.endswith('_latest'):
+            merged[field][other] += other_ips[field]
+
+    return merged
+
+def _destination_source_pairs(csv_data):
+    '''Get the distinct (Destination IP, Source IP) pairs of packet records, as single sortable keys
+
+    Args:
+        csv_data (numpy.ndarray):   Packet records
+
+    Returns:
+        numpy.ndarray:  Sorted, distinct pairs (Destination IP in the upper 32 bits, Source IP in the lower)
+
+    '''
+    return np.unique((csv_data[COL_DEST_IP].astype(np.uint64) << np.uint64(32)) | csv_data[COL_SOURCE_IP].astype(np.uint64))
+
+def _count_received_sources(ips, pairs):
+    '''Set the number of distinct Source IPs from which each IP received connections
+
+    Args:
+        ips (numpy.ndarray):    Per-IP statistics (IP_STATS_DTYPE), sorted by IP
+        pairs (numpy.ndarray):  Distinct (Destination IP, Source IP) pairs (see _destination_source_pairs)
+
     '''
-    Plot several 2D graphs comparing standard features of the data
+    dst_ips, num_sources = np.unique((pairs >> np.uint64(32)).astype(np.int64), return_counts=True)
+    ips[IP_STATS_SOURCES][np.searchsorted(ips[IP_STATS_IP], dst_ips)] = num_sources
+
+def _spill_destination_source_pairs(csv_data, spill_dir):
+    '''Append the distinct (Destination IP, Source IP) pairs of a chunk of records to files by Destination IP (see PAIR_SPILL_BUCKETS)
+
+    Args:
+        csv_data (numpy.ndarray):   Packet records
+        spill_dir (str):            Directory for the pair files (<bucket>.pairs, raw uint64 pairs, distinct only within each chunk)
+
+    '''
+    pairs = _destination_source_pairs(csv_data)
+    bucket_groups = group_by((pairs >> np.uint64(32)) % np.uint64(PAIR_SPILL_BUCKETS))
+    for b, bucket in enumerate(bucket_groups.keys):
+        with open(os.path.join(spill_dir, "%d.pairs" % bucket), 'ab') as f:
+            pairs[group_rows(bucket_groups, b)].tofile(f)
+
+def _count_spilled_received_sources(ips, spill_dir):
+    '''Set the number of distinct Source IPs from which each IP received connections, from spilled pairs (see _spill_destination_source_pairs)
+
+    Each file holds every pair of its Destination IPs, so only one file's pairs need to be de-duplicated at a time.
+
+    Args:
+        ips (numpy.ndarray):    Per-IP statistics (IP_STATS_DTYPE), sorted by IP
+        spill_dir (str):        Directory of the pair files
+
+    '''
+    for bucket in range(PAIR_SPILL_BUCKETS):
+        pairs_file = os.path.join(spill_dir, "%d.pairs" % bucket)
+        if os.path.exists(pairs_file):
+            _count_received_sources(ips, np.unique(np.fromfile(pairs_file, dtype=np.uint64)))
+
+def write_ip_stats(ips, stats_file):
+    '''Write per-IP statistics as columns, in NumPy (compressed) archive format (.npz) or otherwise CSV
+
+    Args:
+        ips (numpy.ndarray):    Per-IP statistics (IP_STATS_DTYPE)
+        stats_file (str):       Filename of the statistics file (with NPZ_EXTENSION for NumPy archive format)
+
     '''
+    if stats_file.endswith(NPZ_EXTENSION):
+        np.savez_compressed(stats_file, **{field: ips[field] for field in IP_STATS_DTYPE.names})
+    else:
+        formats = ['%.6f' if IP_STATS_DTYPE[field].kind == 'f' else '%d' for field in IP_STATS_DTYPE.names]
+        np.savetxt(stats_file, ips, fmt=formats, delimiter=',', header=','.join(IP_STATS_DTYPE.names), comments='')
+
+def _time_buckets(times, time_range, num_buckets):
+    '''Assign times to equal width buckets over a time range
+
+    Args:
+        times (numpy.ndarray):  Times
+        time_range (tuple):     (start, end) times of the first and last buckets
+        num_buckets (int):      Number of buckets
+
+    Returns:
+        numpy.ndarray:  Bucket (0 to num_buckets - 1) of each time
+
+    '''
+    start, end = time_range
+    if end <= start:
+        return np.zeros(len(times), dtype=np.int64)
+    return np.clip(((times - start) * (num_buckets / (end - start))).astype(np.int64), 0, num_buckets - 1)
+
+def _downsample_line(x_points, y_points, time_range, num_buckets):
+    '''Downsample a (time-sorted) line to the first, last, minimum and maximum points in each time bucket
+
+    The line drawn through the remaining points covers the same pixels as the full line, when there are
+    no more buckets than pixels across the plot.
+
+    Args:
+        x_points (numpy.ndarray):   Times of the points, sorted
+        y_points (numpy.ndarray):   Values of the points
+        time_range (tuple):         (start, end) times of the plot
+        num_buckets (int):          Number of time buckets (None - no downsampling)
+
+    Returns:
+        tuple:  (x points, y points) downsampled, in time order
+
+    '''
+    if num_buckets is None or len(x_points) <= 4 * num_buckets:
+        return x_points, y_points
+
+    # group points by bucket, ordered by value within each bucket
+    buckets = group_by(_time_buckets(x_points, time_range, num_buckets), y_points)
+    points = np.arange(len(x_points))
+    keep = np.unique(np.concatenate((group_min(buckets, points),
+                                     group_max(buckets, points),
+                                     buckets.order[buckets.starts],
+                                     buckets.order[buckets.starts + buckets.counts - 1])))
+    return x_points[keep], y_points[keep]
+
+def _downsample_scatter(x_points, y_points, labels, time_range, num_buckets):
+    '''Downsample scatter points (by time), keeping the first point of each distinct time bucket, y value and label
+
+    Args:
+        x_points (numpy.ndarray):   Times of the points
+        y_points (numpy.ndarray):   Values of the points
+        labels (numpy.ndarray):     Labels (colours) of the points
+        time_range (tuple):         (start, end) times of the plot
+        num_buckets (int):          Number of time buckets (None - no downsampling)
+
+    Returns:
+        tuple:  (x points, y points, labels) downsampled, in their original order
+
+    '''
+    if num_buckets is None or len(x_points) <= num_buckets:
+        return x_points, y_points, labels
+
+    _, keep = np.unique(np.column_stack((_time_buckets(x_points, time_range, num_buckets), y_points, labels)), axis=0, return_index=True)
+    keep.sort()
+    return x_points[keep], y_points[keep], labels[keep]
+
+def _plot_destination(dst_data, dst_rec, dst_analysis_dir, plot_buckets=DEFAULT_PLOT_BUCKETS):
+    '''Plot graphs of a Destination IP's incoming connections
+
+    Args:
+        dst_data (numpy.ndarray):       Destination IP's packet records, sorted by time
+        dst_rec (numpy.void):           Destination IP's statistics (IP_STATS_DTYPE)
+        dst_analysis_dir (str):         Directory in which to create the Destination IP's graph directory
+        plot_buckets (int):             Number of time buckets to which time series are downsampled (default: DEFAULT_PLOT_BUCKETS, None - no downsampling)
+
+    Returns:
+        tuple:  (number of graphs plotted, dict of received connection details, i.e. number of sources)
 
+    '''
+    dst_ip = int(dst_rec[IP_STATS_IP])
+    ip_rec = {}
     num_graphs = 0
 
-    # plot source/destination IPs
-    unique_data = _get_unique_rows(csv_data, [COL_SOURCE_IP, COL_DEST_IP, COL_PROTOCOL])
-    _draw_scatter_graph(unique_data[COL_SOURCE_IP], unique_data[COL_DEST_IP], unique_data[COL_PROTOCOL], 'Source IP', 'Destination IP', 'Source vs. Destination IP', output_dir, 'dest_source_ip_analysis.png')
+    # create directory for Destination IP's graphs
+    dst_str = ipv4_int_to_dotted(dst_ip)
+    dst_dir = os.path.join(dst_analysis_dir, dst_str)
+    os.makedirs(dst_dir, exist_ok=True)
+
+    # graph each Destination IP for:
+    #    * (scatter) Destination Port vs. Source IP
+    # Connection summary subplots for:
+    #    * (pie) #connections received/sent
+    #    * (pie) #bytes received/sent
+    # Time-series subplots for:
+    #    * (scatter) Destination Port connections
+    #    * (line) #connections (with Flags)
+    #        * (line) #SYN (not ACK) connections
+    #        * (line) #ACK (not SYN or RST) connections
+    #        * (line) #SYN-ACK connections
+    #        * (line) #RST (not ACK) connections
+    #        * (line) #RST-ACK connections
+    #    * (line) #connections (by Type)
+    #        * (line) #TCP connections
+    #        * (line) #ICMP connections
+    #        * (line) #UDP connections
+    #    * (line) #bytes received
+    # Source summary subplots for:
+    #    * (bar) #connections (from Source IP)
+    #    * (bar) #bytes (from Source IP)
+
+    # plot Destination Ports vs. Source IP (indicating protocols used)
+    # get unique points for plotting only (performance)
+    unique_data = _get_unique_rows(dst_data, [COL_DEST_PORT, COL_SOURCE_IP, COL_PROTOCOL])
+    _draw_scatter_graph(unique_data[COL_DEST_PORT], unique_data[COL_SOURCE_IP], unique_data[COL_PROTOCOL], 'Destination Port', 'Source IP', dst_str, dst_dir, 'ports_and_sources.png')
     num_graphs += 1
 
-    # plot source/destination ports
-    unique_data = _get_unique_rows(csv_data, [COL_SOURCE_PORT, COL_DEST_PORT, COL_PROTOCOL])
-    _draw_scatter_graph(unique_data[COL_SOURCE_PORT], unique_data[COL_DEST_PORT], unique_data[COL_PROTOCOL], 'Source Port', 'Destination Port', 'Source vs. Destination Port', output_dir, 'dest_source_port_analysis.png')
+
+    # create pie-chart subplots
+    plt.clf()
+    f, (pie_conns, pie_bytes) = plt.subplots(2)
+
+    # set figure title and x-axis
+    f.suptitle(dst_str + " - Connection Summary")
+
+    # plot total Received vs. Sent connections
+    recv_conns = dst_rec['received_connections']
+    sent_conns = dst_rec['sent_connections']
+    # sizes, labels, colours, title, explode=None, output_dir=None, output_file=None
+    pie_conns.pie([recv_conns, sent_conns], labels=['#Received', '#Sent'], explode=[0.1, 0], colors=['r', 'g'], autopct='%1.1f%%', shadow=True, startangle=90)
+    pie_conns.axis('equal')  # set aspect ratio to be equal so that pie is drawn as a circle.
     num_graphs += 1
 
-    # plot time to live/length
-    unique_data = _get_unique_rows(csv_data, [COL_TTL, COL_LENGTH, COL_PROTOCOL])
-    _draw_scatter_graph(unique_data[COL_TTL], unique_data[COL_LENGTH], unique_data[COL_PROTOCOL], 'Time to Live', 'Packet Length', 'TTL vs. Packet Length', output_dir, 'length_ttl_analysis.png')
+    # plot total Received vs. Sent bytes
+    recv_bytes = dst_rec['received_bytes']
+    sent_bytes = dst_rec['sent_bytes']
+    pie_bytes.pie([recv_bytes, sent_bytes], labels=['Bytes Received', 'Bytes Sent'], explode=[0.1, 0], colors=['y', 'b'], autopct='%1.1f%%', shadow=True, startangle=90)
+    pie_bytes.axis('equal')  # set aspect ratio to be equal so that pie is drawn as a circle.
     num_graphs += 1
 
-    # plot length/fragment
-    unique_data = _get_unique_rows(csv_data, [COL_LENGTH, COL_FRAGMENT, COL_PROTOCOL])
-    _draw_scatter_graph(unique_data[COL_LENGTH], unique_data[COL_FRAGMENT], unique_data[COL_PROTOCOL], 'Packet Length', 'Fragment', 'Packet Length vs. Fragment', output_dir, 'fragment_length_analysis.png')
+    # scale & save image to output dir
+    plt.autoscale(tight=False)
+    plt.savefig(os.path.join(dst_dir, 'connections_summary.png'))
+    plt.close()
+
+
+    # create time-series graphs as subplots in a single figure
+    plt.clf()
+    f, (dst_ports, conn_flags, conn_types, brecv) = plt.subplots(4, sharex=True)
+
+    # set figure title and x-axis
+    f.suptitle(dst_str + " - Time Series Analysis")
+    brecv.set_xlabel('Time / ms').set_fontsize('x-small')
+
+    # time-series plot of single Destination IP (indicating Source IPs), downsampled to the plot budget
+    time_range = (dst_data[COL_TIME][0], dst_data[COL_TIME][-1])
+    times, ports, sources = _downsample_scatter(dst_data[COL_TIME], dst_data[COL_DEST_PORT], dst_data[COL_SOURCE_IP], time_range, plot_buckets)
+    dst_ports.scatter(times, ports, marker=".", c=sources, cmap=plt.cm.get_cmap('Paired'))
+    dst_ports.set_ylabel('Port').set_fontsize('x-small')
+    box = dst_ports.get_position()
+    dst_ports.set_position([box.x0, box.y0, box.width * 0.9, box.height])
     num_graphs += 1
 
-    # src port/flags
-    unique_data = _get_unique_rows(csv_data, [COL_SOURCE_PORT, COL_FLAGS, COL_PROTOCOL])
-    _draw_scatter_graph(unique_data[COL_SOURCE_PORT], unique_data[COL_FLAGS], unique_data[COL_PROTOCOL], 'Source Port', 'Flags', 'Source Port vs. TCP Flags', output_dir, 'tcpflags_source_port_analysis.png')
+
+    # plot received #connections over time, in total and by flag/type (cumulative counts along the time-sorted array)
+    conn_flags.set_ylabel("# by Flag").set_fontsize('x-small')
+    conn_types.set_ylabel("# by Type").set_fontsize('x-small')
+    for label, times, counts in connection_time_series(dst_data):
+        axes = conn_types if label in TYPE_SERIES else conn_flags
+        num_connections = len(times)
+        times, counts = _downsample_line(times, counts, time_range, plot_buckets)
+        axes.plot(times, counts, linestyle='-', color=SERIES_COLOURS[label], label=label + " (" + str(num_connections) + ")")
+
+    # add legends for the different flags and types of the connections
+    for axes in (conn_flags, conn_types):
+        box = axes.get_position()
+        axes.set_position([box.x0, box.y0, box.width * 0.9, box.height])
+        axes.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize='x-small')
+        num_graphs += 1
+
+
+    # plot bytes received over time (cumulative sum of packet lengths along the time-sorted array)
+    times, total_bytes = _downsample_line(dst_data[COL_TIME], np.cumsum(dst_data[COL_LENGTH]), time_range, plot_buckets)
+    brecv.plot(times, total_bytes, linestyle='-', color='b')
+    brecv.set_ylabel("Bytes").set_fontsize('x-small')
+    box = brecv.get_position()
+    brecv.set_position([box.x0, box.y0, box.width * 0.9, box.height])
     num_graphs += 1
 
-    return num_graphs
+    # scale & save image to output dir
+    plt.autoscale(tight=False)
+    plt.savefig(os.path.join(dst_dir, 'time_series.png'))
+    plt.close()
+
+
+    # create Source summary graphs as subplots in a single figure
+    plt.clf()
+
+    # group by Source IP, store each with count of connections and sum of bytes transmitted
+    dst_src_groups = group_by(dst_data[COL_SOURCE_IP])
+    dst_srcs = np.empty([len(dst_src_groups.keys), 3], dtype='object')
+    dst_srcs[:, 0] = ipv4_ints_to_dotted(dst_src_groups.keys).astype(str)
+    dst_srcs[:, 1] = dst_src_groups.counts
+    dst_srcs[:, 2] = group_sum(dst_src_groups, dst_data[COL_LENGTH])
+    ip_rec['received_sources'] = len(dst_srcs)
+
+    dst_src_groups = None
+    if len(dst_srcs) > 0:
+        f, (src_conns, src_bytes) = plt.subplots(2, sharex=True)
+
+        # set image title
+        f.suptitle(dst_str + " - Source Summary")
+
+        # x locations for the groups
+        ind = np.arange(len(dst_srcs))
+
+        # plot #connections from Source
+        src_conns.bar(ind, dst_srcs[:, 1], color='r', align='center')
+        src_conns.set_ylabel("#Connections").set_fontsize('x-small')
+
+        # plot #bytes from Source
+        src_bytes.bar(ind, dst_srcs[:, 2], color='y', align='center')
+        src_bytes.set_ylabel("#Bytes").set_fontsize('x-small')
+
+        # set x-axis labels
+        src_bytes.set_xticks(ind)
+        src_bytes.set_xticklabels(dst_srcs[:, 0], fontsize='x-small')
+        f.subplots_adjust(bottom=0.25)  # increase space for labels
+        plt.setp(src_bytes.get_xticklabels(), rotation=90)  # rotate labels to make readable
+
+        num_graphs += 1
+
+        # scale & save image to output dir
+        plt.autoscale(tight=False)
+        plt.savefig(os.path.join(dst_dir, 'sources_summary.png'))
+        plt.close()
+
+    dst_srcs = None
+
+    return num_graphs, ip_rec
+
+'''numpy.ndarray:    Packet records of the Destination IPs to be plotted, memory mapped by each plotting worker process'''
+_worker_records = None
+
+def _init_plot_worker(npy_file=None):
+    '''Initialise a plotting worker process, memory mapping the records to be plotted (if any)
+
+    Args:
+        npy_file (str):     Filename of the NumPy format file of records (grouped by Destination IP) (default: None)
+
+    '''
+    global _worker_records
+    plt.switch_backend('Agg')
+    if npy_file is not None:
+        _worker_records = load_npy_records(npy_file)
+
+def _plot_destination_task(task):
+    '''Plot graphs of a Destination IP from its range of the worker's memory mapped records
+
+    Args:
+        task (tuple):   (offset of Destination IP's first record, number of records, Destination IP statistics, analysis directory, plot buckets)
+
+    Returns:
+        tuple:  (Destination IP, number of graphs plotted, dict of received connection details)
+
+    '''
+    start, count, dst_rec, dst_analysis_dir, plot_buckets = task
+    return (int(dst_rec[IP_STATS_IP]),) + _plot_destination(_worker_records[start:start + count], dst_rec, dst_analysis_dir, plot_buckets)
+
+def _plot_destinations_parallel(csv_data, dst_groups, plot_dsts, plot_recs, dst_analysis_dir, jobs, plot_buckets):
+    '''Plot graphs of Destination IPs with a pool of worker processes
+
+    Records of the Destination IPs are written (grouped by Destination IP, time-sorted) to a temporary NumPy
+    format file that each worker memory maps, so tasks only pass the offset and number of records to plot.
+
+    Args:
+        csv_data (numpy.ndarray):       Packet records
+        dst_groups (Groups):            Records grouped by Destination IP (ordered by time)
+        plot_dsts (numpy.ndarray):      Indices of the Destination IP groups to plot
+        plot_recs (numpy.ndarray):      Statistics (IP_STATS_DTYPE) of the Destination IPs to plot
+        dst_analysis_dir (str):         Directory in which to create each Destination IP's graph directory
+        jobs (int):                     Number of worker processes
+        plot_buckets (int):             Number of time buckets to which time series are downsampled (None - no downsampling)
+
+    Returns:
+        tuple:  (number of graphs plotted, dict of received connection details for each Destination IP)
+
+    '''
+    num_graphs = 0
+    received_details = {}
+
+    counts = dst_groups.counts[plot_dsts]
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    with TemporaryDirectory(prefix='csv_to_graph_') as tmp_dir:
+        # copy the records to be plotted, a block at a time, into the file shared with the workers
+        npy_file = os.path.join(tmp_dir, "dst_records" + NPY_EXTENSION)
+        rows = np.concatenate([group_rows(dst_groups, d) for d in plot_dsts])
+        records = np.lib.format.open_memmap(npy_file, mode='w+', dtype=csv_data.dtype, shape=(len(rows),))
+        for block_start in range(0, len(rows), PLOT_BLOCK_RECORDS):
+            records[block_start:block_start + PLOT_BLOCK_RECORDS] = csv_data[rows[block_start:block_start + PLOT_BLOCK_RECORDS]]
+        records.flush()
+        records = None
+        rows = None
+
+        with Pool(min(jobs, len(plot_dsts)), _init_plot_worker, (npy_file,)) as pool:
+            # busiest Destination IPs first, so the longest tasks don't end up running last
+            tasks = [(offsets[i], counts[i], plot_recs[i], dst_analysis_dir, plot_buckets) for i in np.argsort(-counts, kind='stable')]
+            for dst_ip, dst_graphs, ip_rec in pool.imap_unordered(_plot_destination_task, tasks):
+                received_details[dst_ip] = ip_rec
+                num_graphs += dst_graphs
+
+    return num_graphs, received_details
+
+def _iter_record_chunks(csv_file, num_records, chunk_size):
+    '''Iterate over fixed size chunks of packet records from a CSV (or NumPy binary) file
+
+    Args:
+        csv_file (str):     Filename of CSV file data to be read (files with a .npy extension are memory mapped)
+        num_records (int):  Maximum number of records to read (None - all records)
+        chunk_size (int):   Number of records in each chunk (the last chunk may be smaller)
+
+    Yields:
+        tuple:  (structured numpy.ndarray of packet records, number of CSV rows rejected) for each chunk
+
+    '''
+    if csv_file.endswith(NPY_EXTENSION):
+        csv_data = load_npy_records(csv_file, num_records)
+        for start in range(0, len(csv_data), chunk_size):
+            yield csv_data[start:start + chunk_size], 0
+        return
+
+    # collect parsed CSV blocks into chunks of chunk_size records
+    pending = []
+    num_pending = 0
+    num_rejected = 0
+    for records, rejected in iter_csv_records(csv_file, num_records):
+        num_rejected += rejected
+        while len(records) > 0:
+            pending.append(records[:chunk_size - num_pending])
+            num_pending += len(pending[-1])
+            records = records[len(pending[-1]):]
+            if num_pending == chunk_size:
+                yield np.concatenate(pending), num_rejected
+                pending = []
+                num_pending = 0
+                num_rejected = 0
+
+    if num_pending > 0 or num_rejected > 0:
+        yield np.concatenate(pending) if num_pending > 0 else np.empty(0, dtype=RECORD_DTYPE), num_rejected
+
+def _sort_by_time(csv_data):
+    '''Sort packet records by time (stable, i.e. records with equal times keep their order), unless already sorted'''
+    if np.all(csv_data[COL_TIME][1:] >= csv_data[COL_TIME][:-1]):
+        return csv_data
+    return csv_data[np.argsort(csv_data[COL_TIME], kind='stable')]
+
+def _spill_destination_records(csv_file, num_records, chunk_size, plot_ips, spill_dir):
+    '''Write the records of Destination IPs to be plotted from each chunk of a file, to one file per Destination IP
+
+    Args:
+        csv_file (str):             Filename of CSV file data to be read (files with a .npy extension are memory mapped)
+        num_records (int):          Maximum number of records to read (None - all records)
+        chunk_size (int):           Number of records read at a time
+        plot_ips (numpy.ndarray):   Sorted Destination IPs to be plotted
+        spill_dir (str):            Directory for the Destination IP record files (<ip>.bin, raw RECORD_DTYPE records in file order)
+
+    '''
+    for csv_data, _ in _iter_record_chunks(csv_file, num_records, chunk_size):
+        # select records of the Destination IPs to be plotted
+        pos = np.minimum(np.searchsorted(plot_ips, csv_data[COL_DEST_IP]), len(plot_ips) - 1)
+        csv_data = csv_data[plot_ips[pos] == csv_data[COL_DEST_IP]]
 
-def plot_csv_features(csv_file, lower_bounds, output_dir, num_records=None, draw_feature_graphs=False, destination_ip=None):
+        # append each Destination IP's records (in file order) to its file
+        dst_groups = group_by(csv_data[COL_DEST_IP])
+        for d, dst_ip in enumerate(dst_groups.keys):
+            with open(os.path.join(spill_dir, "%d.bin" % dst_ip), 'ab') as f:
+                csv_data[group_rows(dst_groups, d)].tofile(f)
+
+def _plot_destination_file_task(task):
+    '''Plot graphs of a Destination IP from its (spilled) records file
+
+    Args:
+        task (tuple):   (filename of Destination IP's records, Destination IP statistics, analysis directory, plot buckets)
+
+    Returns:
+        tuple:  (Destination IP, number of graphs plotted, dict of received connection details)
+
+    '''
+    dst_file, dst_rec, dst_analysis_dir, plot_buckets = task
+    dst_data = _sort_by_time(np.fromfile(dst_file, dtype=RECORD_DTYPE))
+    return (int(dst_rec[IP_STATS_IP]),) + _plot_destination(dst_data, dst_rec, dst_analysis_dir, plot_buckets)
+
+def _plot_spilled_destinations(spill_dir, plot_recs, dst_analysis_dir, jobs, plot_buckets):
+    '''Plot graphs of Destination IPs from their (spilled) records files, in worker processes if jobs > 1
+
+    Args:
+        spill_dir (str):                Directory of the Destination IP record files
+        plot_recs (numpy.ndarray):      Statistics (IP_STATS_DTYPE) of the Destination IPs to plot
+        dst_analysis_dir (str):         Directory in which to create each Destination IP's graph directory
+        jobs (int):                     Number of worker processes
+        plot_buckets (int):             Number of time buckets to which time series are downsampled (None - no downsampling)
+
+    Returns:
+        tuple:  (number of graphs plotted, dict of received connection details for each Destination IP)
+
+    '''
+    num_graphs = 0
+    received_details = {}
+
+    # busiest Destination IPs first, so the longest tasks don't end up running last
+    tasks = [(os.path.join(spill_dir, "%d.bin" % dst_rec[IP_STATS_IP]), dst_rec, dst_analysis_dir, plot_buckets) for dst_rec in plot_recs[np.argsort(-plot_recs['received_connections'], kind='stable')]]
+    if jobs > 1 and len(tasks) > 1:
+        with Pool(min(jobs, len(tasks)), _init_plot_worker) as pool:
+            results = list(pool.imap_unordered(_plot_destination_file_task, tasks))
+    else:
+        results = map(_plot_destination_file_task, tasks)
+
+    for dst_ip, dst_graphs, ip_rec in results:
+        received_details[dst_ip] = ip_rec
+        num_graphs += dst_graphs
+
+    return num_graphs, received_details
+
+def plot_csv_features(csv_file, lower_bounds, output_dir, num_records=None, draw_feature_graphs=False, destination_ip=None, use_cache=True, cache_size=DEFAULT_CACHE_SIZE, jobs=1, chunk_size=None, plot_buckets=DEFAULT_PLOT_BUCKETS, stats_file=None):
     '''Parse PCAP data CSV file content and plot graphs of features vs. known packet type
 
     Fields expected in input:
@@ -182,473 +839,164 @@ def plot_csv_features(csv_file, lower_bounds, output_dir, num_records=None, draw
         flags (TCP)
 
     Args:
-        csv_file (str):    Filename of CSV file data to be read
+        csv_file (str):    Filename of CSV file data to be read (files with a .npy extension are memory mapped as NumPy binary packet records)
         lower_bounds (int): Lower bounds for number of points before plotting a destination IP's incoming sources
         output_dir (str):  Directory for saving graph images (if None, images will be displayed but not saved)
         num_records (int): Maximum number of records to read from input CSV (default: None - all lines)
         draw_feature_graphs (boolean): Whether to draw the feature graphs for the data (default: False)
         destination_ip (int): Destination IP for which to produce analysis (default: None - all IPs)
+        use_cache (boolean): Whether to load parsed CSV records from (and save them to) a cache in the output_dir (default: True)
+        cache_size (int): Maximum size (bytes) of the cache of parsed CSV records (default: DEFAULT_CACHE_SIZE)
+        jobs (int): Number of worker processes plotting Destination IP graphs (default: 1 - plot in this process)
+        chunk_size (int): Number of records aggregated at a time, with distinct (Destination IP, Source IP) pairs and the records of Destination IPs to be plotted spilled to temporary files,
+                          so memory use is bounded by the chunk size rather than the input (default: None - load all records at once)
+        plot_buckets (int): Number of time buckets to which Destination IP time series are downsampled before plotting (default: DEFAULT_PLOT_BUCKETS, None - no downsampling)
+        stats_file (str): Filename to which per-IP statistics are written (see write_ip_stats), rather than logged (default: None - log statistics)
     '''
-    # read CSV file into Numpy multi-dimensional arrays
-    step_start = timer()
-    csv_data = np.genfromtxt(csv_file,
-                            delimiter=',',
-                            autostrip=True,
-                            dtype=None,
-                            names=[COL_ROWNUM,
-                                   COL_PROTOCOL,
-                                   COL_TIME,
-                                   COL_SOURCE_IP,
-                                   COL_DEST_IP,
-                                   COL_SOURCE_PORT,
-                                   COL_DEST_PORT,
-                                   COL_TTL,
-                                   COL_LENGTH,
-                                   COL_FRAGMENT,
-                                   COL_FLAGS],
-                            missing_values='??',
-                            filling_values=0,
-                            invalid_raise=False,
-                            max_rows=num_records)
-
-    # check that we've got a usable array
-    if csv_data is None or not isinstance(csv_data, np.ndarray):
-        logger.error("CSV (%s) to array (0 records or parsing failed) (seconds): %f", csv_file, timer() - step_start)
-        return
+    feature_rows = None
 
-    # stop if there's not enough data in the array to care about
-    try:
-        if len(csv_data) < lower_bounds:
-            logger.warn("CSV (%s) to array (%d records), insufficient records for analysis (%d) (seconds): %f", csv_file, len(csv_data), lower_bounds, timer() - step_start)
+    if chunk_size is None:
+        # read CSV file into Numpy multi-dimensional arrays (or map binary records directly)
+        step_start = timer()
+        num_rejected = 0
+        if csv_file.endswith(NPY_EXTENSION):
+            csv_data = load_npy_records(csv_file, num_records)
+        elif use_cache:
+            csv_data, num_rejected, cache_hit = load_cached_csv_records(csv_file, os.path.join(output_dir, CACHE_DIR_NAME), num_records, cache_size)
+            logger.info("CSV (%s) records %s cache", csv_file, "loaded from" if cache_hit else "added to")
+        else:
+            csv_data, num_rejected = load_csv_records(csv_file, num_records)
+
+        # check that we've got a usable array
+        if csv_data is None or not isinstance(csv_data, np.ndarray):
+            logger.error("CSV (%s) to array (0 records or parsing failed) (seconds): %f", csv_file, timer() - step_start)
             return
-    except TypeError:
-        logger.exception("Unable to confirm length of imported CSV (%s) array object (%s)", csv_file, type(csv_data))
-        import pprint
-        logger.debug("Array with no length: %s", pprint.pformat(csv_data))
-        return
 
-    # log how long the CSV parsing took and the number of records imported
-    logger.info("CSV (%s) to array (%d records) (seconds): %f", csv_file, len(csv_data), timer() - step_start)
+        # stop if there's not enough data in the array to care about
+        try:
+            if len(csv_data) < lower_bounds:
+                logger.warn("CSV (%s) to array (%d records), insufficient records for analysis (%d) (seconds): %f", csv_file, len(csv_data), lower_bounds, timer() - step_start)
+                return
+        except TypeError:
+            logger.exception("Unable to confirm length of imported CSV (%s) array object (%s)", csv_file, type(csv_data))
+            import pprint
+            logger.debug("Array with no length: %s", pprint.pformat(csv_data))
+            return
+
+        # log how long the CSV parsing took and the number of records imported (and rejected as malformed)
+        logger.info("CSV (%s) to array (%d records, %d rejected) (seconds): %f", csv_file, len(csv_data), num_rejected, timer() - step_start)
+
+        if draw_feature_graphs:
+            feature_rows = _get_feature_rows(csv_data)
+
+        # group records by Source IP and by Destination IP (the latter ordered by time), sorting only row indices
+        step_start = timer()
+        src_groups = group_by(csv_data[COL_SOURCE_IP])
+        logger.debug("Source IPs sorted and unique (%d) (seconds): %f", len(src_groups.keys), timer() - step_start)
+
+        step_start = timer()
+        dst_groups = group_by(csv_data[COL_DEST_IP], csv_data[COL_TIME])
+        logger.debug("Destination IPs sorted and unique (%d) (seconds): %f", len(dst_groups.keys), timer() - step_start)
+
+        # build up sent/received details about all IPs
+        ips = _aggregate_ip_stats(csv_data, src_groups, dst_groups)
+        _count_received_sources(ips, _destination_source_pairs(csv_data))
+    else:
+        # build up sent/received details about all IPs (and unique rows for feature graphs) a chunk of records at a time
+        step_start = timer()
+        ips = np.zeros(0, dtype=IP_STATS_DTYPE)
+        num_chunks = 0
+        num_read = 0
+        num_rejected = 0
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        # distinct (Destination IP, Source IP) pairs are spilled to files by Destination IP, rather than held for the whole input
+        with TemporaryDirectory(prefix='csv_to_graph_', dir=output_dir) as spill_dir:
+            for csv_data, rejected in _iter_record_chunks(csv_file, num_records, chunk_size):
+                ips = _merge_ip_stats(ips, _aggregate_ip_stats(csv_data))
+                _spill_destination_source_pairs(csv_data, spill_dir)
+                if draw_feature_graphs:
+                    feature_rows = _get_feature_rows(csv_data, feature_rows)
+                num_chunks += 1
+                num_read += len(csv_data)
+                num_rejected += rejected
+            csv_data = None
+            _count_spilled_received_sources(ips, spill_dir)
+
+        # stop if there's not enough data to care about
+        if num_read < lower_bounds:
+            logger.warn("CSV (%s) aggregated (%d records), insufficient records for analysis (%d) (seconds): %f", csv_file, num_read, lower_bounds, timer() - step_start)
+            return
+
+        logger.info("CSV (%s) aggregated in chunks (%d chunks, %d records, %d rejected) (seconds): %f", csv_file, num_chunks, num_read, num_rejected, timer() - step_start)
 
     # plot feature graphs from data, if requested
     if draw_feature_graphs:
         step_start = timer()
         feature_graphs_dir = os.path.join(output_dir, "feature_graphs")
         os.makedirs(feature_graphs_dir, exist_ok=True)
-        num_graphs = _plot_feature_graphs(csv_data, feature_graphs_dir)
+        num_graphs = _plot_feature_graphs(feature_rows, feature_graphs_dir)
         logger.debug("Feature Graphs plotted (%d) (seconds): %f", num_graphs, timer() - step_start)
+        feature_rows = None
 
-    # build up sent/received details about all IPs
-    ips = {}
-
-    # iterate through collections of Source IP and record details for IP as a sender
-    step_start = timer()
-    sorted_src_data = np.sort(csv_data, order=[COL_SOURCE_IP, COL_TIME])
+    # if IP filter specified, only consider the matching IP
+    if destination_ip is not None:
+        ips = ips[ips[IP_STATS_IP] == destination_ip]
 
-    # split into sub-arrays by unique Source IP
-    src_ips = np.split(sorted_src_data, np.where(np.diff(sorted_src_data[COL_SOURCE_IP]))[0] + 1)
-    logger.debug("Source IPs sorted and unique (%d) (seconds): %f", len(src_ips), timer() - step_start)
-
-    # track number of destinations for each Source IP if in debug mode
-    if logger.isEnabledFor(logging.DEBUG):
-        dests = np.zeros([len(src_ips), 1])
-        s = 0
-
-    for src_data in src_ips:
-        if len(src_data) > 0:
-            # determine current Source IP and number of connection records
-            src_ip = str(src_data[0][COL_SOURCE_IP])
-
-            # if IP filter specified, ensure we've got a match, otherwise ignore the data
-            if destination_ip is None or src_ip == str(destination_ip):
-                num_connections = len(src_data)
-
-                # log sent data stats for the IP
-                ips[src_ip] = dict(received_bytes=0,
-                                    received_connections=0,
-                                    received_earliest=0,
-                                    received_latest=0,
-                                    dst_details=list(),
-                                    sent_bytes=np.sum(src_data[COL_LENGTH]),
-                                    sent_connections=num_connections,
-                                    sent_earliest=src_data[0][COL_TIME],
-                                    sent_latest=src_data[-1][COL_TIME],
-                                    src_details=src_data)
-
-                # debug output of the destination characteristics for all sources
-                if logger.isEnabledFor(logging.DEBUG):
-                    dests[s] = len(src_data)
-                    s += 1
-            else:
-                logger.debug("Ignoring Source data for IP %s due to filter", src_ip)
-
-    src_ips = None
-    if logger.isEnabledFor(logging.DEBUG):
-        logger.debug("Source Destinations - Num: %d, Min: %d, Max: %d, Avg: %f", len(dests), min(dests), max(dests), sum(dests) / len(dests))
+    # debug output of the destination characteristics for all sources
+    if logger.isEnabledFor(logging.DEBUG) and np.any(ips['sent_connections'] > 0):
+        dests = ips['sent_connections'][ips['sent_connections'] > 0]
+        logger.debug("Source Destinations - Num: %d, Min: %d, Max: %d, Avg: %f", len(dests), dests.min(), dests.max(), dests.mean())
         dests = None
 
-    # iterate through collections of Destination IP and record details for IP as a receiver
-    step_start = timer()
-    sorted_dst_data = np.sort(csv_data, order=[COL_DEST_IP, COL_TIME])
-
-    # split into sub-arrays by unique Destination IP
-    dst_ips = np.split(sorted_dst_data, np.where(np.diff(sorted_dst_data[COL_DEST_IP]))[0] + 1)
-    logger.debug("Destination IPs sorted and unique (%d) (seconds): %f", len(dst_ips), timer() - step_start)
-
-    # track number of sources for each Destination IP if in debug mode
-    if logger.isEnabledFor(logging.DEBUG):
-        sources = np.zeros([len(dst_ips), 1])
-        d = 0
-
     num_graphs = 0
-    num_ips = 0
+    num_ips = np.count_nonzero(ips['received_connections'] > 0)
+
+    # details of received connections (i.e. number of sources), for the Destination IPs that are graphed
+    received_details = {}
 
-    # iterate through collections of Destination IP and record details for IP as a receiver and output analysis
+    # plot Destination IPs with enough incoming connections to make it seem like we'd care
+    step_start = timer()
     dst_analysis_dir = os.path.join(output_dir, "dst_analysis")
-    for dst_data in dst_ips:
-        if len(dst_data) > 0:
-            # determine current Destination IP and number of connection records
-            dst_ip = str(dst_data[0][COL_DEST_IP])
-
-            # if IP filter specified, ensure we've got a match, otherwise ignore the data
-            if destination_ip is None or dst_ip == str(destination_ip):
-                num_connections = len(dst_data)
-                total_bytes = np.sum(dst_data[COL_LENGTH])
-
-                # log received data stats for the IP
-                ip_rec = None
-                if not dst_ip in ips:
-                    ip_rec = dict(received_bytes=total_bytes,
-                                        received_connections=num_connections,
-                                        received_earliest=dst_data[0][COL_TIME],
-                                        received_latest=dst_data[-1][COL_TIME],
-                                        dst_details=dst_data,
-                                        sent_bytes=0,
-                                        sent_connections=0,
-                                        sent_earliest=0,
-                                        sent_latest=0,
-                                        src_details=list())
-                    ips[dst_ip] = ip_rec
-                else:
-                    ip_rec = ips[dst_ip]
-                    ip_rec["received_bytes"] = total_bytes
-                    ip_rec["received_connections"] = num_connections
-                    ip_rec["src_details"] = list()
-                    ip_rec["dst_details"] = dst_data
-                    ip_rec['received_earliest'] = dst_data[0][COL_TIME]
-                    ip_rec['received_latest'] = dst_data[-1][COL_TIME]
-
-                # debug output of the source characteristics and times for all destinations
-                if logger.isEnabledFor(logging.DEBUG):
-                    sources[d] = len(dst_data)
-                    d += 1
-
-                # output IP destination graphs (if there are enough incoming connections to make it seem like we'd care...)
-                recv_conns = num_connections
-                if recv_conns > lower_bounds:
-                    # create directory for Destination IP's graphs
-                    dst_str = _ipv4_int_to_dotted(int(dst_ip))
-                    dst_dir = os.path.join(dst_analysis_dir, dst_str)
-                    os.makedirs(dst_dir, exist_ok=True)
-
-                    # graph each Destination IP for:
-                    #    * (scatter) Destination Port vs. Source IP
-                    # Connection summary subplots for:
-                    #    * (pie) #connections received/sent
-                    #    * (pie) #bytes received/sent
-                    # Time-series subplots for:
-                    #    * (scatter) Destination Port connections
-                    #    * (line) #connections (with Flags)
-                    #        * (line) #SYN (not ACK) connections
-                    #        * (line) #ACK (not SYN or RST) connections
-                    #        * (line) #SYN-ACK connections
-					#        * (line) #RST (not ACK) connections
-					#        * (line) #RST-ACK connections
-                    #    * (line) #connections (by Type)
-                    #        * (line) #TCP connections
-                    #        * (line) #ICMP connections
-                    #        * (line) #UDP connections
-                    #    * (line) #bytes received
-                    # Source summary subplots for:
-                    #    * (bar) #connections (from Source IP)
-                    #    * (bar) #bytes (from Source IP)
-
-                    # plot Destination Ports vs. Source IP (indicating protocols used)
-                    # get unique points for plotting only (performance)
-                    unique_data = _get_unique_rows(dst_data, [COL_DEST_PORT, COL_SOURCE_IP, COL_PROTOCOL])
-                    _draw_scatter_graph(unique_data[COL_DEST_PORT], unique_data[COL_SOURCE_IP], unique_data[COL_PROTOCOL], 'Destination Port', 'Source IP', _ipv4_int_to_dotted(dst_ip), dst_dir, 'ports_and_sources.png')
-                    num_graphs += 1
-
-
-                    # create pie-chart subplots
-                    plt.clf()
-                    f, (pie_conns, pie_bytes) = plt.subplots(2)
-
-                    # set figure title and x-axis
-                    f.suptitle(dst_str + " - Connection Summary")
-
-                    # plot total Received vs. Sent connections
-                    dst_rec = ips[dst_ip]
-                    sent_conns = dst_rec['sent_connections']
-                    # sizes, labels, colours, title, explode=None, output_dir=None, output_file=None
-                    pie_conns.pie([recv_conns, sent_conns], labels=['#Received', '#Sent'], explode=[0.1, 0], colors=['r', 'g'], autopct='%1.1f%%', shadow=True, startangle=90)
-                    pie_conns.axis('equal')  # set aspect ratio to be equal so that pie is drawn as a circle.
-                    num_graphs += 1
-
-                    # plot total Received vs. Sent bytes
-                    recv_bytes = total_bytes
-                    sent_bytes = dst_rec['sent_bytes']
-                    pie_bytes.pie([recv_bytes, sent_bytes], labels=['Bytes Received', 'Bytes Sent'], explode=[0.1, 0], colors=['y', 'b'], autopct='%1.1f%%', shadow=True, startangle=90)
-                    pie_bytes.axis('equal')  # set aspect ratio to be equal so that pie is drawn as a circle.
-                    num_graphs += 1
-
-                    # scale & save image to output dir
-                    plt.autoscale(tight=False)
-                    plt.savefig(os.path.join(dst_dir, 'connections_summary.png'))
-                    plt.close()
-
-
-                    # create time-series graphs as subplots in a single figure
-                    plt.clf()
-                    f, (dst_ports, conn_flags, conn_types, brecv) = plt.subplots(4, sharex=True)
-
-                    # set figure title and x-axis
-                    f.suptitle(dst_str + " - Time Series Analysis")
-                    brecv.set_xlabel('Time / ms').set_fontsize('x-small')
-
-                    # time-series plot of single Destination IP (indicating Source IPs)
-                    # unlikely there will be many duplicates when time being considered
-                    dst_ports.scatter(dst_data[COL_TIME], dst_data[COL_DEST_PORT], marker=".", c=dst_data[COL_SOURCE_IP], cmap=plt.cm.get_cmap('Paired'))
-                    dst_ports.set_ylabel('Port').set_fontsize('x-small')
-                    box = dst_ports.get_position()
-                    dst_ports.set_position([box.x0, box.y0, box.width * 0.9, box.height])
-                    num_graphs += 1
-
-
-                    # plot received #connections over time (cumulative sum of connections along the time-sorted array)
-                    # get the times from the packet data
-                    conn_times = np.array(dst_data[COL_TIME])
-                    # create a 2D array of 1s, the same length as the number of connections (times)
-                    conn_time_counts = np.ones([len(conn_times), 2])
-                    # insert the connection times at index 0, then use the additional column of 1s for the cumsum operation
-                    conn_time_counts[:, 0] = conn_times
-                    conn_flags.plot(conn_time_counts[:, 0], np.cumsum(conn_time_counts[:, 1]), linestyle='-', color='black', label="All (" + str(len(conn_times)) + ")")
-                    conn_times = None
-                    conn_time_counts = None
-                    conn_flags.set_ylabel("# by Flag").set_fontsize('x-small')
-
-                    # SYN not ACK
-                    syn_connections = dst_data[(dst_data[COL_FLAGS] & FLAG_SYN == FLAG_SYN) & (dst_data[COL_FLAGS] & FLAG_ACK != FLAG_ACK)]
-                    if len(syn_connections) > 0:
-                        syn_times = np.array(syn_connections[COL_TIME])
-                        # create a 2D array of 1s, the same length as the number of connections (times)
-                        syn_time_counts = np.ones([len(syn_times), 2])
-                        # insert the connection times at index 0, then use the additional column of 1s for the cumsum operation
-                        syn_time_counts[:, 0] = syn_times
-                        conn_flags.plot(syn_time_counts[:, 0], np.cumsum(syn_time_counts[:, 1]), linestyle='-', color='red', label="SYN (" + str(len(syn_connections)) + ")")
-                        ip_rec['received_syn'] = len(syn_connections)
-                        syn_connections = None
-                        syn_times = None
-                        syn_time_counts = None
-
-                    # ACK not SYN or RST
-                    ack_connections = dst_data[(dst_data[COL_FLAGS] & FLAG_ACK == FLAG_ACK) & (dst_data[COL_FLAGS] & FLAG_SYN != FLAG_SYN) & (dst_data[COL_FLAGS] & FLAG_RST != FLAG_RST)]
-                    if len(ack_connections) > 0:
-                        ack_times = np.array(ack_connections[COL_TIME])
-                        # create a 2D array of 1s, the same length as the number of connections (times)
-                        ack_time_counts = np.ones([len(ack_times), 2])
-                        # insert the connection times at index 0, then use the additional column of 1s for the cumsum operation
-                        ack_time_counts[:, 0] = ack_times
-                        conn_flags.plot(ack_time_counts[:, 0], np.cumsum(ack_time_counts[:, 1]), linestyle='-', color='yellow', label="ACK (" + str(len(ack_connections)) + ")")
-                        ip_rec['received_ack'] = len(ack_connections)
-                        ack_connections = None
-                        ack_times = None
-                        ack_time_counts = None
-
-                    # SYN-ACK
-                    synack_connections = dst_data[dst_data[COL_FLAGS] & FLAG_SYNACK == FLAG_SYNACK]
-                    if len(synack_connections) > 0:
-                        synack_times = np.array(synack_connections[COL_TIME])
-                        # create a 2D array of 1s, the same length as the number of connections (times)
-                        synack_time_counts = np.ones([len(synack_times), 2])
-                        # insert the connection times at index 0, then use the additional column of 1s for the cumsum operation
-                        synack_time_counts[:, 0] = synack_times
-                        conn_flags.plot(synack_time_counts[:, 0], np.cumsum(synack_time_counts[:, 1]), linestyle='-', color='orange', label="SYN-ACK (" + str(len(synack_connections)) + ")")
-                        ip_rec['received_synack'] = len(synack_connections)
-                        synack_connections = None
-                        synack_times = None
-                        synack_time_counts = None
-
-                    # RST not ACK
-                    rst_connections = dst_data[(dst_data[COL_FLAGS] & FLAG_RST == FLAG_RST) & (dst_data[COL_FLAGS] & FLAG_ACK != FLAG_ACK)]
-                    if len(rst_connections) > 0:
-                        rst_times = np.array(rst_connections[COL_TIME])
-                        # create a 2D array of 1s, the same length as the number of connections (times)
-                        rst_time_counts = np.ones([len(rst_times), 2])
-                        # insert the connection times at index 0, then use the additional column of 1s for the cumsum operation
-                        rst_time_counts[:, 0] = rst_times
-                        conn_flags.plot(rst_time_counts[:, 0], np.cumsum(rst_time_counts[:, 1]), linestyle='-', color='blue', label="RST (" + str(len(rst_connections)) + ")")
-                        ip_rec['received_rst'] = len(rst_connections)
-                        rst_connections = None
-                        rst_times = None
-                        rst_time_counts = None
-
-                    # RST-ACK
-                    rstack_connections = dst_data[dst_data[COL_FLAGS] & FLAG_RSTACK == FLAG_RSTACK]
-                    if len(rstack_connections) > 0:
-                        rstack_times = np.array(rstack_connections[COL_TIME])
-                        # create a 2D array of 1s, the same length as the number of connections (times)
-                        rstack_time_counts = np.ones([len(rstack_times), 2])
-                        # insert the connection times at index 0, then use the additional column of 1s for the cumsum operation
-                        rstack_time_counts[:, 0] = rstack_times
-                        conn_flags.plot(rstack_time_counts[:, 0], np.cumsum(rstack_time_counts[:, 1]), linestyle='-', color='green', label="RST-ACK (" + str(len(rstack_connections)) + ")")
-                        ip_rec['received_rstack'] = len(rstack_connections)
-                        rstack_connections = None
-                        rstack_times = None
-                        rstack_time_counts = None
-
-                    # add legend for the different types of flags in the connections
-                    box = conn_flags.get_position()
-                    conn_flags.set_position([box.x0, box.y0, box.width * 0.9, box.height])
-                    conn_flags.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize='x-small')
-                    num_graphs += 1
-
-
-                    # plot received #connections over time (cumulative sum of connections along the time-sorted array)
-                    conn_types.set_ylabel("# by Type").set_fontsize('x-small')
-
-                    # TCP
-                    tcp_connections = dst_data[dst_data[COL_PROTOCOL] == TYPE_TCP]
-                    if len(tcp_connections) > 0:
-                        tcp_times = np.array(tcp_connections[COL_TIME])
-                        # create a 2D array of 1s, the same length as the number of connections (times)
-                        tcp_time_counts = np.ones([len(tcp_times), 2])
-                        # insert the connection times at index 0, then use the additional column of 1s for the cumsum operation
-                        tcp_time_counts[:, 0] = tcp_times
-                        conn_types.plot(tcp_time_counts[:, 0], np.cumsum(tcp_time_counts[:, 1]), linestyle='-', color='r', label="TCP (" + str(len(tcp_connections)) + ")")
-
-                        ip_rec['received_tcp'] = len(tcp_connections)
-                        tcp_connections = None
-                        tcp_times = None
-                        tcp_time_counts = None
-
-                    # ICMP
-                    icmp_connections = dst_data[dst_data[COL_PROTOCOL] == TYPE_ICMP]
-                    if len(icmp_connections) > 0:
-                        icmp_times = np.array(icmp_connections[COL_TIME])
-                        # create a 2D array of 1s, the same length as the number of connections (times)
-                        icmp_time_counts = np.ones([len(icmp_times), 2])
-                        # insert the connection times at index 0, then use the additional column of 1s for the cumsum operation
-                        icmp_time_counts[:, 0] = icmp_times
-                        conn_types.plot(icmp_time_counts[:, 0], np.cumsum(icmp_time_counts[:, 1]), linestyle='-', color='g', label="ICMP (" + str(len(icmp_connections)) + ")")
-
-                        ip_rec['received_icmp'] = len(icmp_connections)
-                        icmp_connections = None
-                        icmp_times = None
-                        icmp_time_counts = None
-
-                    # UDP
-                    udp_connections = dst_data[dst_data[COL_PROTOCOL] == TYPE_UDP]
-                    if len(udp_connections) > 0:
-                        udp_times = np.array(udp_connections[COL_TIME])
-                        # create a 2D array of 1s, the same length as the number of connections (times)
-                        udp_time_counts = np.ones([len(udp_times), 2])
-                        # insert the connection times at index 0, then use the additional column of 1s for the cumsum operation
-                        udp_time_counts[:, 0] = udp_times
-                        conn_types.plot(udp_time_counts[:, 0], np.cumsum(udp_time_counts[:, 1]), linestyle='-', color='b', label="UDP (" + str(len(udp_connections)) + ")")
-
-                        ip_rec['received_udp'] = len(udp_connections)
-                        udp_connections = None
-                        udp_times = None
-                        udp_time_counts = None
-
-                    # add legend for the different types of flags in the connections
-                    box = conn_types.get_position()
-                    conn_types.set_position([box.x0, box.y0, box.width * 0.9, box.height])
-                    conn_types.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize='x-small')
-                    num_graphs += 1
-
-
-                    # plot bytes received over time (cumulative sum of packet lengths along the time-sorted array)
-                    brecv.plot(dst_data[COL_TIME], np.cumsum(dst_data[COL_LENGTH]), linestyle='-', color='b')
-                    brecv.set_ylabel("Bytes").set_fontsize('x-small')
-                    box = brecv.get_position()
-                    brecv.set_position([box.x0, box.y0, box.width * 0.9, box.height])
-                    num_graphs += 1
-
-                    # scale & save image to output dir
-                    plt.autoscale(tight=False)
-                    plt.savefig(os.path.join(dst_dir, 'time_series.png'))
-                    plt.close()
-
-
-                    # create Source summary graphs as subplots in a single figure
-                    plt.clf()
-
-                    # split into sub-arrays by unique Source IP
-                    sorted_dst_srcs = np.sort(dst_data, order=[COL_SOURCE_IP])
-                    dst_src_ips = np.split(sorted_dst_srcs, np.where(np.diff(sorted_dst_srcs[COL_SOURCE_IP]))[0] + 1)
-
-                    # create 2D array of 0s, the same length as the number of Source IPs
-                    dst_srcs = np.empty([len(dst_src_ips), 3], dtype='object')
-                    ip_rec['received_sources'] = len(dst_srcs)
-                    s = 0
-                    for dst_src_data in dst_src_ips:
-                        if len(dst_src_data) > 0:
-                            # determine current Source IP, store with count of connections and sum of bytes transmitted
-                            dst_srcs[s, 0] = _ipv4_int_to_dotted(dst_src_data[0][COL_SOURCE_IP])
-                            dst_srcs[s, 1] = len(dst_src_data)
-                            dst_srcs[s, 2] = np.sum(dst_src_data[COL_LENGTH])
-                            s += 1
-
-                    dst_src_ips = None
-                    if len(dst_srcs) > 0:
-                        f, (src_conns, src_bytes) = plt.subplots(2, sharex=True)
-
-                        # set image title
-                        f.suptitle(dst_str + " - Source Summary")
-
-                        # x locations for the groups
-                        ind = np.arange(len(dst_srcs))
-
-                        # plot #connections from Source
-                        src_conns.bar(ind, dst_srcs[:, 1], color='r', align='center')
-                        src_conns.set_ylabel("#Connections").set_fontsize('x-small')
-
-                        # plot #bytes from Source
-                        src_bytes.bar(ind, dst_srcs[:, 2], color='y', align='center')
-                        src_bytes.set_ylabel("#Bytes").set_fontsize('x-small')
-
-                        # set x-axis labels
-                        src_bytes.set_xticks(ind)
-                        src_bytes.set_xticklabels(dst_srcs[:, 0], fontsize='x-small')
-                        f.subplots_adjust(bottom=0.25)  # increase space for labels
-                        plt.setp(src_bytes.get_xticklabels(), rotation=90)  # rotate labels to make readable
-
-                        num_graphs += 1
-
-                        # scale & save image to output dir
-                        plt.autoscale(tight=False)
-                        plt.savefig(os.path.join(dst_dir, 'sources_summary.png'))
-                        plt.close()
-
-                    dst_srcs = None
-
-                num_ips += 1
-            else:
-                # logger.debug("Ignoring Destination data for %s due to filtering", dst_ip)
-                num_ips = num_ips
+    plot_recs = ips[ips['received_connections'] > lower_bounds]
+    if chunk_size is not None:
+        # read the records of the Destination IPs to be plotted again, a chunk at a time, spilling them to temporary files
+        if len(plot_recs) > 0:
+            os.makedirs(output_dir, exist_ok=True)
+            with TemporaryDirectory(prefix='csv_to_graph_', dir=output_dir) as spill_dir:
+                _spill_destination_records(csv_file, num_records, chunk_size, plot_recs[IP_STATS_IP], spill_dir)
+                logger.debug("Destination IP records spilled (%d) (seconds): %f", len(plot_recs), timer() - step_start)
+                num_graphs, received_details = _plot_spilled_destinations(spill_dir, plot_recs, dst_analysis_dir, jobs, plot_buckets)
+    else:
+        plot_dsts = np.searchsorted(dst_groups.keys, plot_recs[IP_STATS_IP])
+        if jobs > 1 and len(plot_dsts) > 1:
+            num_graphs, received_details = _plot_destinations_parallel(csv_data, dst_groups, plot_dsts, plot_recs, dst_analysis_dir, jobs, plot_buckets)
+        else:
+            for d, dst_rec in zip(plot_dsts, plot_recs):
+                # Destination IP's connection records (time-sorted)
+                dst_graphs, received_details[int(dst_rec[IP_STATS_IP])] = _plot_destination(csv_data[group_rows(dst_groups, d)], dst_rec, dst_analysis_dir, plot_buckets)
+                num_graphs += dst_graphs
 
     if logger.isEnabledFor(logging.DEBUG):
         logger.debug("IP analysis (%d), graphs (%d) (seconds): %f", num_ips, num_graphs, timer() - step_start)
-        logger.debug("Destination Sources - Num: %d, Min: %d, Max: %d, Avg: %f", len(sources), min(sources), max(sources), sum(sources) / len(sources))
-        sources = None
-
-    # output stats for IPs
-    stats_ips = {ip:rec for ip, rec in ips.items() if 'received_connections' in rec and rec['received_connections'] > 0}
-    for ip, rec in stats_ips.items():
-        logger.info("Destination statistics: IP=%s, %s", _ipv4_int_to_dotted(ip), {k:v for k, v in rec.items() if k.startswith('received_') or k.startswith('sent_')})
-    stats_ips = None
+        if num_ips > 0:
+            sources = ips['received_connections'][ips['received_connections'] > 0]
+            logger.debug("Destination Sources - Num: %d, Min: %d, Max: %d, Avg: %f", len(sources), sources.min(), sources.max(), sources.mean())
+            sources = None
+
+    # output stats for IPs, written to file all at once or logged one Destination IP at a time
+    if stats_file is not None:
+        step_start = timer()
+        write_ip_stats(ips, stats_file)
+        logger.info("IP statistics (%d) written to (%s) (seconds): %f", len(ips), stats_file, timer() - step_start)
+    else:
+        dst_recs = ips[ips['received_connections'] > 0]
+        for rec, dst_str in zip(dst_recs, ipv4_ints_to_dotted(dst_recs[IP_STATS_IP]).astype(str)):
+            stats = {field:rec[field] for field in IP_STATS_FIELDS}
+            stats.update({field:rec[field] for field in IP_STATS_COUNT_FIELDS if rec[field] > 0})
+            stats.update(received_details.get(int(rec[IP_STATS_IP]), {}))
+            logger.info("Destination statistics: IP=%s, %s", dst_str, stats)
+    received_details = None
     ips = None
 
 def main(argv):
@@ -664,9 +1012,15 @@ def main(argv):
     lower_bounds = DEFAULT_LOWER_BOUNDS
     draw_feature_graphs = False
     destination_ip = None
+    use_cache = True
+    cache_size = DEFAULT_CACHE_SIZE
+    jobs = 1
+    chunk_size = None
+    plot_buckets = DEFAULT_PLOT_BUCKETS
+    stats_file = None
 
     try:
-        opts, _ = getopt.getopt(argv, "hfi:o:n:l:d:")
+        opts, _ = getopt.getopt(argv, "hfi:o:n:l:d:c:", ["no-cache", "cache-size=", "jobs=", "plot-buckets=", "stats-out="])
     except getopt.GetoptError:
         _print_usage(1)
 
@@ -716,6 +1070,51 @@ def main(argv):
             except:
                 logger.exception("Unable to parse Destination IP (-d), must be numeric, got (%s)", arg)
                 sys.exit(8)
+        elif opt == '--no-cache':
+            use_cache = False
+        elif opt == '--cache-size':
+            try:
+                cache_size = int(arg) * 1024 * 1024
+                if cache_size < 1:
+                    logger.error("Cache size (--cache-size) must be greater than 0, got (%s)", arg)
+                    sys.exit(9)
+            except:
+                logger.exception("Unable to parse cache size (--cache-size), must be numeric, got (%s)", arg)
+                sys.exit(10)
+        elif opt == '--jobs':
+            try:
+                jobs = int(arg)
+                if jobs < 1:
+                    logger.error("Number of jobs (--jobs) must be greater than 0, got (%d)", jobs)
+                    sys.exit(11)
+            except:
+                logger.exception("Unable to parse number of jobs (--jobs), must be numeric, got (%s)", arg)
+                sys.exit(12)
+        elif opt == '-c':
+            try:
+                chunk_size = int(arg)
+                if chunk_size < 1:
+                    logger.error("Chunk size (-c) must be greater than 0, got (%d)", chunk_size)
+                    sys.exit(13)
+            except:
+                logger.exception("Unable to parse chunk size (-c), must be numeric, got (%s)", arg)
+                sys.exit(14)
+        elif opt == '--plot-buckets':
+            try:
+                plot_buckets = int(arg)
+                if plot_buckets < 0:
+                    logger.error("Plot buckets (--plot-buckets) must not be negative, got (%d)", plot_buckets)
+                    sys.exit(15)
+                if plot_buckets == 0:
+                    plot_buckets = None
+            except:
+                logger.exception("Unable to parse plot buckets (--plot-buckets), must be numeric, got (%s)", arg)
+                sys.exit(16)
+        elif opt == '--stats-out':
+            stats_file = arg
+            if not os.path.isdir(os.path.dirname(os.path.abspath(stats_file))):
+                logger.error("Invalid statistics file (--stats-out), directory does not exist (%s)", stats_file)
+                sys.exit(17)
 
     logger.info('Input file: %s', inputfile)
     logger.info('Draw feature graphs? %s', draw_feature_graphs)
@@ -728,9 +1127,16 @@ def main(argv):
         logger.info('Lower bounds: %d', lower_bounds)
     if not destination_ip is None:
         logger.info('Destination IP (filter): %d', destination_ip)
+    logger.info('Use cache? %s (max size: %d bytes)', use_cache, cache_size)
+    logger.info('Plotting jobs: %d', jobs)
+    if not chunk_size is None:
+        logger.info('Chunk size: %d records', chunk_size)
+    logger.info('Plot buckets: %s', plot_buckets)
+    if not stats_file is None:
+        logger.info('Statistics file: %s', stats_file)
 
     start = timer()
-    plot_csv_features(inputfile, lower_bounds, outputdir, num_records, draw_feature_graphs, destination_ip)
+    plot_csv_features(inputfile, lower_bounds, outputdir, num_records, draw_feature_graphs, destination_ip, use_cache, cache_size, jobs, chunk_size, plot_buckets, stats_file)
 
     end = timer()
     logger.info("Execution time (seconds): %f", end - start)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Partition CSV packet data into one CSV file per Destination IP
+
+This script streams CSV packet data (pre-processed using pcap_to_csv.py) from one or more files once,
+writing each record to the partition of its Destination IP and of its Source IP, i.e. each partition
+holds all traffic to/from an IP that was the Destination of some traffic. Partitions are sorted by time
+and listed in a manifest (with row counts and time ranges) from which csv_to_graph.py can be run for
+each IP, e.g. csv_to_graph.py -i <file> -d <ip>.
+
+Example:
+    $ python __file__ -i data/2015/csv -o data/2015/ip_csv
+
+Author: chris.sampson@naimuri.com
+'''
+import logging.config, yaml
+import sys, getopt, os.path, heapq
+from glob import glob
+from tempfile import TemporaryDirectory
+from timeit import default_timer as timer
+
+from ipv4 import ipv4_ints_to_dotted
+from packet_records import COL_TIME, COL_SOURCE_IP, COL_DEST_IP, RECORD_DTYPE
+
+'''int:    Position of fields within a CSV row'''
+CSV_POS_TIME = [name for name, _ in RECORD_DTYPE].index(COL_TIME)
+CSV_POS_SOURCE_IP = [name for name, _ in RECORD_DTYPE].index(COL_SOURCE_IP)
+CSV_POS_DEST_IP = [name for name, _ in RECORD_DTYPE].index(COL_DEST_IP)
+
+'''int:    Default maximum size (bytes) of rows buffered in memory before being written to partitions'''
+DEFAULT_BUFFER_SIZE = 64 * 1024 * 1024
+
+'''int:    Default maximum size (bytes) of a partition sorted in memory, larger partitions are sorted with an external merge'''
+DEFAULT_SORT_SIZE = 256 * 1024 * 1024
+
+'''str:    Filename of the manifest of partitions written to the output directory'''
+MANIFEST_FILE = 'manifest.csv'
+
+'''list:    Manifest columns (one row per partition)'''
+MANIFEST_COLUMNS = ['ip', 'address', 'file', 'rows', 'earliest', 'latest']
+
+# setup logging config
+logging.config.dictConfig(yaml.load(open(os.path.join('config', 'logging.yaml'))))
+logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
+
+def _print_usage(exit_code=0):
+    '''Print usage and exit
+
+    Args:
+        exit_code (int):    The exit code to use when terminating the script
+
+    '''
+    f = sys.stderr if exit_code > 0 else sys.stdout
+
+    print(__file__ + " -i <input file/dir> [-i <input file/dir> ...] -o <output dir> [-b <buffer size>] [-s <sort size>]", file=f)
+    print("-i <input file/dir>: CSV format data file (or directory of *.csv files) to be partitioned, may be repeated")
+    print("-o <output dir>: Directory for output of partition CSV files (<ip>.csv) and the partition manifest (" + MANIFEST_FILE + ")")
+    print("-b <buffer size>: Maximum size (MB) of rows buffered in memory before being written to partitions (default = " + str(DEFAULT_BUFFER_SIZE // (1024 * 1024)) + ")")
+    print("-s <sort size>: Maximum size (MB) of a partition sorted in memory, larger partitions are merge sorted via temporary files (default = " + str(DEFAULT_SORT_SIZE // (1024 * 1024)) + ")")
+
+    sys.exit(exit_code)
+
+def _row_time(row):
+    '''Get the time of a CSV row
+
+    Args:
+        row (bytes):    CSV row
+
+    Returns:
+        float:  Time field of the row
+
+    '''
+    return float(row.split(b',', CSV_POS_TIME + 1)[CSV_POS_TIME])
+
+def _partition_file(output_dir, ip):
+    return os.path.join(output_dir, ip.decode('ascii') + '.csv')
+
+def _new_partition():
+    return dict(buffer=[], buffered=0, written=False, rows=0, earliest=None, latest=None, is_sorted=True, is_destination=False)
+
+def _add_row(partition, row, row_time):
+    partition['buffer'].append(row)
+    partition['buffered'] += len(row)
+    partition['rows'] += 1
+
+    if partition['latest'] is None:
+        partition['earliest'] = partition['latest'] = row_time
+    elif row_time >= partition['latest']:
+        partition['latest'] = row_time
+    else:
+        # row is out of time order, so the partition will need sorting once written
+        partition['is_sorted'] = False
+        partition['earliest'] = min(partition['earliest'], row_time)
+
+def _flush_partitions(partitions, output_dir, buffered, max_buffered):
+    '''Write buffered rows to partition files, largest buffers first, until no more than max_buffered bytes remain buffered
+
+    Only one partition file is open at a time, regardless of the number of partitions.
+
+    Args:
+        partitions (dict):      Partitions, keyed by IP
+        output_dir (str):       Directory of partition files
+        buffered (int):         Total size (bytes) of rows currently buffered
+        max_buffered (int):     Maximum size (bytes) of rows to leave buffered
+
+    Returns:
+        int:    Total size (bytes) of rows still buffered
+
+    '''
+    for ip, partition in sorted(partitions.items(), key=lambda item: item[1]['buffered'], reverse=True):
+        if buffered <= max_buffered or partition['buffered'] == 0:
+            break
+
+        # first write to a partition replaces any existing file (e.g. from a previous run)
+        with open(_partition_file(output_dir, ip), 'ab' if partition['written'] else 'wb') as f:
+            f.writelines(partition['buffer'])
+
+        buffered -= partition['buffered']
+        partition['buffer'] = []
+        partition['buffered'] = 0
+        partition['written'] = True
+
+    return buffered
+
+def _write_sorted(rows, output_file):
+    with open(output_file + '.tmp', 'wb') as f:
+        f.writelines(rows)
+    os.replace(output_file + '.tmp', output_file)
+
+def _sort_partition(partition_file, max_sort_size):
+    '''Sort the rows of a partition file by time (stable, so rows with equal times keep their order)
+
+    Partitions larger than max_sort_size are split into sorted runs (in temporary files) of at most
+    max_sort_size bytes, which are then merged.
+
+    Args:
+        partition_file (str):   Filename of the partition
+        max_sort_size (int):    Maximum size (bytes) of rows sorted in memory
+
+    '''
+    if os.path.getsize(partition_file) <= max_sort_size:
+        with open(partition_file, 'rb') as f:
+            rows = f.readlines()
+        rows.sort(key=_row_time)
+        _write_sorted(rows, partition_file)
+        return
+
+    with TemporaryDirectory(prefix='csv_to_partitions_', dir=os.path.dirname(partition_file)) as tmp_dir:
+        run_files = []
+        with open(partition_file, 'rb') as f:
+            while True:
+                rows = f.readlines(max_sort_size)
+                if len(rows) == 0:
+                    break
+                rows.sort(key=_row_time)
+                run_files.append(os.path.join(tmp_dir, "run_%d.csv" % len(run_files)))
+                with open(run_files[-1], 'wb') as run:
+                    run.writelines(rows)
+                rows = None
+
+        logger.debug("Merging %d sorted runs of partition (%s)", len(run_files), partition_file)
+        runs = [open(run_file, 'rb') for run_file in run_files]
+        try:
+            _write_sorted(heapq.merge(*runs, key=_row_time), partition_file)
+        finally:
+            for run in runs:
+                run.close()
+
+def partition_csv_files(csv_files, output_dir, buffer_size=DEFAULT_BUFFER_SIZE, sort_size=DEFAULT_SORT_SIZE):
+    '''Partition CSV packet data files into one time-sorted CSV file per Destination IP, with a manifest
+
+    Each partition (named <ip>.csv) holds every row in which its IP is either the Source or Destination,
+    for each IP that is the Destination of at least one row. Rows that can't be parsed are rejected.
+
+    Args:
+        csv_files (list):   Filenames of CSV files to be partitioned (each read once, in order)
+        output_dir (str):   Directory for the partition files and manifest
+        buffer_size (int):  Maximum size (bytes) of rows buffered in memory before being written to partitions (default: DEFAULT_BUFFER_SIZE)
+        sort_size (int):    Maximum size (bytes) of a partition sorted in memory (default: DEFAULT_SORT_SIZE)
+
+    Returns:
+        list:   Manifest rows (ip, address, file, rows, earliest, latest), one per partition, ordered by IP
+
+    '''
+    partitions = {}
+    buffered = 0
+    num_rows = 0
+    num_rejected = 0
+
+    # stream rows from each file into their IPs' partitions, flushing the largest buffers whenever the buffer size is exceeded
+    step_start = timer()
+    for csv_file in csv_files:
+        with open(csv_file, 'rb') as f:
+            for row in f:
+                fields = row.split(b',', CSV_POS_DEST_IP + 2)
+                try:
+                    row_time = float(fields[CSV_POS_TIME])
+                    src_ip = fields[CSV_POS_SOURCE_IP]
+                    dst_ip = fields[CSV_POS_DEST_IP]
+                except (IndexError, ValueError):
+                    if len(row.strip()) > 0:
+                        num_rejected += 1
+                    continue
+
+                # IPs are used as filenames, so must be decimal
+                if not (src_ip.isdigit() and dst_ip.isdigit()):
+                    num_rejected += 1
+                    continue
+
+                if not row.endswith(b'\n'):
+                    row += b'\n'
+
+                partition = partitions.get(dst_ip)
+                if partition is None:
+                    partition = partitions[dst_ip] = _new_partition()
+                partition['is_destination'] = True
+                _add_row(partition, row, row_time)
+                buffered += len(row)
+
+                if src_ip != dst_ip:
+                    partition = partitions.get(src_ip)
+                    if partition is None:
+                        partition = partitions[src_ip] = _new_partition()
+                    _add_row(partition, row, row_time)
+                    buffered += len(row)
+
+                num_rows += 1
+                if buffered > buffer_size:
+                    buffered = _flush_partitions(partitions, output_dir, buffered, buffer_size // 2)
+
+        logger.info("Partitioned CSV (%s), total %d rows (%d rejected) into %d partitions (seconds): %f", csv_file, num_rows, num_rejected, len(partitions), timer() - step_start)
+
+    # IPs that were only ever a Source aren't analysed, so don't need a partition
+    for ip in [ip for ip, partition in partitions.items() if not partition['is_destination']]:
+        if partitions[ip]['written']:
+            os.remove(_partition_file(output_dir, ip))
+        buffered -= partitions.pop(ip)['buffered']
+    _flush_partitions(partitions, output_dir, buffered, 0)
+
+    # sort the partitions that weren't written in time order
+    step_start = timer()
+    unsorted = [ip for ip, partition in partitions.items() if not partition['is_sorted']]
+    for ip in unsorted:
+        _sort_partition(_partition_file(output_dir, ip), sort_size)
+    logger.info("Sorted %d of %d partitions by time (seconds): %f", len(unsorted), len(partitions), timer() - step_start)
+
+    # write manifest, ordered by IP
+    manifest = []
+    ips = sorted(partitions, key=int)
+    for ip, address in zip(ips, ipv4_ints_to_dotted([int(ip) for ip in ips]).astype(str)):
+        partition = partitions[ip]
+        manifest.append((int(ip), address, os.path.abspath(_partition_file(output_dir, ip)), partition['rows'], partition['earliest'], partition['latest']))
+
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w') as f:
+        print(','.join(MANIFEST_COLUMNS), file=f)
+        for manifest_row in manifest:
+            print("%d,%s,%s,%d,%r,%r" % manifest_row, file=f)
+
+    return manifest
+
+def main(argv):
+    '''Parse input args and partition the CSV data files (-i) into the output directory (-o)
+
+    Args:
+        argv (list):    List of command line arguments
+
+    '''
+    csv_files = []
+    outputdir = None
+    buffer_size = DEFAULT_BUFFER_SIZE
+    sort_size = DEFAULT_SORT_SIZE
+
+    try:
+        opts, _ = getopt.getopt(argv, "hi:o:b:s:")
+    except getopt.GetoptError:
+        _print_usage(1)
+
+    for opt, arg in opts:
+        if opt == '-h':
+            _print_usage(0)
+        elif opt == '-i':
+            if os.path.isdir(arg):
+                csv_files.extend(sorted(glob(os.path.join(arg, '*.csv'))))
+            elif os.path.isfile(arg):
+                csv_files.append(arg)
+            else:
+                logger.error("Invalid input file (-i), file or directory does not exist (%s)", arg)
+                sys.exit(2)
+        elif opt == '-o':
+            outputdir = arg
+            if not os.path.isdir(outputdir):
+                logger.info("Output directory (-o) does not exist (%s), creating", outputdir)
+                try:
+                    os.makedirs(outputdir)
+                except:
+                    logger.exception("Could not create output directory (-o) (%s)", outputdir)
+                    sys.exit(2)
+        elif opt == '-b':
+            try:
+                buffer_size = int(arg) * 1024 * 1024
+                if buffer_size < 1:
+                    logger.error("Buffer size (-b) must be greater than 0, got (%s)", arg)
+                    sys.exit(3)
+            except:
+                logger.exception("Unable to parse buffer size (-b), must be numeric, got (%s)", arg)
+                sys.exit(4)
+        elif opt == '-s':
+            try:
+                sort_size = int(arg) * 1024 * 1024
+                if sort_size < 1:
+                    logger.error("Sort size (-s) must be greater than 0, got (%s)", arg)
+                    sys.exit(5)
+            except:
+                logger.exception("Unable to parse sort size (-s), must be numeric, got (%s)", arg)
+                sys.exit(6)
+
+    if len(csv_files) == 0 or outputdir is None:
+        _print_usage(1)
+
+    logger.info('Input files: %s', csv_files)
+    logger.info('Output directory: %s', outputdir)
+    logger.info('Buffer size: %d bytes, sort size: %d bytes', buffer_size, sort_size)
+
+    start = timer()
+    manifest = partition_csv_files(csv_files, outputdir, buffer_size, sort_size)
+
+    end = timer()
+    logger.info("Partitions (%d) written with manifest (%s), execution time (seconds): %f", len(manifest), os.path.join(outputdir, MANIFEST_FILE), end - start)
+
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1:])
+    except:
+        logger.exception('Problem executing program')
+        raise
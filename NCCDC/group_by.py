@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Group rows of NumPy arrays by key, with a single sort
+
+Rows are grouped by sorting their indices (rather than the rows themselves) once, after which
+aggregates of any column are calculated for all groups with a single vectorised reduction over
+the sorted indices, without creating an array (or any other Python object) per group.
+
+Example:
+    >>> groups = group_by(records[COL_SOURCE_IP])
+    >>> sent_bytes = group_sum(groups, records[COL_LENGTH])
+
+Author: chris.sampson@naimuri.com
+'''
+from collections import namedtuple
+
+import numpy as np
+
+Groups = namedtuple('Groups', ['order', 'keys', 'starts', 'counts'])
+'''namedtuple:    Rows grouped by key
+
+    order (numpy.ndarray):  Indices of the rows, sorted by key (then by the sort_by values, if any)
+    keys (numpy.ndarray):   Unique keys, in sorted order
+    starts (numpy.ndarray): Offset within order of the first row of each group
+    counts (numpy.ndarray): Number of rows in each group
+'''
+
+def group_by(keys, sort_by=None):
+    '''Group rows by key, sorting row indices by key (and optionally within each group)
+
+    Args:
+        keys (numpy.ndarray):       Key of each row
+        sort_by (numpy.ndarray):    Values by which rows are ordered within each group (default: None - original row order)
+
+    Returns:
+        Groups:     Rows grouped by key
+
+    '''
+    # rows already in sort_by order (e.g. time-ordered packets) keep that order within a stable sort by key
+    if sort_by is None or np.all(sort_by[1:] >= sort_by[:-1]):
+        order = np.argsort(keys, kind='stable')
+    else:
+        order = np.lexsort((sort_by, keys))
+
+    # keys are now sorted, so each group starts where the key changes (a linear scan, rather than another sort)
+    sorted_keys = keys[order]
+    if len(sorted_keys) == 0:
+        starts = np.zeros(0, dtype=np.intp)
+    else:
+        starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    counts = np.diff(np.append(starts, len(sorted_keys)))
+    return Groups(order, sorted_keys[starts], starts, counts)
+
+def group_rows(groups, group):
+    '''Get the (sorted) indices of the rows in a group
+
+    Args:
+        groups (Groups):    Rows grouped by key
+        group (int):        Index of the group (i.e. of its key within groups.keys)
+
+    Returns:
+        numpy.ndarray:  Indices of the group's rows
+
+    '''
+    start = groups.starts[group]
+    return groups.order[start:start + groups.counts[group]]
+
+def _group_reduce(ufunc, groups, values):
+    if len(groups.starts) == 0:
+        return np.zeros(0, dtype=values.dtype)
+    return ufunc.reduceat(values[groups.order], groups.starts)
+
+def group_sum(groups, values):
+    '''Sum values for each group
+
+    Args:
+        groups (Groups):            Rows grouped by key
+        values (numpy.ndarray):     Value of each row (in original row order)
+
+    Returns:
+        numpy.ndarray:  Sum of the values in each group
+
+    '''
+    return _group_reduce(np.add, groups, values)
+
+def group_min(groups, values):
+    '''Minimum of values for each group
+
+    Args:
+        groups (Groups):            Rows grouped by key
+        values (numpy.ndarray):     Value of each row (in original row order)
+
+    Returns:
+        numpy.ndarray:  Minimum of the values in each group
+
+    '''
+    return _group_reduce(np.minimum, groups, values)
+
+def group_max(groups, values):
+    '''Maximum of values for each group
+
+    Args:
+        groups (Groups):            Rows grouped by key
+        values (numpy.ndarray):     Value of each row (in original row order)
+
+    Returns:
+        numpy.ndarray:  Maximum of the values in each group
+
+    '''
+    return _group_reduce(np.maximum, groups, values)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Convert IP (v4) Addresses between decimalised (integer) and dotted representations
+
+Whole arrays of addresses are converted at a time, with NumPy operations over every address rather
+than a Python call per address; single addresses are converted with (memoised) scalar functions,
+for where addresses arrive one at a time (e.g. packets dissected by scapy).
+
+Compatible with python 2 (e.g. for DecisionTree.py) as well as python 3.
+
+Example:
+    $ python __file__ 167772161 167772162
+    $ python __file__ -d 10.0.0.1 10.0.0.2
+
+    >>> ipv4_ints_to_dotted(records[COL_SOURCE_IP])
+    >>> ipv4_to_int('10.0.0.1')
+
+Author: chris.sampson@naimuri.com
+'''
+from __future__ import print_function
+import sys, getopt, struct, socket
+
+import numpy as np
+
+try:
+    from functools import lru_cache
+except ImportError:
+    lru_cache = None
+
+'''int:    Maximum number of addresses memoised by each scalar conversion'''
+IPV4_CACHE_SIZE = 65536
+
+'''numpy.dtype:    Dotted IP (v4) Addresses as byte strings (up to 15 characters, i.e. 255.255.255.255)'''
+IPV4_DOTTED_DTYPE = np.dtype('S15')
+
+'''numpy.ndarray:    Dotted representation of each octet value (0-255)'''
+_OCTETS = np.array([str(octet).encode('ascii') for octet in range(256)], dtype='S3')
+
+'''numpy.ndarray:    Shifts of each octet of a decimalised address, most significant first'''
+_OCTET_SHIFTS = np.array([24, 16, 8, 0], dtype=np.uint32)
+
+def _memoise(function):
+    # python 2 has no lru_cache, so memoise in a dict (cleared when full) instead
+    if lru_cache is not None:
+        return lru_cache(maxsize=IPV4_CACHE_SIZE)(function)
+
+    cache = {}
+    def memoised(value):
+        try:
+            return cache[value]
+        except KeyError:
+            if len(cache) >= IPV4_CACHE_SIZE:
+                cache.clear()
+            result = cache[value] = function(value)
+            return result
+    memoised.__doc__ = function.__doc__
+    return memoised
+
+@_memoise
+def ipv4_to_int(ip_address):
+    '''Convert an Ipv4 Address to its decimal representation
+
+    Args:
+        ip_address (str):   IP (v4) Address in standard decimal-dot format
+
+    Returns:
+        int:    Decimal representation of all IP (v4) Address bytes
+
+    '''
+    return struct.unpack('>L', socket.inet_aton(ip_address))[0]
+
+@_memoise
+def ipv4_int_to_dotted(ip_address):
+    '''Convert a decimalised Ipv4 Address to its dotted representation
+
+    Args:
+        ip_address (int):   IP (v4) Address in decimalised format
+
+    Returns:
+        str:    Decimal-dot representation of all IP (v4) Address bytes
+
+    '''
+    return socket.inet_ntoa(struct.pack('>L', int(ip_address)))
+
+def ipv4_ints_to_dotted(ip_addresses):
+    '''Convert an array of decimalised Ipv4 Addresses to their dotted representations
+
+    Args:
+        ip_addresses (numpy.ndarray):   IP (v4) Addresses in decimalised format (any integer type)
+
+    Returns:
+        numpy.ndarray:  Decimal-dot representations, as byte strings (IPV4_DOTTED_DTYPE); use .astype(str) for (unicode) strings
+
+    '''
+    ip_addresses = np.asarray(ip_addresses).astype(np.uint32)
+    octets = (ip_addresses[..., np.newaxis] >> _OCTET_SHIFTS) & 0xFF
+
+    dotted = _OCTETS[octets[..., 0]]
+    for i in range(1, len(_OCTET_SHIFTS)):
+        dotted = np.char.add(np.char.add(dotted, b'.'), _OCTETS[octets[..., i]])
+    return dotted.astype(IPV4_DOTTED_DTYPE)
+
+def ipv4_dotted_to_ints(ip_addresses):
+    '''Convert an array of dotted Ipv4 Addresses to their decimal representations
+
+    Args:
+        ip_addresses (numpy.ndarray):   IP (v4) Addresses in standard decimal-dot format (byte or unicode strings)
+
+    Returns:
+        numpy.ndarray:  Decimal representations of the addresses (numpy.uint32)
+
+    Raises:
+        ValueError: If any address isn't four dot separated decimal octets (0-255)
+
+    '''
+    ip_addresses = np.asarray(ip_addresses)
+    if ip_addresses.dtype.kind not in 'SU':
+        ip_addresses = ip_addresses.astype(str)
+    if ip_addresses.size == 0:
+        return np.zeros(ip_addresses.shape, dtype=np.uint32)
+
+    # check the characters of each address (as a row of codes, 0 padded): four octets of decimal digits, separated by dots
+    flat = np.ascontiguousarray(ip_addresses).reshape(-1)
+    chars = flat.view(np.uint8 if flat.dtype.kind == 'S' else np.uint32).reshape(len(flat), -1)
+    is_dot = chars == ord('.')
+    is_end = chars == 0
+    valid = np.all(((chars >= ord('0')) & (chars <= ord('9'))) | is_dot | is_end, axis=1)
+    valid &= np.count_nonzero(is_dot, axis=1) == 3
+    valid &= ~np.any(is_end[:, :-1] & ~is_end[:, 1:], axis=1)
+    valid &= ~is_dot[:, 0] & ~is_dot[np.arange(len(flat)), np.maximum(np.count_nonzero(~is_end, axis=1) - 1, 0)]
+    valid &= ~np.any(is_dot[:, :-1] & is_dot[:, 1:], axis=1)
+    if not np.all(valid):
+        raise ValueError("Invalid IP (v4) Addresses: %s" % flat[~valid][:10])
+
+    # parse the octets of all addresses at once, as a single dot separated string
+    separator = b'.' if flat.dtype.kind == 'S' else u'.'
+    octets = np.fromstring(separator.join(flat.tolist()), dtype=np.int64, sep='.').reshape(len(flat), 4)
+    if np.any(octets > 255):
+        raise ValueError("Invalid IP (v4) Addresses: %s" % flat[np.any(octets > 255, axis=1)][:10])
+
+    return ((octets[:, 0] << 24) | (octets[:, 1] << 16) | (octets[:, 2] << 8) | octets[:, 3]).astype(np.uint32).reshape(ip_addresses.shape)
+
+def _print_usage(exit_code=0):
+    '''Print usage and exit
+
+    Args:
+        exit_code (int):    Exit code (0 = print to STDOUT, otherwise to STDERR)
+
+    '''
+    f = sys.stderr if exit_code > 0 else sys.stdout
+
+    print(__file__ + " [-d] [<ip address> ...]", file=f)
+    print("<ip address>: IP (v4) Addresses to be converted, one per line from STDIN if none are specified")
+    print("-d: Convert dotted addresses to decimalised (default: decimalised to dotted)")
+
+    sys.exit(exit_code)
+
+def main(argv):
+    '''Parse input args and convert IP (v4) Addresses, printing one per line to STDOUT
+
+    Args:
+        argv (list):    List of command line arguments
+
+    '''
+    to_ints = False
+
+    try:
+        opts, args = getopt.getopt(argv, "hd")
+    except getopt.GetoptError:
+        _print_usage(1)
+
+    for opt, _ in opts:
+        if opt == '-h':
+            _print_usage(0)
+        elif opt == '-d':
+            to_ints = True
+
+    ip_addresses = args if args else sys.stdin.read().split()
+
+    try:
+        if to_ints:
+            converted = ipv4_dotted_to_ints(ip_addresses)
+        else:
+            converted = ipv4_ints_to_dotted(np.array(ip_addresses, dtype=np.int64)).astype(str)
+    except ValueError as ve:
+        print(ve, file=sys.stderr)
+        sys.exit(2)
+
+    if len(converted) > 0:
+        print('\n'.join(converted.astype(str)))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
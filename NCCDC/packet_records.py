@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''Decimalised IP (v4) packet records, as output by pcap_to_csv.py
+
+Defines the columns of packet records and their NumPy structured data type, shared by the scripts
+producing and consuming the records, along with reading & writing of records in NumPy (.npy)
+binary format. Binary records can be memory mapped directly, without any parsing.
+
+CSV records are parsed in large blocks of bytes with a fixed data type, rather than line by line,
+and can be cached on disk (in NumPy binary format) so that repeat loads need no parsing at all.
+
+Example:
+    >>> records = load_npy_records('dayone.npy')
+    >>> records, num_rejected = load_csv_records('dayone.csv')
+    >>> records, num_rejected, cache_hit = load_cached_csv_records('dayone.csv', '/tmp/record_cache')
+    >>> records[COL_DEST_IP]
+
+Author: chris.sampson@naimuri.com
+'''
+import struct, os.path, hashlib, json, glob, shutil
+
+import numpy as np
+
+'''string:    Column names used to access array data of packet records'''
+COL_ROWNUM = 'rownum'
+COL_PROTOCOL = 'protocol'
+COL_TIME = 'time'
+COL_SOURCE_IP = 'src'
+COL_DEST_IP = 'dst'
+COL_SOURCE_PORT = 'src_port'
+COL_DEST_PORT = 'dst_port'
+COL_TTL = 'ttl'
+COL_LENGTH = 'length'
+COL_FRAGMENT = 'fragment'
+COL_FLAGS = 'flags'
+
+'''list:    Structured data type of packet records (fields not present in a packet, e.g. ports for ICMP, are 0)'''
+RECORD_DTYPE = [(COL_ROWNUM, '<i8'),
+                (COL_PROTOCOL, '<i8'),
+                (COL_TIME, '<f8'),
+                (COL_SOURCE_IP, '<i8'),
+                (COL_DEST_IP, '<i8'),
+                (COL_SOURCE_PORT, '<i8'),
+                (COL_DEST_PORT, '<i8'),
+                (COL_TTL, '<i8'),
+                (COL_LENGTH, '<i8'),
+                (COL_FRAGMENT, '<i8'),
+                (COL_FLAGS, '<i8')]
+
+'''string:    File extension of packet records in NumPy binary format'''
+NPY_EXTENSION = '.npy'
+
+'''int:    Size of the NumPy format header written for packet records (fixed, so it can be re-written once the number of records is known)'''
+NPY_HEADER_SIZE = 512
+
+'''int:    Number of bytes of CSV data read and parsed at a time'''
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+
+'''bytes:    Value output for fields not present in a packet (ports, e.g. for ICMP), parsed as 0'''
+CSV_MISSING_VALUE = b'??'
+
+'''int:    Version of the packet records cache, part of cache keys so that changes to the cache (or data type) invalidate old entries'''
+CACHE_VERSION = 1
+
+'''string:    Name of the packet records cache directory'''
+CACHE_DIR_NAME = 'record_cache'
+
+'''int:    Default maximum size (bytes) of the packet records cache, least recently used entries are evicted beyond this'''
+DEFAULT_CACHE_SIZE = 10 * 1024 * 1024 * 1024
+
+'''numpy.ndarray:    Lookup of the bytes that may appear in a (valid) CSV record'''
+_CSV_BYTES = np.zeros(256, dtype=bool)
+_CSV_BYTES[np.frombuffer(b'0123456789.-+eE?, \t\n', dtype=np.uint8)] = True
+
+def write_npy_header(npy_file, num_records):
+    '''Write (or re-write) the NumPy (.npy) format header for an array of packet records at the start of a file
+
+    The header is always NPY_HEADER_SIZE bytes, records should be written immediately after it.
+
+    Args:
+        npy_file (file):    Binary file object (seekable) to which the header is written
+        num_records (int):  Number of records in the array
+
+    '''
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(np.dtype(RECORD_DTYPE)), num_records)
+
+    # magic string, version (1.0) and header length precede the header, which is padded with spaces and terminated by a newline
+    header = header.ljust(NPY_HEADER_SIZE - 11) + '\n'
+    npy_file.seek(0)
+    npy_file.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1'))
+
+def load_npy_records(npy_file, num_records=None):
+    '''Memory map an array of packet records from a NumPy (.npy) format file
+
+    Args:
+        npy_file (str):     Filename of the NumPy format file
+        num_records (int):  Maximum number of records to map (default: None - all records)
+
+    Returns:
+        numpy.ndarray:  (read-only) Memory mapped structured array of packet records
+
+    '''
+    return np.load(npy_file, mmap_mode='r')[:num_records]
+
+def _parse_csv_block(block, num_columns):
+    '''Parse a block of complete CSV lines into a 2D array of values, rejecting malformed rows
+
+    Rows with the wrong number of columns or unexpected characters are dropped, missing (??) and
+    empty values are parsed as 0. Blank lines are ignored (and not rejected).
+
+    Args:
+        block (bytes):      CSV lines, each terminated by a newline
+        num_columns (int):  Number of columns expected in each row
+
+    Returns:
+        tuple:  (2D numpy.ndarray of float values, one row per valid CSV row, number of rows rejected)
+
+    '''
+    data = np.frombuffer(block, dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord('\n'))
+
+    # count the commas in each line from the number of commas preceding each newline
+    commas = np.diff(np.searchsorted(np.flatnonzero(data == ord(',')), newlines), prepend=0)
+    line_lengths = np.diff(newlines, prepend=-1)
+    valid = commas == num_columns - 1
+
+    # lines with invalid characters are rare, only locate their lines when there are any
+    invalid = np.flatnonzero(~_CSV_BYTES[data])
+    if len(invalid) > 0:
+        valid[np.searchsorted(newlines, invalid)] = False
+    blank = line_lengths == 1
+    num_rejected = int(np.count_nonzero(~valid & ~blank))
+    if not valid.all():
+        block = data[np.repeat(valid, line_lengths)].tobytes()
+
+    num_rows = int(np.count_nonzero(valid))
+    if num_rows == 0:
+        return np.empty((0, num_columns)), num_rejected
+
+    # fill missing & empty values, then parse all values of the block at once
+    block = block.replace(CSV_MISSING_VALUE, b'0').replace(b',\n', b',0\n')
+    if b',,' in block:
+        block = block.replace(b',,', b',0,').replace(b',,', b',0,')
+    if b'\n,' in block:
+        block = block.replace(b'\n,', b'\n0,')
+    if block.startswith(b','):
+        block = b'0' + block
+    try:
+        values = np.fromstring(block[:-1].replace(b'\n', b','), sep=',')
+        if values.size == num_rows * num_columns:
+            return values.reshape(num_rows, num_columns), num_rejected
+    except ValueError:
+        pass
+
+    # fall back to parsing line by line if values within the rows were malformed (e.g. 1.2.3)
+    rows = []
+    for line in block[:-1].split(b'\n'):
+        try:
+            rows.append([float(value) for value in line.split(b',')])
+        except ValueError:
+            num_rejected += 1
+    return np.array(rows, dtype=float).reshape(-1, num_columns), num_rejected
+
+def _values_to_records(values):
+    records = np.empty(len(values), dtype=RECORD_DTYPE)
+    for i, (name, _) in enumerate(RECORD_DTYPE):
+        records[name] = values[:, i]
+    return records
+
+def iter_csv_records(csv_file, num_records=None, block_size=CSV_BLOCK_SIZE):
+    '''Iterate over blocks of packet records parsed from a CSV file (as output by pcap_to_csv.py)
+
+    The file is read and parsed a block at a time, with the fixed packet records data type (RECORD_DTYPE),
+    so memory use is bounded by the block size regardless of the size of the file. Malformed rows
+    (e.g. with the wrong number of columns) are rejected and counted.
+
+    Args:
+        csv_file (str):     Filename of CSV file data to be read
+        num_records (int):  Maximum number of records to read (default: None - all records)
+        block_size (int):   Number of bytes read and parsed at a time (default: CSV_BLOCK_SIZE)
+
+    Yields:
+        tuple:  (structured numpy.ndarray of packet records, number of rows rejected) for each block
+
+    '''
+    num_columns = len(RECORD_DTYPE)
+    num_rows = 0
+
+    with open(csv_file, 'rb') as f:
+        remainder = b''
+        while num_records is None or num_rows < num_records:
+            data = f.read(block_size)
+            if len(data) == 0:
+                if len(remainder) == 0:
+                    break
+                data = b'\n'
+
+            # parse complete lines, carrying any partial line over to the next block
+            data = (remainder + data).replace(b'\r', b'')
+            end = data.rfind(b'\n') + 1
+            remainder = data[end:]
+            values, rejected = _parse_csv_block(data[:end], num_columns)
+
+            if num_records is not None:
+                values = values[:num_records - num_rows]
+            num_rows += len(values)
+            yield _values_to_records(values), rejected
+
+def load_csv_records(csv_file, num_records=None, block_size=CSV_BLOCK_SIZE):
+    '''Load packet records from a CSV file (as output by pcap_to_csv.py)
+
+    The file is read and parsed in blocks, with the fixed packet records data type (RECORD_DTYPE).
+    Malformed rows (e.g. with the wrong number of columns) are rejected and counted.
+
+    Args:
+        csv_file (str):     Filename of CSV file data to be read
+        num_records (int):  Maximum number of records to read (default: None - all records)
+        block_size (int):   Number of bytes read and parsed at a time (default: CSV_BLOCK_SIZE)
+
+    Returns:
+        tuple:  (structured numpy.ndarray of packet records, number of rows rejected)
+
+    '''
+    blocks = []
+    num_rejected = 0
+    for records, rejected in iter_csv_records(csv_file, num_records, block_size):
+        blocks.append(records)
+        num_rejected += rejected
+
+    records = np.concatenate(blocks) if len(blocks) > 0 else np.empty(0, dtype=RECORD_DTYPE)
+    return records, num_rejected
+
+def _hash_file_content(filename, block_size=CSV_BLOCK_SIZE):
+    '''Calculate a hash of the content of a file
+
+    Args:
+        filename (str):     Name of the file to be hashed
+        block_size (int):   Number of bytes read at a time (default: CSV_BLOCK_SIZE)
+
+    Returns:
+        str:    Hex digest (SHA-1) of the file content
+
+    '''
+    content_hash = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for data in iter(lambda: f.read(block_size), b''):
+            content_hash.update(data)
+    return content_hash.hexdigest()
+
+def _evict_cache_entries(cache_dir, max_cache_bytes):
+    '''Remove least recently used entries from the packet records cache until it is within its size limit
+
+    Args:
+        cache_dir (str):        Directory of the packet records cache
+        max_cache_bytes (int):  Maximum size (bytes) of the cache
+
+    '''
+    entries = []
+    for meta_file in glob.glob(os.path.join(cache_dir, '*.json')):
+        npy_file = os.path.splitext(meta_file)[0] + NPY_EXTENSION
+        try:
+            entries.append((os.path.getmtime(meta_file), os.path.getsize(npy_file), meta_file, npy_file))
+        except OSError:
+            # entry being written or removed by another process
+            continue
+
+    cache_bytes = sum(entry[1] for entry in entries)
+    for _, npy_bytes, meta_file, npy_file in sorted(entries):
+        if cache_bytes <= max_cache_bytes:
+            break
+        for entry_file in (meta_file, npy_file):
+            try:
+                os.remove(entry_file)
+            except OSError:
+                pass
+        cache_bytes -= npy_bytes
+
+def _link_or_copy(src_file, dst_file):
+    '''Atomically replace a file with a hard link to (or, where links aren't supported, a copy of) another file
+
+    Args:
+        src_file (str):     Name of the file to be linked (or copied)
+        dst_file (str):     Name of the file to be replaced
+
+    '''
+    tmp_file = dst_file + '.%d.tmp' % os.getpid()
+    try:
+        os.link(src_file, tmp_file)
+    except OSError:
+        shutil.copyfile(src_file, tmp_file)
+    os.replace(tmp_file, dst_file)
+
+def _write_cache_meta(meta_file, meta):
+    '''Atomically write the metadata of a packet records cache entry
+
+    The metadata is written last (after the entry's records), so replacing it commits the entry: an entry's
+    metadata never refers to records that haven't been completely written.
+
+    Args:
+        meta_file (str):    Name of the entry's metadata file
+        meta (dict):        Metadata of the entry
+
+    '''
+    tmp_file = meta_file + '.%d.tmp' % os.getpid()
+    with open(tmp_file, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_file, meta_file)
+
+def load_cached_csv_records(csv_file, cache_dir, num_records=None, max_cache_bytes=DEFAULT_CACHE_SIZE):
+    '''Load packet records from a CSV file, via an on-disk cache of previously parsed records
+
+    Cache entries are keyed by the path, size and modification time of the CSV file (and the number of
+    records requested); if the key isn't found, an entry of the same size and content hash (e.g. for a copied
+    or touched file) is re-used, its records linked under the new key. Otherwise the CSV file is parsed (see load_csv_records) and the records
+    added to the cache, evicting least recently used entries beyond the cache size limit.
+
+    Cached records are memory mapped (read-only) rather than read into memory.
+
+    Args:
+        csv_file (str):         Filename of CSV file data to be read
+        cache_dir (str):        Directory of the packet records cache (created if it doesn't exist)
+        num_records (int):      Maximum number of records to read (default: None - all records)
+        max_cache_bytes (int):  Maximum size (bytes) of the cache (default: DEFAULT_CACHE_SIZE)
+
+    Returns:
+        tuple:  (structured numpy.ndarray of packet records, number of rows rejected, whether the records were found in the cache)
+
+    '''
+    os.makedirs(cache_dir, exist_ok=True)
+    csv_stat = os.stat(csv_file)
+    key = hashlib.sha1(repr((CACHE_VERSION, os.path.abspath(csv_file), csv_stat.st_size, csv_stat.st_mtime_ns, num_records)).encode('utf-8')).hexdigest()
+    meta_file = os.path.join(cache_dir, key + '.json')
+    npy_file = os.path.join(cache_dir, key + NPY_EXTENSION)
+
+    # fall back to finding an entry by content if the file has been copied or touched since it was cached, linking (or copying)
+    # its records under this key and leaving the entry in place for its own path; only entries of the same size can have the same
+    # content, so a file is only hashed if there are any
+    content_hash = None
+    if not os.path.isfile(meta_file):
+        for other_meta_file in glob.glob(os.path.join(cache_dir, '*.json')):
+            try:
+                with open(other_meta_file) as f:
+                    meta = json.load(f)
+                if meta['version'] != CACHE_VERSION or meta['size'] != csv_stat.st_size or meta['num_records'] != num_records:
+                    continue
+                if content_hash is None:
+                    content_hash = _hash_file_content(csv_file)
+                if meta['content_hash'] == content_hash:
+                    _link_or_copy(os.path.splitext(other_meta_file)[0] + NPY_EXTENSION, npy_file)
+                    meta.update(csv_file=os.path.abspath(csv_file), mtime_ns=csv_stat.st_mtime_ns)
+                    _write_cache_meta(meta_file, meta)
+                    break
+            except (OSError, ValueError, KeyError):
+                # entry being written or removed by another process
+                continue
+
+    try:
+        with open(meta_file) as f:
+            meta = json.load(f)
+        records = load_npy_records(npy_file)
+
+        # mark entry as recently used
+        os.utime(meta_file)
+        return records, meta['num_rejected'], True
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # parse the CSV file and write the records (and metadata) to the cache, atomically replacing any existing entry
+    records, num_rejected = load_csv_records(csv_file, num_records)
+    if records.nbytes <= max_cache_bytes:
+        tmp_file = npy_file + '.%d.tmp' % os.getpid()
+        with open(tmp_file, 'wb') as f:
+            np.save(f, records)
+        os.replace(tmp_file, npy_file)
+        _write_cache_meta(meta_file, dict(version=CACHE_VERSION,
+                                          csv_file=os.path.abspath(csv_file),
+                                          size=csv_stat.st_size,
+                                          mtime_ns=csv_stat.st_mtime_ns,
+                                          content_hash=content_hash or _hash_file_content(csv_file),
+                                          num_records=num_records,
+                                          num_rejected=num_rejected))
+
+        _evict_cache_entries(cache_dir, max_cache_bytes)
+
+    return records, num_rejected, False
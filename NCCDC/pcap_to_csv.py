@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-'''Parse PCAP data from a file using the scapy python library
+'''Parse PCAP data from a file, natively or using the scapy python library
 
 This script parses PCAP data from a specified pcap file and extracts IP (v4) packet details,
 printing them to STDOUT in CSV format.
 
+Packet headers are decoded directly from the bytes of the PCAP file by default; the scapy
+library can be used instead (-s), e.g. for link types not supported by the native decoder.
+
 Example:
 	$ python __file__ -i pcap_sample_data -n 5
 
@@ -12,19 +15,60 @@ Author: chris.sampson@naimuri.com
 '''
 from datetime import datetime
 import logging.config, yaml
-import sys, getopt, os.path, struct, socket, pprint
+import sys, getopt, os.path, struct, pprint, gzip, mmap
+from multiprocessing import Pool
+from tempfile import TemporaryDirectory
 from timeit import default_timer as timer
 
-# import scapy library, ignoring IPv6 warnings (as we're only interested in IPv4 for this script)
-scapy_rt_logger = logging.getLogger("scapy.runtime")
-scapy_rt_orig_level = scapy_rt_logger.level
-scapy_rt_logger.setLevel(logging.ERROR)
-from scapy.all import PcapReader
-scapy_rt_logger.setLevel(scapy_rt_orig_level)
+import numpy as np
+
+from ipv4 import ipv4_to_int, ipv4_int_to_dotted
+from packet_records import COL_ROWNUM, RECORD_DTYPE, NPY_EXTENSION, NPY_HEADER_SIZE, write_npy_header
 
 DEFAULT_NUM_RECORDS = -1
 '''int:	Default value for number of records to be output, -1 = output all records'''
 
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+'''int:	PCAP global header magic numbers (microsecond and nanosecond timestamp resolution)'''
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+'''int:	Link layer header types (PCAP global header "network" field) supported by the native decoder'''
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88a8, 0x9100)
+'''int:	Ethernet types for IP (v4) and (stacked) 802.1Q VLAN tags'''
+
+PROTO_ICMP = 1
+PROTO_TCP = 6
+PROTO_UDP = 17
+'''int:	IP protocols processed for output'''
+
+PROTOCOL_NAMES = {PROTO_ICMP: 'icmp', PROTO_TCP: 'tcp', PROTO_UDP: 'udp'}
+'''dict:	Names of IP protocols processed for output'''
+
+ICMP_ERROR_TYPES = (3, 4, 5, 11, 12)
+'''tuple:	ICMP types that carry the IP header (and first 8 bytes of payload) of the offending packet'''
+
+MMAP_RELEASE_BYTES = 64 * 1024 * 1024
+'''int:	Number of bytes of a memory mapped PCAP file to decode before releasing its pages (keeps memory usage flat)'''
+
+NPY_BLOCK_RECORDS = 65536
+'''int:	Number of records converted to an array at a time when writing NumPy binary output'''
+
+TCP_FLAG_NAMES = 'FSRPAUEC'
+'''str:	Characters representing TCP Flags bits (FIN first), used for debug output'''
+
+_PCAP_GLOBAL_HEADER = struct.Struct('<IHHiIII')
+_ETHERTYPE = struct.Struct('!H')
+# version/ihl, (tos), length, (id), flags/fragment, ttl, protocol, (checksum), source, destination
+_IPV4_HEADER = struct.Struct('!BxHxxHBBxxII')
+_PORTS = struct.Struct('!HH')
+'''struct.Struct:	Pre-compiled header layouts used by the native decoder'''
+
 # setup logging config
 logging.config.dictConfig(yaml.load(open(os.path.join('config', 'logging.yaml'))))
 logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
@@ -39,26 +83,505 @@ def _print_usage(exit_code=0):
 	'''
 	f = sys.stderr if exit_code > 0 else sys.stdout
 
-	print(__file__ + " [-i <input file>] [-n <number of records to parse>] [-d]", file=f)
+	print(__file__ + " [-i <input file>] [-n <number of records to parse>] [-s] [-m] [-w <workers>|--workers=<workers>] [-b <npy file>]", file=f)
 	print("-i <input file>: PCAP format data file to be parsed")
 	print("-n <num_records>: (optional) number of packets to be output from <input file>; default to output all packets")
+	print("-s: (optional) dissect packets using scapy instead of the native decoder (slower, but supports more link types and formats)")
+	print("-m: (optional) memory map the (uncompressed) <input file> rather than reading it record by record")
+	print("-w|--workers <workers>: (optional) number of processes used to decode the (uncompressed) <input file> in parallel, each decoding a contiguous range of records (intermediate output is written to the system temp directory); default 1")
+	print("-b <npy file>: (optional) write records to <npy file> in NumPy (" + NPY_EXTENSION + ") binary format (fixed width typed columns, see packet_records.py) rather than CSV to STDOUT")
 
 	sys.exit(exit_code)
 
-def ipv4_to_int(ip_address):
-	'''Convert an Ipv4 Address to its decimal representation
+def _tcp_flags_to_str(flags):
+	'''Convert a TCP Flags bit field to its (scapy-style) lettered representation, e.g. 18 = SA
+
+	Args:
+		flags (int):	TCP Flags bit field
+
+	Returns:
+		str:	Letters of the TCP Flags set in the bit field
+
+	'''
+	return ''.join(name for bit, name in enumerate(TCP_FLAG_NAMES) if flags & (1 << bit))
+
+def _log_record(row_num, record):
+	'''Log (debug) details of a record in a more human-readable format
+
+	Args:
+		row_num (int):	Number of the row in the output
+		record (tuple):	Details of the record (see _decode_ipv4)
+
+	'''
+	proto, t, src, dst, sport, dport, ttl, length, frag, flags = record
+	logger.debug(','.join(
+				(
+					str(row_num),
+					PROTOCOL_NAMES[proto],
+					datetime.utcfromtimestamp(float(t)).strftime('%d/%m/%Y %H:%M:%S.%f'),
+					ipv4_int_to_dotted(src),
+					ipv4_int_to_dotted(dst),
+					'??' if sport is None else str(sport),
+					'??' if dport is None else str(dport),
+					str(ttl),
+					str(length),
+					str(frag),
+					'' if flags is None else _tcp_flags_to_str(flags)
+				)
+			))
+
+def _open_pcap(pcap_file):
+	'''Open a (optionally gzip compressed) PCAP file and read its global header
+
+	Args:
+		pcap_file (str):	Filename of PCAP file data to be read
+
+	Returns:
+		tuple:	(open file object positioned at the first record, record header struct, timestamp resolution, link type)
+
+	Raises:
+		ValueError:	If the file is not in (classic) PCAP format, or its link type is not supported by the native decoder
+
+	'''
+	f = open(pcap_file, 'rb')
+	if f.read(2) == b'\x1f\x8b':
+		f.close()
+		f = gzip.open(pcap_file, 'rb')
+	else:
+		f.seek(0)
+
+	try:
+		header = f.read(_PCAP_GLOBAL_HEADER.size)
+		if len(header) < _PCAP_GLOBAL_HEADER.size:
+			raise ValueError("file too short for PCAP global header")
+
+		# detect byte order of the file from the magic number
+		magic = _PCAP_GLOBAL_HEADER.unpack(header)[0]
+		endian = '<'
+		if magic not in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+			endian = '>'
+			magic = struct.unpack('>I', header[:4])[0]
+			if magic not in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+				raise ValueError("unrecognised PCAP magic number (0x%s), pcapng and other formats are not supported" % header[:4].hex())
+
+		linktype = struct.unpack(endian + 'I', header[20:24])[0]
+		if linktype not in (LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL, LINKTYPE_IPV4):
+			raise ValueError("unsupported PCAP link type (%d)" % linktype)
+	except:
+		f.close()
+		raise
+
+	resolution = 0.000000001 if magic == PCAP_MAGIC_NSEC else 0.000001
+	return f, struct.Struct(endian + 'IIII'), resolution, linktype
+
+def _decode_ipv4(buf, offset, end, linktype, t):
+	'''Decode details of an IP (v4) packet directly from the bytes of a captured frame
+
+	Transport details are taken from the first (unfragmented) TCP/UDP header, or from the
+	TCP/UDP header quoted by an ICMP error message, in the same way as scapy dissection.
+
+	Args:
+		buf (bytes):	Buffer containing the captured frame (any object supporting the buffer protocol, e.g. memoryview or mmap)
+		offset (int):	Offset of the start of the captured frame within buf
+		end (int):	Offset of the end of the captured frame within buf
+		linktype (int):	Link layer header type of the captured frame
+		t (float):	Time the frame was captured
+
+	Returns:
+		tuple:	(protocol, time, source, destination, source port, destination port, ttl, length, fragment, flags),
+				ports and flags are None if not present;
+				None if the frame is not an IP (v4) packet using one of the wanted protocols
+
+	'''
+	# skip past the link layer header to the IP (v4) header
+	if linktype == LINKTYPE_ETHERNET:
+		if end - offset < 14:
+			return None
+		ethertype = _ETHERTYPE.unpack_from(buf, offset + 12)[0]
+		offset += 14
+		while ethertype in ETHERTYPE_VLAN and end - offset >= 4:
+			ethertype = _ETHERTYPE.unpack_from(buf, offset + 2)[0]
+			offset += 4
+		if ethertype != ETHERTYPE_IPV4:
+			return None
+	elif linktype == LINKTYPE_LINUX_SLL:
+		if end - offset < 16 or _ETHERTYPE.unpack_from(buf, offset + 14)[0] != ETHERTYPE_IPV4:
+			return None
+		offset += 16
+
+	if end - offset < _IPV4_HEADER.size:
+		return None
+	ver_ihl, length, frag, ttl, proto, src, dst = _IPV4_HEADER.unpack_from(buf, offset)
+	if ver_ihl >> 4 != 4 or proto not in PROTOCOL_NAMES:
+		return None
+
+	# transport headers are only present in the first fragment, and never beyond the IP length (i.e. ignore padding)
+	frag &= 0x1fff
+	sport = dport = flags = None
+	if frag == 0:
+		header_len = (ver_ihl & 0x0f) << 2
+		if length >= header_len:
+			end = min(end, offset + length)
+		offset += header_len
+
+		if proto == PROTO_ICMP:
+			# ICMP errors quote the offending IP header, from which (TCP/UDP) ports are reported
+			if end - offset >= 8 + _IPV4_HEADER.size and buf[offset] in ICMP_ERROR_TYPES:
+				offset += 8
+				inner_ver_ihl, _, inner_frag, _, inner_proto, _, _ = _IPV4_HEADER.unpack_from(buf, offset)
+				if inner_proto in (PROTO_TCP, PROTO_UDP) and inner_frag & 0x1fff == 0:
+					offset += (inner_ver_ihl & 0x0f) << 2
+					if end - offset >= 4:
+						sport, dport = _PORTS.unpack_from(buf, offset)
+		elif end - offset >= 4:
+			sport, dport = _PORTS.unpack_from(buf, offset)
+			if proto == PROTO_TCP and end - offset >= 14:
+				flags = buf[offset + 13]
+
+	return (proto, t, src, dst, sport, dport, ttl, length, frag, flags)
+
+def _read_pcap_native(f, record_header, resolution, linktype):
+	'''Read records from an open PCAP file, decoding IP (v4) packet details natively
+
+	Args:
+		f (file):	PCAP file object, positioned at the first record (closed once all records have been read)
+		record_header (struct.Struct):	Record header layout (in the byte order of the file)
+		resolution (float):	Resolution of record timestamps (in seconds)
+		linktype (int):	Link layer header type of the records
+
+	Yields:
+		tuple:	Details of each record (see _decode_ipv4), or None for records not being output
+
+	'''
+	read = f.read
+	header_size = record_header.size
+	unpack = record_header.unpack
+
+	with f:
+		while True:
+			header = read(header_size)
+			if len(header) < header_size:
+				break
+			sec, usec, caplen, _ = unpack(header)
+			data = read(caplen)
+			yield _decode_ipv4(data, 0, len(data), linktype, sec + resolution * usec)
+
+def _read_pcap_mmap(f, record_header, resolution, linktype, start=None, stop=None):
+	'''Read records from an open (uncompressed) PCAP file via a memory map, decoding IP (v4) packet details natively
+
+	Record headers are walked by offset and packet fields decoded in place, without copying
+	packet data. Pages already decoded are released periodically so that memory usage
+	doesn't grow with the size of the file.
+
+	Args:
+		f (file):	PCAP file object, positioned at the first record (closed once all records have been read)
+		record_header (struct.Struct):	Record header layout (in the byte order of the file)
+		resolution (float):	Resolution of record timestamps (in seconds)
+		linktype (int):	Link layer header type of the records
+		start (int):	Offset of the first record to be read (default: None - the first record in the file)
+		stop (int):	Offset at which to stop reading records, must be a record boundary (default: None - the end of the file)
+
+	Yields:
+		tuple:	Details of each record (see _decode_ipv4), or None for records not being output
+
+	'''
+	header_size = record_header.size
+	unpack_from = record_header.unpack_from
+
+	with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+		size = len(mm) if stop is None else min(stop, len(mm))
+		offset = f.tell() if start is None else start
+
+		# pages are only read once, in order
+		release = hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_DONTNEED')
+		if release:
+			mm.madvise(mmap.MADV_SEQUENTIAL)
+		released = offset - (offset % mmap.PAGESIZE)
+
+		while offset + header_size <= size:
+			sec, usec, caplen, _ = unpack_from(mm, offset)
+			offset += header_size
+			yield _decode_ipv4(mm, offset, min(offset + caplen, size), linktype, sec + resolution * usec)
+			offset += caplen
+
+			# drop pages that have been decoded (from a page boundary)
+			if release and offset - released >= MMAP_RELEASE_BYTES:
+				release_to = min(offset, size) - (min(offset, size) % mmap.PAGESIZE)
+				mm.madvise(mmap.MADV_DONTNEED, released, release_to - released)
+				released = release_to
+
+def _index_pcap_ranges(pcap_file, num_ranges):
+	'''Index record offsets of an (uncompressed) PCAP file, splitting it into contiguous byte ranges at record boundaries
+
+	Only record headers are read (via a memory map), packet data is skipped.
+
+	Args:
+		pcap_file (str):	Filename of PCAP file data to be indexed
+		num_ranges (int):	Number of (approximately equally sized) ranges to split the file into
+
+	Returns:
+		list:	(start, stop) offsets of each range, in file order (fewer than num_ranges if the file has too few records)
+
+	'''
+	f, record_header, _, _ = _open_pcap(pcap_file)
+	if isinstance(f, gzip.GzipFile):
+		f.close()
+		raise ValueError("compressed PCAP files cannot be indexed")
+
+	header_size = record_header.size
+	unpack_from = record_header.unpack_from
+
+	with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+		size = len(mm)
+		offset = f.tell()
+		boundaries = [offset]
+
+		# walk record headers up to each target offset, splitting at the next record boundary
+		for k in range(1, num_ranges):
+			target = boundaries[0] + (size - boundaries[0]) * k // num_ranges
+			while offset < target and offset + header_size <= size:
+				offset += header_size + unpack_from(mm, offset)[2]
+			if offset >= size:
+				break
+			if offset > boundaries[-1]:
+				boundaries.append(offset)
+
+	boundaries.append(size)
+	return list(zip(boundaries[:-1], boundaries[1:]))
+
+def _convert_pcap_range(task):
+	'''Decode a range of records from an (uncompressed) PCAP file, writing CSV rows (without row numbers) or binary records (row numbers 0) to a file
+
+	Run within a worker process for parallel conversion.
+
+	Args:
+		task (tuple):	(PCAP filename, start offset, stop offset, output filename, number of records to be output, whether to output binary records)
+
+	Returns:
+		tuple:	(number of PCAP records read, number of rows written, dict of protocol names to number of rows)
+
+	'''
+	pcap_file, start, stop, output_file, num_records, binary = task
+	input_count = 0
+	output_count = 0
+	protocols = {}
+	block = []
+
+	records = _read_pcap_mmap(*_open_pcap(pcap_file), start=start, stop=stop)
+	with open(output_file, 'wb' if binary else 'w') as out:
+		write = out.write
+		for record in records:
+			input_count += 1
+			if record is None:
+				continue
+
+			if binary:
+				block.append(_record_values(0, record))
+				if len(block) >= NPY_BLOCK_RECORDS:
+					np.array(block, dtype=RECORD_DTYPE).tofile(out)
+					block = []
+			else:
+				write(_format_csv_fields(record) + '\n')
+			ipproto_name = PROTOCOL_NAMES[record[0]]
+			protocols[ipproto_name] = protocols.get(ipproto_name, 0) + 1
+
+			# no range needs to output more than the requested limit
+			output_count += 1
+			if num_records != DEFAULT_NUM_RECORDS and output_count >= num_records:
+				break
+		records.close()
+
+		if len(block) > 0:
+			np.array(block, dtype=RECORD_DTYPE).tofile(out)
+
+	return input_count, output_count, protocols
+
+def _parse_pcap_ipv4_parallel(pcap_file, num_records, workers, npy_out=None):
+	'''Parse (uncompressed) pcap file content in parallel, outputting details of IP (v4) records to STDOUT (or a NumPy binary file)
+
+	The file is split into contiguous ranges of records, each decoded by a worker process.
+	Output is in the original packet order, with row numbers assigned across all ranges.
 
 	Args:
-		ip_address (str):	IP (v4) Address in standard decimal-dot format
+		pcap_file (str):	Filename of PCAP file data to be read
+		num_records (int):	Number of records to be output from parsed PCAP file (not including ignored records)
+		workers (int):	Number of worker processes
+		npy_out (file):	Binary file object to which records are appended in NumPy binary format, rather than output as CSV (default: None)
+
+	'''
+	step_start = timer()
+	ranges = _index_pcap_ranges(pcap_file, workers)
+	logger.info("Indexed PCAP file (%s) into %d ranges (seconds): %f", pcap_file, len(ranges), timer() - step_start)
+
+	protocols = {}
+	input_count = 0
+	output_index = 0
+
+	# records are logged (debug) as they're renumbered, as only this process knows their row numbers
+	debug = logger.isEnabledFor(logging.DEBUG)
+	write = sys.stdout.write
+	with TemporaryDirectory(prefix='pcap_to_csv_') as tmp_dir, Pool(len(ranges)) as pool:
+		binary = npy_out is not None
+		tasks = [(pcap_file, start, stop, os.path.join(tmp_dir, "range_%d%s" % (i, NPY_EXTENSION if binary else '.csv')), num_records, binary) for i, (start, stop) in enumerate(ranges)]
+
+		# ranges complete in file order, renumber and output each range's rows as it becomes available
+		for task, (range_inputs, range_outputs, range_protocols) in zip(tasks, pool.imap(_convert_pcap_range, tasks)):
+			logger.debug("PCAP range %d-%d: %d PCAP records to %d CSV records", task[1], task[2], range_inputs, range_outputs)
+			input_count += range_inputs
+			for ipproto_name, count in range_protocols.items():
+				protocols[ipproto_name] = protocols.get(ipproto_name, 0) + count
+
+			if binary:
+				with open(task[3], 'rb') as range_records:
+					while True:
+						block = np.fromfile(range_records, dtype=RECORD_DTYPE, count=NPY_BLOCK_RECORDS)
+						if num_records != DEFAULT_NUM_RECORDS:
+							block = block[:num_records - output_index]
+						if len(block) == 0:
+							break
+						block[COL_ROWNUM] = np.arange(output_index + 1, output_index + len(block) + 1)
+						block.tofile(npy_out)
+						if debug:
+							# binary records have ports and flags 0 if not present
+							for values in block.tolist():
+								_log_record(values[0], values[1:])
+						output_index += len(block)
+			else:
+				with open(task[3]) as rows:
+					for row in rows:
+						output_index += 1
+						write(str(output_index) + ',' + row)
+						if debug:
+							_log_record(output_index, _parse_csv_fields(row))
+						if num_records != DEFAULT_NUM_RECORDS and output_index >= num_records:
+							break
+			os.remove(task[3])
+
+			# stop parsing if reached requested limit
+			if num_records != DEFAULT_NUM_RECORDS and output_index >= num_records:
+				break
+
+	# log summaries of records processes
+	logger.info("Processed %d PCAP records to %d CSV records", input_count, output_index)
+	if logger.isEnabledFor(logging.DEBUG) and len(protocols) > 0:
+		logger.debug("Protocols in output: %s", pprint.pformat(protocols))
+
+def _read_pcap_scapy(pcap_file):
+	'''Read records from a PCAP file, dissecting IP (v4) packet details with scapy
+
+	Args:
+		pcap_file (str):	Filename of PCAP file data to be read
+
+	Yields:
+		tuple:	Details of each record (see _decode_ipv4), or None for records not being output
+
+	'''
+	# import scapy library, ignoring IPv6 warnings (as we're only interested in IPv4 for this script)
+	scapy_rt_logger = logging.getLogger("scapy.runtime")
+	scapy_rt_orig_level = scapy_rt_logger.level
+	scapy_rt_logger.setLevel(logging.ERROR)
+	from scapy.all import PcapReader
+	scapy_rt_logger.setLevel(scapy_rt_orig_level)
+
+	# convert formatted scapy field to int (None if field not present)
+	def _field(pkt, fmt):
+		value = pkt.sprintf(fmt)
+		return None if value in ('??', '') else int(value)
+
+	# parse the pcap file, one packet at a time
+	with PcapReader(pcap_file) as pcap_reader:
+		for pkt in pcap_reader:
+			# check the packet contains IP (v4) details and is using one of the wanted protocols
+			if 'IP' in pkt and pkt['IP'].version == 4 and pkt['IP'].proto in PROTOCOL_NAMES:
+				try:
+					# extract protocol, time, source IP, destination IP, source port, destination port, time to live, length, fragment, flags
+					yield (_field(pkt, "%r,IP.proto%"),
+							pkt.time,
+							ipv4_to_int(pkt.sprintf("%IP.src%")),
+							ipv4_to_int(pkt.sprintf("%IP.dst%")),
+							_field(pkt, "%r,sport%"),
+							_field(pkt, "%r,dport%"),
+							_field(pkt, "%IP.ttl%"),
+							_field(pkt, "%IP.len%"),
+							_field(pkt, "%IP.frag%"),
+							# flags = None if no TCP layer present
+							int(pkt['TCP'].flags) if 'TCP' in pkt else None)
+					continue
+				except AttributeError as ae:
+					logger.warn("Problem parsing PCAP record, skipping: %s", ae)
+
+			yield None
+
+def _record_values(row_num, record):
+	'''Get the values of a record's fields, in the order of the packet records data type (RECORD_DTYPE)
+
+	Args:
+		row_num (int):	Number of the row in the output
+		record (tuple):	Details of the record (see _decode_ipv4)
 
 	Returns:
-		int:	Decimal representation of all IP (v4) Address bytes
+		tuple:	Record field values, ports and flags 0 if not present
 
 	'''
-	return struct.unpack('>L', socket.inet_aton(ip_address))[0]
+	proto, t, src, dst, sport, dport, ttl, length, frag, flags = record
+	return (row_num, proto, t, src, dst, sport or 0, dport or 0, ttl, length, frag, flags or 0)
+
+def _format_csv_row(row_num, record):
+	'''Format details of a record as a decimalised CSV row
 
-def parse_pcap_ipv4(pcap_file, num_records=DEFAULT_NUM_RECORDS):
-	'''Parse pcap file content, extracting details of IP (v4) records and output details to STDOUT
+	Args:
+		row_num (int):	Number of the row in the output
+		record (tuple):	Details of the record (see _decode_ipv4)
+
+	Returns:
+		str:	CSV row, ports output as ?? and flags omitted if not present
+
+	'''
+	return str(row_num) + ',' + _format_csv_fields(record)
+
+def _format_csv_fields(record):
+	'''Format details of a record as decimalised CSV fields (i.e. a CSV row without its row number)
+
+	Args:
+		record (tuple):	Details of the record (see _decode_ipv4)
+
+	Returns:
+		str:	CSV fields, ports output as ?? and flags omitted if not present
+
+	'''
+	proto, t, src, dst, sport, dport, ttl, length, frag, flags = record
+	return ','.join((
+				str(proto),
+				str(t),
+				str(src),
+				str(dst),
+				'??' if sport is None else str(sport),
+				'??' if dport is None else str(dport),
+				str(ttl),
+				str(length),
+				str(frag),
+				'' if flags is None else str(flags)
+			))
+
+def _parse_csv_fields(fields):
+	'''Parse decimalised CSV fields back into details of a record (the inverse of _format_csv_fields)
+
+	Args:
+		fields (str):	CSV fields (i.e. a CSV row without its row number)
+
+	Returns:
+		tuple:	Details of the record (see _decode_ipv4), ports and flags None if not present
+
+	'''
+	proto, t, src, dst, sport, dport, ttl, length, frag, flags = fields.rstrip('\n').split(',')
+	return (int(proto), float(t), int(src), int(dst),
+			None if sport == '??' else int(sport),
+			None if dport == '??' else int(dport),
+			int(ttl), int(length), int(frag),
+			None if flags == '' else int(flags))
+
+def parse_pcap_ipv4(pcap_file, num_records=DEFAULT_NUM_RECORDS, use_scapy=False, use_mmap=False, workers=1, npy_file=None):
+	'''Parse pcap file content, extracting details of IP (v4) records and output details to STDOUT (or a NumPy binary file)
 
 	Fields included in output:
 		protocol (IP)
@@ -90,71 +613,111 @@ def parse_pcap_ipv4(pcap_file, num_records=DEFAULT_NUM_RECORDS):
 	Args:
 		pcap_file (str):	Filename of PCAP file data to be read
 		num_records (int):	Number of records to be output from parsed PCAP file (not including ignored records)
+		use_scapy (boolean):	Whether to dissect packets with scapy rather than the native decoder (default: False);
+							scapy is always used if the file format or link type is not supported by the native decoder
+		use_mmap (boolean):	Whether to memory map the PCAP file for the native decoder (default: False);
+							ignored for gzip compressed files
+		workers (int):	Number of processes used to decode the PCAP file in parallel (default: 1);
+						files are always memory mapped for parallel decoding, which is not possible with scapy or for gzip compressed files
+		npy_file (str):	Filename to which records are written in NumPy binary format (see packet_records.py), rather than CSV to STDOUT (default: None)
+
+	'''
+	if npy_file is None:
+		_parse_pcap_ipv4(pcap_file, num_records, use_scapy, use_mmap, workers)
+		return
+
+	# reserve space for the NumPy header, re-writing it once the number of records is known
+	with open(npy_file, 'w+b') as npy_out:
+		write_npy_header(npy_out, 0)
+		_parse_pcap_ipv4(pcap_file, num_records, use_scapy, use_mmap, workers, npy_out)
+
+		npy_out.seek(0, os.SEEK_END)
+		num_output = (npy_out.tell() - NPY_HEADER_SIZE) // np.dtype(RECORD_DTYPE).itemsize
+		write_npy_header(npy_out, num_output)
+	logger.info("Wrote %d records to NumPy binary file (%s)", num_output, npy_file)
+
+def _parse_pcap_ipv4(pcap_file, num_records, use_scapy, use_mmap, workers, npy_out=None):
+	'''Parse pcap file content, outputting details of IP (v4) records to STDOUT, or appending them to a NumPy binary file
+
+	Args:
+		pcap_file (str):	Filename of PCAP file data to be read
+		num_records (int):	Number of records to be output from parsed PCAP file (not including ignored records)
+		use_scapy (boolean):	Whether to dissect packets with scapy rather than the native decoder
+		use_mmap (boolean):	Whether to memory map the PCAP file for the native decoder
+		workers (int):	Number of processes used to decode the PCAP file in parallel
+		npy_out (file):	Binary file object to which records are appended in NumPy binary format, rather than output as CSV (default: None)
 
 	'''
+	if workers > 1:
+		if use_scapy:
+			logger.warn("Unable to decode PCAP file (%s) in parallel with scapy, using a single process", pcap_file)
+		else:
+			try:
+				_parse_pcap_ipv4_parallel(pcap_file, num_records, workers, npy_out)
+				return
+			except ValueError as ve:
+				logger.warn("Unable to decode PCAP file (%s) in parallel, using a single process: %s", pcap_file, ve)
+
 	protocols = {}
 	input_index = 1
 	output_index = 1
 
-	# parse the pcap file, one packet at a time
-	with PcapReader(pcap_file) as pcap_reader:
-		for pkt in pcap_reader:
-			# count number of PCAP records read from file
-			input_index += 1
+	# choose the packet reader, falling back to scapy if the native decoder can't handle the file
+	records = None
+	if not use_scapy:
+		try:
+			pcap = _open_pcap(pcap_file)
+			if use_mmap and isinstance(pcap[0], gzip.GzipFile):
+				logger.warn("Unable to memory map compressed PCAP file (%s), reading records from file", pcap_file)
+				use_mmap = False
+			records = _read_pcap_mmap(*pcap) if use_mmap else _read_pcap_native(*pcap)
+		except ValueError as ve:
+			logger.warn("Unable to decode PCAP file (%s) natively, falling back to scapy: %s", pcap_file, ve)
+	if records is None:
+		records = _read_pcap_scapy(pcap_file)
 
-			# check the packet contains IP (v4) details and is using one of the wanted protocols
-			if 'IP' in pkt and pkt['IP'].version == 4 and pkt['IP'].proto in (1, 6, 17):
-				try:
-					# extract time, source IP, destination IP, source port, destination port, time to live, length, fragment, protocol
-					t = pkt.time
-					src = pkt.sprintf("%IP.src%")
-					dst = pkt.sprintf("%IP.dst%")
-					ipproto = pkt.sprintf("%r,IP.proto%")
-
-					# debug out in more human-readable format
-					if logger.isEnabledFor(logging.DEBUG):
-						ipproto_name = pkt.sprintf("%IP.proto%")
-
-						logger.debug(','.join(
-									(
-										str(output_index),
-										ipproto_name,
-										datetime.utcfromtimestamp(t).strftime('%d/%m/%Y %H:%M:%S.%f'),
-										src,
-										dst,
-										pkt.sprintf("%sport%,%dport%,%IP.ttl%,%IP.len%,%IP.frag%,{TCP:%TCP.flags%}")
-									)
-								))
-
-						if ipproto_name in protocols:
-							protocols[ipproto_name] += 1
-						else:
-							protocols[ipproto_name] = 1
-
-					# print decimalised field format
-					print(','.join(
-									(
-										str(output_index),
-										str(ipproto),
-										str(t),
-										str(ipv4_to_int(src)),
-										str(ipv4_to_int(dst)),
-										# flags = 0 if no TCP layer present
-										pkt.sprintf("%r,sport%,%r,dport%,%IP.ttl%,%IP.len%,%IP.frag%,{TCP:%r,TCP.flags%}")
-									)
-								)
-							)
-
-					# stop parsing if reached requested limit
-					if num_records != DEFAULT_NUM_RECORDS and output_index >= num_records:
-						break
-
-					output_index += 1
-					if logger.isEnabledFor(logging.DEBUG) and output_index % 100000 == 0:
-						logger.debug(str(output_index) + ": " + datetime.now().strftime('%d/%m/%Y %H:%M:%S.%f'))
-				except AttributeError as ae:
-					logger.warn("Problem parsing record %d, skipping: %s", output_index, ae)
-					pass
+	# parse the pcap file, one packet at a time
+	write = sys.stdout.write
+	block = []
+	for record in records:
+		# count number of PCAP records read from file
+		input_index += 1
+
+		# ignore packets without IP (v4) details or not using one of the wanted protocols
+		if record is None:
+			continue
+
+		# debug out in more human-readable format
+		if logger.isEnabledFor(logging.DEBUG):
+			_log_record(output_index, record)
+
+			ipproto_name = PROTOCOL_NAMES[record[0]]
+			if ipproto_name in protocols:
+				protocols[ipproto_name] += 1
+			else:
+				protocols[ipproto_name] = 1
+
+		# print decimalised field format, or convert to binary records in blocks
+		if npy_out is None:
+			write(_format_csv_row(output_index, record) + '\n')
+		else:
+			block.append(_record_values(output_index, record))
+			if len(block) >= NPY_BLOCK_RECORDS:
+				np.array(block, dtype=RECORD_DTYPE).tofile(npy_out)
+				block = []
+
+		# stop parsing if reached requested limit
+		if num_records != DEFAULT_NUM_RECORDS and output_index >= num_records:
+			break
+
+		output_index += 1
+		if logger.isEnabledFor(logging.DEBUG) and output_index % 100000 == 0:
+			logger.debug(str(output_index) + ": " + datetime.now().strftime('%d/%m/%Y %H:%M:%S.%f'))
+
+	# release the input file if the record limit stopped parsing early
+	records.close()
+	if len(block) > 0:
+		np.array(block, dtype=RECORD_DTYPE).tofile(npy_out)
 
 	# log summaries of records processes
 	logger.info("Processed %d PCAP records to %d CSV records", input_index, output_index)
@@ -170,15 +733,23 @@ def main(argv):
 	'''
 	inputfile = ''
 	num_records = DEFAULT_NUM_RECORDS
+	use_scapy = False
+	use_mmap = False
+	workers = 1
+	npy_file = None
 
 	try:
-		opts, _ = getopt.getopt(argv, "hi:n:")
+		opts, _ = getopt.getopt(argv, "hsmi:n:w:b:", ["workers="])
 	except getopt.GetoptError:
 		_print_usage(1)
 
 	for opt, arg in opts:
 		if opt == '-h':
 			_print_usage(0)
+		elif opt == '-s':
+			use_scapy = True
+		elif opt == '-m':
+			use_mmap = True
 		elif opt == '-i':
 			inputfile = arg
 			if not os.path.isfile(inputfile):
@@ -193,12 +764,28 @@ def main(argv):
 			except:
 				logger.exception("Unable to parse number of records (-n), must be numeric, got %s", num_records)
 				sys.exit(4)
+		elif opt in ('-w', '--workers'):
+			try:
+				workers = int(arg)
+				if workers < 1:
+					logger.error("Number of workers (-w|--workers) must be greater than 0, got %d", workers)
+					sys.exit(5)
+			except ValueError:
+				logger.exception("Unable to parse number of workers (-w|--workers), must be numeric, got %s", arg)
+				sys.exit(6)
+		elif opt == '-b':
+			npy_file = arg
 
 	start = timer()
 	logger.info('Input file: %s', inputfile)
 	logger.info('Record limit: %d', num_records)
+	logger.info('Use scapy? %s', use_scapy)
+	logger.info('Memory map? %s', use_mmap)
+	logger.info('Workers: %d', workers)
+	if not npy_file is None:
+		logger.info('NumPy binary output file: %s', npy_file)
 
-	parse_pcap_ipv4(inputfile, num_records)
+	parse_pcap_ipv4(inputfile, num_records, use_scapy, use_mmap, workers, npy_file)
 
 	end = timer()
 	logger.info("Time Taken (seconds): %f", end - start)
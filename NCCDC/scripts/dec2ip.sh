@@ -1,15 +1,6 @@
 #!/bin/bash
 
-dec2ip () {
-    local ip dec=$@
-    for e in {3..0}
-    do
-        ((octet = dec / (256 ** e) ))
-        ((dec -= octet * 256 ** e))
-        ip+=$delim$octet
-        delim=.
-    done
-    printf '%s\n' "$ip"
-}
+SCRIPT_DIR="$( cd "$(dirname "$0")" ; pwd -P )"
 
-dec2ip "$@"
+# convert decimal IP (v4) addresses (args, or one per line from STDIN) to dotted
+python ${SCRIPT_DIR}/../ipv4.py "$@"
@@ -1,9 +1,6 @@
 #!/bin/bash
 
-ip2dec () {
-    local a b c d ip=$@
-    IFS=. read -r a b c d <<< "$ip"
-    printf '%d\n' "$((a * 256 ** 3 + b * 256 ** 2 + c * 256 + d))"
-}
+SCRIPT_DIR="$( cd "$(dirname "$0")" ; pwd -P )"
 
-ip2dec "$@"
+# convert dotted IP (v4) addresses (args, or one per line from STDIN) to decimal
+python ${SCRIPT_DIR}/../ipv4.py -d "$@"
@@ -27,5 +27,10 @@ then
 	fi
 fi
 
-# process each of the CSV files through the graphing script, using the filename as the destination IP filter
-parallel --no-notice --eta --progress "python ${SCRIPT_DIR}/../csv_to_graph.py -i {} -o ${OUTPUT_DIR} -d {/.}" ::: `ls -1 ${CSV_DIR}/*.csv`
+# process each of the CSV files through the graphing script, using the partition manifest (if present) or filename as the destination IP filter
+if [[ -f ${CSV_DIR}/manifest.csv ]]
+then
+	tail -n +2 ${CSV_DIR}/manifest.csv | parallel --no-notice --eta --progress --colsep , "python ${SCRIPT_DIR}/../csv_to_graph.py -i {3} -o ${OUTPUT_DIR} -d {1}"
+else
+	parallel --no-notice --eta --progress "python ${SCRIPT_DIR}/../csv_to_graph.py -i {} -o ${OUTPUT_DIR} -d {/.}" ::: `ls -1 ${CSV_DIR}/*.csv`
+fi
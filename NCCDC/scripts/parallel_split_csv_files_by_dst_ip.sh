@@ -27,5 +27,5 @@ then
 	fi
 fi
 
-# split records from all CSV files into separate IP-based files (contains all records where Destination IP appears as either Source or Destination, sorted by timestamp)
-parallel --no-notice --eta --progress "LC_ALL=C; grep -hF ',{},' ${CSV_DIR}/*.csv | sort -t, -k5,5n -k3,3g >> ${OUTPUT_DIR}/{}.csv" ::: `cat ${CSV_DIR}/*.csv | cut -d, -f 5 | sort -u`
+# split records from all CSV files into separate IP-based files in a single pass (contains all records where Destination IP appears as either Source or Destination, sorted by timestamp)
+python ${SCRIPT_DIR}/../csv_to_partitions.py -i ${CSV_DIR} -o ${OUTPUT_DIR}
@@ -1,5 +1,7 @@
 #!/bin/bash
 
+SCRIPT_DIR="$( cd "$(dirname "$0")" ; pwd -P )"
+
 CSV_DIR=$1
 OUTPUT_DIR=$2
 
@@ -25,4 +27,4 @@ then
         fi
 fi
 
-sort -t, -k5,5n -k3,3g $CSV_DIR/*.csv | awk -F, -v outdir="${OUTPUT_DIR}" '{print >> (outdir"/"$4".csv"); print >> (outdir"/"$2".csv")}'
+python ${SCRIPT_DIR}/../csv_to_partitions.py -i ${CSV_DIR} -o ${OUTPUT_DIR}
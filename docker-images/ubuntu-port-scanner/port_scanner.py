@@ -12,6 +12,7 @@ Author: chris.sampson@naimuri.com
 from builtins import range
 import logging.config, yaml
 import sys, getopt, os.path, random
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 from timeit import default_timer as timer
 import pprint
@@ -26,6 +27,12 @@ logger = logging.getLogger(os.path.splitext(os.path.basename(__file__))[0])
 
 PORT_MAX = 65535
 
+'''int:    Maximum length of the ports argument of each nmap call (within the OS limit of 128KB on a single argument)'''
+PORTS_ARG_MAX = 16384
+
+'''tuple:    Protocols of the per-port results of nmap scans'''
+SCAN_PROTOCOLS = ('tcp', 'udp', 'sctp', 'ip')
+
 
 def _print_usage(exit_code=0):
     '''Print usage and exit
@@ -36,64 +43,166 @@ def _print_usage(exit_code=0):
     '''
     f = sys.stderr if exit_code > 0 else sys.stdout
 
-    print(__file__ + " [--min-port=<min port>] [--max-port=<max port>] [--port-inc=<port_range_increment>] [--min-time=<min time>] [--max-time=<max time>] [--num-scans=<num scans>] [-n <nmap options>|--nmap-opts=<nmap options>] [-r|--randomise] -t|--target-host=<target host>", file=f)
+    print(__file__ + " [--min-port=<min port>] [--max-port=<max port>] [--port-inc=<port_range_increment>] [--min-time=<min time>] [--max-time=<max time>] [--num-scans=<num scans>] [-n <nmap options>|--nmap-opts=<nmap options>] [-r|--randomise] [-j <jobs>|--jobs=<jobs>] -t|--target-host=<target host>", file=f)
     # TODO: elaborate on args
 
     sys.exit(exit_code)
 
-def scan_ports(target_host, min_port, max_port, port_range_increment, min_time, max_time, num_scans, randomised, nmap_opts, sudo):
-    '''Scan ports as defined by input args
+def _port_ranges(ports):
+    '''Compress ports into an nmap port specification of ranges, e.g. [1, 2, 3, 5] to "1-3,5"
 
     Args:
-        
+        ports (iterable):   Port numbers (in any order)
+
+    Returns:
+        str:    Comma separated ports and (inclusive) ranges of consecutive ports, in ascending order
 
     '''
-    # TODO: complete function documentation
-    
-    logger.info("Setting up %d scans of host(s) %s between ports %d and %d (port range increment=%d, randomised=%s, sudo=%s, nmap_opts=%s)", num_scans, target_host, min_port, max_port, port_range_increment, str(randomised), str(sudo), nmap_opts)
-    
-    # get handle on nmap
+    ranges = []
+    for port in sorted(set(ports)):
+        if len(ranges) > 0 and ranges[-1][1] == port - 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return ','.join(str(first) if first == last else str(first) + '-' + str(last) for first, last in ranges)
+
+def port_chunks(ports, max_arg_length=PORTS_ARG_MAX):
+    '''Split ports into chunks whose nmap port specifications are within an argument length limit
+
+    Ports are chunked in the order given (so randomly ordered ports give chunks of randomly chosen ports),
+    each chunk compressed into ranges (nmap scans the ports of each call in a random order by default).
+
+    Args:
+        ports (iterable):       Port numbers to be scanned
+        max_arg_length (int):   Maximum length of each port specification (default: PORTS_ARG_MAX)
+
+    Returns:
+        list:   Port specifications (str) of each chunk, for the ports argument of an nmap call
+
+    '''
+    chunks = []
+    chunk = []
+    chunk_length = 0
+    for port in ports:
+        port_length = len(str(port)) + 1
+        if chunk_length + port_length > max_arg_length + 1:
+            chunks.append(_port_ranges(chunk))
+            chunk = []
+            chunk_length = 0
+        chunk.append(port)
+        chunk_length += port_length
+    if len(chunk) > 0:
+        chunks.append(_port_ranges(chunk))
+    return chunks
+
+def merge_scan_results(results):
+    '''Merge the results (as returned by nmap.PortScanner.scan) of nmap calls scanning different ports of the same host(s)
+
+    Args:
+        results (list):     Result (dict) of each nmap call
+
+    Returns:
+        dict:   Result of each host ('scan'), with the ports of every call, and the command lines, elapsed time (sum) and
+                    scan info of the calls ('nmap')
+
+    '''
+    merged = {'nmap': {'command_line': [], 'scaninfo': [], 'scanstats': {'elapsed': 0.0}}, 'scan': {}}
+    for result in results:
+        nmap_info = result.get('nmap', {})
+        merged['nmap']['command_line'].append(nmap_info.get('command_line'))
+        merged['nmap']['scaninfo'].append(nmap_info.get('scaninfo'))
+        merged['nmap']['scanstats']['elapsed'] += float(nmap_info.get('scanstats', {}).get('elapsed', 0))
+
+        for host, host_result in result.get('scan', {}).items():
+            merged_host = merged['scan'].setdefault(host, {})
+            for key, value in host_result.items():
+                if key in SCAN_PROTOCOLS:
+                    merged_host.setdefault(key, {}).update(value)
+                elif key == 'status' and value.get('state') == 'up':
+                    # up if found to be up by any call
+                    merged_host[key] = value
+                else:
+                    merged_host.setdefault(key, value)
+    return merged
+
+def _scan_chunk(target_host, ports, nmap_opts, sudo):
+    # each call has its own nmap.PortScanner, so chunks can be scanned concurrently
     nm = nmap.PortScanner()
+    result = nm.scan(hosts=target_host, ports=ports, arguments=nmap_opts, sudo=sudo)
+    logger.debug("nmap command line: %s", nm.command_line())
+    logger.debug("nmap scan stats: %s", nm.scanstats())
+    return result
+
+def scan_ports(target_host, min_port, max_port, port_range_increment, min_time, max_time, num_scans, randomised, nmap_opts, sudo, jobs=1):
+    '''Scan ports as defined by input args
+
+    Each scan covers port_range_increment more ports than the last. The ports of each scan are split into chunks
+    within the OS argument length limit (see port_chunks), each scanned by an nmap call (jobs calls at a time),
+    and the results of the calls merged into a single result for the scan.
+
+    Args:
+        target_host (str):          Host(s) to be scanned, in nmap target format
+        min_port (int):             Lowest port to be scanned
+        max_port (int):             Highest port to be scanned
+        port_range_increment (int): Number of ports added to each scan
+        min_time (int):             Minimum time (seconds) between scans
+        max_time (int):             Maximum time (seconds) between scans, randomised between min_time and max_time
+        num_scans (int):            Number of scans
+        randomised (bool):          Whether to scan randomly chosen ports (otherwise consecutive ports from min_port)
+        nmap_opts (str):            Additional nmap command-line args
+        sudo (bool):                Whether to run nmap with sudo
+        jobs (int):                 Number of nmap calls run concurrently (default: 1)
+
+    Returns:
+        list:   Merged result (see merge_scan_results) of each scan
+
+    '''
+    logger.info("Setting up %d scans of host(s) %s between ports %d and %d (port range increment=%d, randomised=%s, sudo=%s, nmap_opts=%s, jobs=%d)", num_scans, target_host, min_port, max_port, port_range_increment, str(randomised), str(sudo), nmap_opts, jobs)
     
     # setup range of ports that could be scanned
     all_ports = range(min_port, max_port)
     
-    # run through configured number of scans
-    for s in range(0, num_scans):
-        logger.debug("Scan %d of %d", (s+1), num_scans)
-        
-        # determine ports to be scanned in this iteration
-        num_ports = min(port_range_increment * (s+1), len(all_ports))
-        
-        # TODO: when get over ~20k ports, need to batch up nmap calls due to OS arg limitations
-        if randomised:
-            scan_ports = ','.join(str(i) for i in random.sample(all_ports, num_ports))
-        else:
-            scan_ports = str(min_port) + '-' + str(min_port + num_ports)
-        logger.debug("Ports to scan: %s", scan_ports)
-        
-        # execute the scan
-        nm.scan(hosts=target_host, ports=scan_ports, arguments=nmap_opts, sudo=sudo)
-        
-        # log nmap command and some results
-        logger.debug("nmap command line: %s", nm.command_line())
-        logger.debug("nmap scan info: %s", nm.scaninfo())
-        logger.debug("nmap scan stats: %s", nm.scanstats())
-        logger.debug("nmap last output: %s", nm.get_nmap_last_output())
-
-	    # TODO: output meaningful results
-        logger.debug("nmap result: %s", pprint.pformat(nm.csv()))
-        
-        # wait before next scan if there are scans left to perform
-        if (s+1) < num_scans:
-            if min_time < max_time:
-                wait_time = random.randint(min_time, max_time)
+    results = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # run through configured number of scans
+        for s in range(0, num_scans):
+            logger.debug("Scan %d of %d", (s+1), num_scans)
+            
+            # determine ports to be scanned in this iteration
+            num_ports = min(port_range_increment * (s+1), len(all_ports))
+            
+            if randomised:
+                chunks = port_chunks(random.sample(all_ports, num_ports))
             else:
-                wait_time = min_time
-                
-            logger.debug("Waiting %d seconds until next scan", wait_time)
-            sleep(wait_time)
-        
+                chunks = [str(min_port) + '-' + str(min_port + num_ports)]
+            logger.debug("Ports to scan (%d nmap calls): %s", len(chunks), chunks)
+            
+            # execute the scan, one nmap call per chunk
+            start = timer()
+            result = merge_scan_results(list(executor.map(lambda chunk: _scan_chunk(target_host, chunk, nmap_opts, sudo), chunks)))
+            results.append(result)
+
+            # log the open ports found
+            logger.info("Scan %d of %d: %d ports in %d nmap calls, took %f seconds", (s+1), num_scans, num_ports, len(chunks), timer() - start)
+            for host, host_result in sorted(result['scan'].items()):
+                for protocol in SCAN_PROTOCOLS:
+                    ports = host_result.get(protocol, {})
+                    open_ports = sorted(port for port, port_result in ports.items() if port_result.get('state') == 'open')
+                    if len(ports) > 0:
+                        logger.info("Host %s (%s): %d %s ports scanned, open: %s", host, host_result.get('status', {}).get('state'), len(ports), protocol, _port_ranges(open_ports))
+            logger.debug("nmap result: %s", pprint.pformat(result))
+            
+            # wait before next scan if there are scans left to perform
+            if (s+1) < num_scans:
+                if min_time < max_time:
+                    wait_time = random.randint(min_time, max_time)
+                else:
+                    wait_time = min_time
+                    
+                logger.debug("Waiting %d seconds until next scan", wait_time)
+                sleep(wait_time)
+
+    return results
 
 def main(argv):
     '''Parse input args and run the Port Scanner against specified target host(s) (-t|--target-host)
@@ -126,9 +235,12 @@ def main(argv):
     # nmap command-line args
     nmap_opts = ''
 
+    # number of nmap calls (chunks of the ports of a scan) run concurrently
+    jobs = 1
+
     try:
         logger.info('Args: %s', argv)
-        opts, _ = getopt.getopt(argv, "hrst:n:", ["help", "randomise", "sudo", "min-port=", "max-port=", "port-inc=", "min-time=", "max-time=", "num-scans=", "nmap-opts=", "target-host="])
+        opts, _ = getopt.getopt(argv, "hrst:n:j:", ["help", "randomise", "sudo", "jobs=", "min-port=", "max-port=", "port-inc=", "min-time=", "max-time=", "num-scans=", "nmap-opts=", "target-host="])
     except getopt.GetoptError:
         _print_usage(1)
 
@@ -203,6 +315,15 @@ def main(argv):
             except:
                 logger.exception("Unable to parse number of scans (--num-scans), must be numeric, got %s", num_scans)
                 sys.exit(16)
+        elif opt in ('-j', "--jobs"):
+            try:
+                jobs = int(arg)
+                if jobs < 1:
+                    logger.error("Jobs (-j | --jobs) must be greater than 0, got %d", jobs)
+                    sys.exit(17)
+            except ValueError:
+                logger.exception("Unable to parse jobs (-j | --jobs), must be numeric, got %s", arg)
+                sys.exit(18)
     
     if target_host is None or len(target_host) == 0:
         logger.exception("Target Host(s) (-t | --target-host) must be specified")
@@ -210,7 +331,7 @@ def main(argv):
 
     start = timer()
 
-    scan_ports(target_host, min_port, max_port, port_range_increment, min_time, max_time, num_scans, randomised, nmap_opts, sudo)
+    scan_ports(target_host, min_port, max_port, port_range_increment, min_time, max_time, num_scans, randomised, nmap_opts, sudo, jobs)
 
     end = timer()
     logger.info("Time Taken (seconds): %f", end - start)